@@ -0,0 +1,151 @@
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import conditional
+from .models import models
+
+# Longest range one calendar request may ask for
+MAX_RANGE_DAYS = 366
+# Week buckets kept per worker (about ten years)
+MAX_CACHED_WEEKS = 520
+
+
+def week_start(day: date) -> date:
+    """Monday of the ISO week containing `day`."""
+    return day - timedelta(days=day.weekday())
+
+
+def week_marker(day: date) -> str:
+    """collection_versions name bumped whenever an episode airing in that week changes."""
+    return f"calendar:{week_start(day).isoformat()}"
+
+
+def week_markers(air_dates: Iterable[Optional[date]]) -> List[str]:
+    return sorted({week_marker(air_date) for air_date in air_dates if air_date is not None})
+
+
+def bump_weeks(db: Session, air_dates: Iterable[Optional[date]]):
+    """Invalidate the calendar weeks of these air dates, in the caller's transaction.
+
+    Pass both the old and the new air date of a changed episode.
+    """
+    markers = week_markers(air_dates)
+    if markers:
+        conditional.bump_collections(db, *markers)
+
+
+class CalendarCache:
+    """Per-worker week buckets of calendar documents, LRU-bounded.
+
+    A bucket is stored with the (week marker version, anime collection version) it was built
+    at; it is used only while both are unchanged, so a write in any worker invalidates it.
+    """
+
+    def __init__(self, max_weeks: int = MAX_CACHED_WEEKS):
+        self.max_weeks = max_weeks
+        self._buckets = OrderedDict()
+
+    def get(self, week: date, key) -> Optional[List[dict]]:
+        entry = self._buckets.get(week)
+        if entry is None or entry[0] != key:
+            return None
+        self._buckets.move_to_end(week)
+        return entry[1]
+
+    def put(self, week: date, key, documents: List[dict]):
+        self._buckets[week] = (key, documents)
+        self._buckets.move_to_end(week)
+        while len(self._buckets) > self.max_weeks:
+            self._buckets.popitem(last=False)
+
+
+cache = CalendarCache()
+
+
+def weeks_between(start: date, end: date) -> List[date]:
+    weeks, week = [], week_start(start)
+    while week <= end:
+        weeks.append(week)
+        week += timedelta(days=7)
+    return weeks
+
+
+def validate_range(start: date, end: date):
+    if end < start:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    if (end - start).days >= MAX_RANGE_DAYS:
+        raise HTTPException(status_code=400, detail=f"The range may span at most {MAX_RANGE_DAYS} days")
+
+
+async def marker_states(db: AsyncSession, weeks: List[date]) -> Dict[str, tuple]:
+    """(version, updated_at) of the week markers and of the anime collection, in one query."""
+    CollectionVersion = models.CollectionVersion
+    names = [conditional.ANIME, *(week_marker(week) for week in weeks)]
+    rows = await db.execute(
+        select(CollectionVersion.name, CollectionVersion.version, CollectionVersion.updated_at).where(CollectionVersion.name.in_(names))
+    )
+    states = {name: (0, None) for name in names}
+    states.update((name, (version, updated_at)) for name, version, updated_at in rows)
+    return states
+
+
+def combined_state(states: Dict[str, tuple]):
+    """(version, updated_at) of a whole range, as conditional.collection_state computes them."""
+    updated = [updated_at for _, updated_at in states.values() if updated_at is not None]
+    return sum(version for version, _ in states.values()), max(updated) if updated else None
+
+
+async def _load_weeks(db: AsyncSession, weeks: List[date]) -> Dict[date, List[dict]]:
+    """Documents of every episode airing in `weeks`, from one range scan over episodes.air_date."""
+    Episode = models.Episode
+    result = await db.execute(
+        select(
+            Episode.id,
+            Episode.anime_id,
+            Episode.episode_number,
+            Episode.title,
+            Episode.duration_minutes,
+            Episode.air_date,
+            models.Anime.title.label("anime_title"),
+            models.Anime.cover_url,
+        )
+        .join(models.Anime, models.Anime.id == Episode.anime_id)
+        .where(Episode.air_date >= weeks[0], Episode.air_date < weeks[-1] + timedelta(days=7))
+        .order_by(Episode.air_date, Episode.anime_id, Episode.episode_number)
+    )
+    buckets = {week: [] for week in weeks}
+    for row in result.mappings():
+        bucket = buckets.get(week_start(row["air_date"]))
+        if bucket is not None:
+            bucket.append(dict(row))
+    return buckets
+
+
+async def episodes_between(db: AsyncSession, start: date, end: date, states: Dict[str, tuple]) -> List[dict]:
+    """Calendar documents airing from `start` to `end` inclusive, rebuilding only stale weeks.
+
+    `states` comes from marker_states for the same range.
+    """
+    anime_version = states[conditional.ANIME][0]
+    weeks = weeks_between(start, end)
+    keys = {week: (states[week_marker(week)][0], anime_version) for week in weeks}
+    buckets = {week: cache.get(week, keys[week]) for week in weeks}
+    stale = [week for week, documents in buckets.items() if documents is None]
+    if stale:
+        # One scan from the first to the last stale week; fresh weeks in between are rebuilt too
+        for week, documents in (await _load_weeks(db, weeks_between(stale[0], stale[-1]))).items():
+            cache.put(week, keys[week], documents)
+            buckets[week] = documents
+
+    return [
+        document
+        for week in weeks
+        for document in buckets[week]
+        if start <= document["air_date"] <= end
+    ]
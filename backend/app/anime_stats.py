@@ -0,0 +1,136 @@
+from collections import defaultdict
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import progress, schemas
+from .models import models
+
+# Progress status -> anime_stats counter; other statuses only count towards members
+STATUS_COLUMNS = {
+    "Watching": "watching",
+    "Completed": "completed",
+    "On Hold": "on_hold",
+    "Dropped": "dropped",
+    "Plan to Watch": "plan_to_watch",
+}
+COUNTERS = ["members", "scored", "score_sum", *STATUS_COLUMNS.values()]
+
+# (status, score) of a progress row; None when the row does not exist (before a create)
+State = Optional[Tuple[Optional[str], Optional[int]]]
+
+
+def _add(counters: dict, state: State, sign: int):
+    if state is None:
+        return
+    status, score = state
+    counters["members"] += sign
+    if score is not None:
+        counters["scored"] += sign
+        counters["score_sum"] += sign * score
+    column = STATUS_COLUMNS.get(status)
+    if column is not None:
+        counters[column] += sign
+
+
+def record_changes(db: Session, changes: Iterable[Tuple[int, State, State]]):
+    """Apply (anime_id, before, after) progress changes to anime_stats as counter deltas.
+
+    Runs in the caller's transaction, so the stats commit or roll back with the progress
+    write. One statement for any number of anime. Drift from concurrent edits of the same
+    row is corrected by `reconcile`.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for anime_id, before, after in changes:
+        _add(deltas[anime_id], before, -1)
+        _add(deltas[anime_id], after, 1)
+    rows = [{"anime_id": anime_id, **counters} for anime_id, counters in deltas.items() if any(counters.values())]
+    if not rows:
+        return
+
+    table = models.AnimeStats.__table__
+    dialect_insert = progress.UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if dialect_insert is not None:
+        statement = dialect_insert(table).values(rows)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.anime_id],
+            set_={**{column: table.c[column] + statement.excluded[column] for column in COUNTERS}, "updated_at": func.now()},
+        ))
+        return
+
+    for row in rows:
+        result = db.execute(
+            update(table)
+            .where(table.c.anime_id == row["anime_id"])
+            .values({**{column: table.c[column] + row[column] for column in COUNTERS}, "updated_at": func.now()})
+        )
+        if result.rowcount == 0:
+            db.execute(insert(table).values(row))
+
+
+def record_change(db: Session, anime_id: int, before: State, after: State):
+    record_changes(db, [(anime_id, before, after)])
+
+
+def aggregate():
+    """select() computing every anime_stats row from user_anime_progress (a full GROUP BY)."""
+    UserAnimeProgress = models.UserAnimeProgress
+    return (
+        select(
+            UserAnimeProgress.anime_id,
+            func.count().label("members"),
+            func.count(UserAnimeProgress.score).label("scored"),
+            func.coalesce(func.sum(UserAnimeProgress.score), 0).label("score_sum"),
+            *(
+                func.coalesce(func.sum(case((UserAnimeProgress.status == status, 1), else_=0)), 0).label(column)
+                for status, column in STATUS_COLUMNS.items()
+            ),
+        )
+        .where(UserAnimeProgress.anime_id.isnot(None))
+        .group_by(UserAnimeProgress.anime_id)
+    )
+
+
+def reconcile(db: Session) -> int:
+    """Rewrite the anime_stats rows that differ from a fresh aggregate; returns how many were fixed.
+
+    Does not commit.
+    """
+    table = models.AnimeStats.__table__
+    expected = {row.anime_id: tuple(row[1:]) for row in db.execute(aggregate())}
+    current = {
+        row.anime_id: tuple(row[1:])
+        for row in db.execute(select(table.c.anime_id, *(table.c[column] for column in COUNTERS)))
+    }
+
+    stale = [anime_id for anime_id in current if anime_id not in expected]
+    changed, missing = [], []
+    for anime_id, values in expected.items():
+        if current.get(anime_id) != values:
+            (changed if anime_id in current else missing).append({"stats_anime_id": anime_id, **dict(zip(COUNTERS, values))})
+
+    if stale:
+        db.execute(delete(table).where(table.c.anime_id.in_(stale)))
+    if changed:
+        db.execute(
+            update(table).where(table.c.anime_id == bindparam("stats_anime_id")).values(updated_at=func.now()),
+            changed,
+        )
+    if missing:
+        db.execute(insert(table), [{"anime_id": row.pop("stats_anime_id"), **row} for row in missing])
+    return len(stale) + len(changed) + len(missing)
+
+
+def mean_score():
+    """SQL expression of the mean score; NULL for anime nobody has scored."""
+    stats = models.AnimeStats
+    return stats.score_sum * 1.0 / func.nullif(stats.scored, 0)
+
+
+def as_schema(anime_id: int, stats: Optional[models.AnimeStats]) -> schemas.AnimeStats:
+    if stats is None:
+        return schemas.AnimeStats(anime_id=anime_id)
+    counters = {column: getattr(stats, column) for column in COUNTERS if column != "score_sum"}
+    mean = stats.score_sum / stats.scored if stats.scored else None
+    return schemas.AnimeStats(anime_id=anime_id, mean_score=mean, **counters)
@@ -2,15 +2,17 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from jose import JWTError, jwt
-from passlib.context import CryptContext
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_async_db, get_db
 from ..models import models
-from ..schemas import schemas
+from .hashing import pool, pwd_context
+from .principal_cache import Principal, principal_cache
 
 import os
 from dotenv import load_dotenv
@@ -20,15 +22,17 @@ load_dotenv()
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
+# Users allowed to read the /admin operational endpoints; none when unset
+ADMIN_USERNAMES = frozenset(name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip())
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
+# Blocking helpers for sync handlers; bcrypt still runs on the bounded hashing pool
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pool.run_blocking(pwd_context.verify, plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pool.run_blocking(pwd_context.hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -40,24 +44,60 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode(token: str) -> dict:
+    """The token's claims; the signature and expiry are checked on every request."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = schemas.TokenData(username=username)
     except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def _principal(token: str, payload: dict, user: Optional[models.User]) -> Principal:
     if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    principal = Principal.from_user(user)
+    principal_cache.set(token, principal, payload.get("exp"))
+    return principal
+
+# Two forms of the same dependency, so the users lookup runs on the session the handler
+# already holds (FastAPI hands one request the same get_db / get_async_db session):
+# a sync handler taking both sessions would hold a connection from each pool.
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
+    payload = _decode(token)
+    # Only the users lookup is cached
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    user = await db.scalar(select(models.User).filter(models.User.username == payload["sub"]))
+    return _principal(token, payload, user)
+
+def get_current_user_sync(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    payload = _decode(token)
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+    user = db.scalar(select(models.User).filter(models.User.username == payload["sub"]))
+    return _principal(token, payload, user)
+
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)):
+    """For handlers using get_async_db (or no database)."""
+    return current_user
+
+def get_current_active_user_sync(current_user: Principal = Depends(get_current_user_sync)):
+    """For handlers using get_db."""
+    return current_user
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)):
-    return current_user
\ No newline at end of file
+async def get_current_admin_user(current_user: Principal = Depends(get_current_active_user)):
+    """For the /admin endpoints: a signed-in user listed in ADMIN_USERNAMES."""
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not an administrator")
+    return current_user
@@ -0,0 +1,127 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 2))
+# Hash jobs allowed to wait for a worker before new ones are rejected with 503
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", 64))
+
+# min/max pinned to the configured cost so hashes made with any other cost are flagged for
+# upgrade by verify_and_update
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class HashingPool:
+    """Size-limited worker pool for bcrypt work, kept off the event loop.
+
+    bcrypt releases the GIL while hashing, so threads give real parallelism. At most
+    `workers` jobs run at once, `queue_limit` more may wait, and anything beyond that is
+    rejected with 503 instead of piling up behind a login burst.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, samples: int = 1000):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait_times = deque(maxlen=samples)
+        self._run_times = deque(maxlen=samples)
+
+    def _admit(self):
+        with self._lock:
+            if self._pending >= self.workers + self.queue_limit:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many concurrent authentication requests",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending += 1
+        return time.perf_counter()
+
+    def _run(self, submitted_at, fn, *args):
+        started_at = time.perf_counter()
+        with self._lock:
+            self._running += 1
+        try:
+            return fn(*args)
+        finally:
+            finished_at = time.perf_counter()
+            with self._lock:
+                self._running -= 1
+                self._pending -= 1
+                self._completed += 1
+                self._wait_times.append(started_at - submitted_at)
+                self._run_times.append(finished_at - started_at)
+
+    async def run(self, fn, *args):
+        submitted_at = self._admit()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._run, submitted_at, fn, *args)
+
+    def run_blocking(self, fn, *args):
+        """For sync handlers (already on a threadpool thread): same limits, waits for the result."""
+        submitted_at = self._admit()
+        return self._executor.submit(self._run, submitted_at, fn, *args).result()
+
+    def metrics(self) -> dict:
+        with self._lock:
+            wait_times = list(self._wait_times)
+            run_times = list(self._run_times)
+            return {
+                "workers": self.workers,
+                "queue_limit": self.queue_limit,
+                "bcrypt_rounds": BCRYPT_ROUNDS,
+                "running": self._running,
+                "queue_depth": self._pending - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "wait_ms_p50": _ms(_percentile(wait_times, 0.5)),
+                "wait_ms_p95": _ms(_percentile(wait_times, 0.95)),
+                "hash_ms_p50": _ms(_percentile(run_times, 0.5)),
+                "hash_ms_p95": _ms(_percentile(run_times, 0.95)),
+            }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+pool = HashingPool(HASH_WORKERS, HASH_QUEUE_LIMIT)
+
+
+async def hash_password(password: str) -> str:
+    return await pool.run(pwd_context.hash, password)
+
+
+async def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password; when the stored hash uses another cost, also return a rehash at the current one."""
+    return await pool.run(pwd_context.verify_and_update, password, hashed_password)
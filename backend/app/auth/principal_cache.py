@@ -0,0 +1,213 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..models import models
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# 0 disables the cache
+PRINCIPAL_CACHE_TTL_SECONDS = int(os.getenv("PRINCIPAL_CACHE_TTL_SECONDS", 60))
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+# Optional shared backend for multi-worker deployments, e.g. redis://localhost:6379/0
+PRINCIPAL_CACHE_URL = os.getenv("PRINCIPAL_CACHE_URL")
+
+# Columns kept for a principal; everything handlers and /me read from current_user
+PRINCIPAL_FIELDS = ("id", "username", "email", "created_at")
+
+
+class Principal:
+    """The signed-in user as handlers see it: the PRINCIPAL_FIELDS of their users row.
+
+    A plain object rather than a models.User, so a cached principal cannot pass for a row
+    loaded in the request's session.
+    """
+
+    __slots__ = PRINCIPAL_FIELDS
+
+    def __init__(self, id: int, username: str, email: str, created_at: Optional[datetime]):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user: models.User) -> "Principal":
+        return cls(**{field: getattr(user, field) for field in PRINCIPAL_FIELDS})
+
+
+class LocalPrincipalBackend:
+    """In-process TTL + LRU store. Keeps a user id -> keys index for invalidation."""
+
+    name = "local"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._keys_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, user_id, principal = entry
+            if expires_at <= time.monotonic():
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return principal
+
+    def set(self, key: str, principal: dict, ttl: float):
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (time.monotonic() + ttl, principal["id"], principal)
+            self._keys_by_user.setdefault(principal["id"], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._drop(key)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def _drop(self, key: str):
+        _, user_id, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+class RedisPrincipalBackend:
+    """Shared store so an invalidation on one worker is seen by all of them."""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis  # optional dependency, only needed when PRINCIPAL_CACHE_URL is set
+
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self._redis.get(f"principal:{key}")
+        return None if value is None else json.loads(value)
+
+    def set(self, key: str, principal: dict, ttl: float):
+        user_keys = f"principal-keys:{principal['id']}"
+        pipeline = self._redis.pipeline()
+        pipeline.set(f"principal:{key}", json.dumps(principal), px=int(ttl * 1000))
+        pipeline.sadd(user_keys, key)
+        pipeline.pexpire(user_keys, int(PRINCIPAL_CACHE_TTL_SECONDS * 1000))
+        pipeline.execute()
+
+    def invalidate_user(self, user_id: int):
+        user_keys = f"principal-keys:{user_id}"
+        keys = self._redis.smembers(user_keys)
+        if keys:
+            self._redis.delete(*(f"principal:{key.decode()}" for key in keys), user_keys)
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class PrincipalCache:
+    """Resolved principals for bearer tokens, so get_current_user can skip the users lookup."""
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> str:
+        # Never keep raw bearer tokens around
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, token: str) -> Optional[Principal]:
+        if not self.ttl:
+            return None
+        principal = self.backend.get(self._key(token))
+        if principal is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        principal = dict(principal)
+        if principal["created_at"] is not None:
+            principal["created_at"] = datetime.fromisoformat(principal["created_at"])
+        return Principal(**principal)
+
+    def set(self, token: str, user: Principal, token_expires_at: Optional[float] = None):
+        ttl = self.ttl
+        if token_expires_at is not None:
+            ttl = min(ttl, token_expires_at - time.time())
+        if ttl <= 0:
+            return
+        principal = {field: getattr(user, field) for field in PRINCIPAL_FIELDS}
+        if principal["created_at"] is not None:
+            principal["created_at"] = principal["created_at"].isoformat()
+        self.backend.set(self._key(token), principal, ttl)
+
+    def invalidate_user(self, user_id: int):
+        self.backend.invalidate_user(user_id)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "ttl_seconds": self.ttl,
+            "entries": self.backend.size(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+def _create_backend():
+    if PRINCIPAL_CACHE_URL:
+        return RedisPrincipalBackend(PRINCIPAL_CACHE_URL)
+    return LocalPrincipalBackend(PRINCIPAL_CACHE_SIZE)
+
+
+principal_cache = PrincipalCache(_create_backend(), PRINCIPAL_CACHE_TTL_SECONDS)
+
+
+# Users changed by a flush are remembered on the session and their cached principals dropped
+# once the transaction commits: dropping them at flush time would let a concurrent request
+# cache the old row again before the commit, and would evict for changes later rolled back
+CHANGED_USERS_KEY = "principal_cache_changed_users"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = {target.id for target in (*session.dirty, *session.deleted) if isinstance(target, models.User)}
+    if changed:
+        session.info.setdefault(CHANGED_USERS_KEY, set()).update(changed)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for user_id in session.info.pop(CHANGED_USERS_KEY, ()):
+        principal_cache.invalidate_user(user_id)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop(CHANGED_USERS_KEY, None)
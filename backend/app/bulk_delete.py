@@ -0,0 +1,37 @@
+from typing import List
+
+from fastapi import HTTPException
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from . import schemas
+
+# Ids per bulk delete request
+MAX_BULK_DELETE_IDS = 1000
+
+
+def validate(request: schemas.BulkDelete) -> List[int]:
+    """The distinct requested ids, in request order."""
+    ids = list(dict.fromkeys(request.ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No ids given")
+    if len(ids) > MAX_BULK_DELETE_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_DELETE_IDS} ids per request")
+    return ids
+
+
+def delete_rows(db: Session, model, ids: List[int]) -> List[int]:
+    """DELETE the rows of `model` with these ids in one statement; returns the ids that existed.
+
+    Dependent rows go with them through the schema's ON DELETE rules; nothing is loaded.
+    """
+    statement = delete(model).where(model.id.in_(ids)).returning(model.id)
+    return db.execute(statement.execution_options(synchronize_session=False)).scalars().all()
+
+
+def result(ids: List[int], deleted: List[int]) -> schemas.BulkDeleteResult:
+    deleted_ids = set(deleted)
+    return schemas.BulkDeleteResult(
+        deleted=[row_id for row_id in ids if row_id in deleted_ids],
+        missing=[row_id for row_id in ids if row_id not in deleted_ids],
+    )
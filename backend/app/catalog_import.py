@@ -0,0 +1,307 @@
+from types import SimpleNamespace
+from typing import AsyncIterator, Iterable, List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, bindparam, delete, func, insert, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from . import airing_calendar, changes, conditional, schemas
+from .models import models
+from .progress import UPSERT_INSERTS
+from .search import search
+
+DEFAULT_BATCH_SIZE = 500
+# Bind parameters per multi-row statement; below SQLite's 32766 (Postgres allows 65535)
+MAX_BIND_PARAMETERS = 30000
+# Cap on error entries kept in a report; the failed count stays exact
+MAX_REPORTED_ERRORS = 1000
+
+ANIME_FIELDS = set(schemas.AnimeBase.__fields__)
+
+
+class ImportReport:
+    def __init__(self):
+        self.lines = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def fail(self, line: int, error: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(schemas.ImportLineError(line=line, error=error))
+
+    def as_schema(self) -> schemas.ImportReport:
+        return schemas.ImportReport(lines=self.lines, imported=self.imported, failed=self.failed, errors=self.errors)
+
+
+def _upsert_insert(db: Session):
+    insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        raise HTTPException(status_code=501, detail="Catalog import is not supported on this database")
+    return insert
+
+
+def _chunks(rows: List[dict]):
+    """Slices of `rows` small enough for one multi-row statement's bind parameters."""
+    if not rows:
+        return
+    size = max(1, MAX_BIND_PARAMETERS // len(rows[0]))
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def _given(model, excluded, columns: Iterable[str]) -> dict:
+    # Fields a document leaves out keep their stored value
+    return {column: func.coalesce(getattr(excluded, column), getattr(model, column)) for column in columns}
+
+
+def _changed(model, excluded, columns: Iterable[str]):
+    return or_(*(and_(getattr(excluded, column).is_not(None), getattr(model, column).is_distinct_from(getattr(excluded, column))) for column in columns))
+
+
+def _upsert_by_name(db: Session, model, entity: str, rows_by_name: dict, columns: List[str]) -> dict:
+    """Map names (unique) to ids: missing rows are inserted and existing ones get the fields
+    the documents give. Inserted and changed rows are recorded as `entity` changes."""
+    if not rows_by_name:
+        return {}
+    insert = _upsert_insert(db)
+    written = {}
+    for chunk in _chunks(list(rows_by_name.values())):
+        statement = insert(model).values(chunk)
+        if columns:
+            statement = statement.on_conflict_do_update(
+                index_elements=[model.name],
+                set_={**_given(model, statement.excluded, columns), "version": model.version + 1, "updated_at": func.now()},
+                where=_changed(model, statement.excluded, columns),
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=[model.name])
+        written.update(db.execute(statement.returning(model.name, model.id)).all())
+    changes.record(db, entity, changes.UPSERT, written.values())
+    # Rows that already held these values are not returned by the upsert
+    unchanged = [name for name in rows_by_name if name not in written]
+    ids = dict(written)
+    if unchanged:
+        ids.update(db.execute(select(model.name, model.id).where(model.name.in_(unchanged))).all())
+    return ids
+
+
+def _anime_key(document: schemas.AnimeImport) -> str:
+    if document.external_id:
+        return document.external_id
+    return f"{document.title}|{document.type or ''}|{document.release_date or ''}"
+
+
+def _upsert_anime(db: Session, documents: List[schemas.AnimeImport], studio_ids: dict) -> List[int]:
+    """Insert or overwrite anime by external_id; returns their ids in document order."""
+    insert = _upsert_insert(db)
+    rows = []
+    for document in documents:
+        row = document.dict(include=ANIME_FIELDS)
+        if document.studio:
+            row["studio_id"] = studio_ids[document.studio.name]
+        row["external_id"] = _anime_key(document)
+        rows.append(row)
+    ids = {}
+    for chunk in _chunks(rows):
+        statement = insert(models.Anime).values(chunk)
+        # The document is the whole anime: every field is overwritten
+        statement = statement.on_conflict_do_update(
+            index_elements=[models.Anime.external_id],
+            set_={
+                **{field: getattr(statement.excluded, field) for field in ANIME_FIELDS},
+                "version": models.Anime.version + 1,
+                "updated_at": func.now(),
+            },
+        ).returning(models.Anime.external_id, models.Anime.id)
+        ids.update(db.execute(statement).all())
+    anime_ids = [ids[row["external_id"]] for row in rows]
+    search.index_anime_many(db, [SimpleNamespace(id=anime_id, **row) for anime_id, row in zip(anime_ids, rows)])
+    return anime_ids
+
+
+def _resolve_characters(db: Session, anime_ids: List[int], documents: List[schemas.AnimeImport]) -> dict:
+    """Map (anime id, character name) to a character id.
+
+    Character names are not unique, so a name only matches a character already linked to the
+    same anime (from an earlier import of it); that character gets the fields the document
+    gives. Every other character is inserted.
+    """
+    anime_characters = models.anime_characters
+    Character = models.Character
+    characters = Character.__table__
+    linked = {
+        (anime_id, name): character_id
+        for anime_id, name, character_id in db.execute(
+            select(anime_characters.c.anime_id, Character.name, Character.id)
+            .join(Character, Character.id == anime_characters.c.character_id)
+            .where(anime_characters.c.anime_id.in_(anime_ids))
+        )
+    }
+    ids, updates, new = {}, [], {}
+    for anime_id, document in zip(anime_ids, documents):
+        for character in document.characters:
+            key = (anime_id, character.name)
+            if key in ids or key in new:
+                continue
+            if key in linked:
+                ids[key] = linked[key]
+                updates.append({"character_id": linked[key], "new_description": character.description, "new_image_url": character.image_url})
+            else:
+                new[key] = character.dict(exclude={"role"})
+
+    if updates:
+        # Core executemany: one statement for all of them
+        db.execute(
+            update(characters)
+            .where(characters.c.id == bindparam("character_id"))
+            .values(
+                description=func.coalesce(bindparam("new_description"), characters.c.description),
+                image_url=func.coalesce(bindparam("new_image_url"), characters.c.image_url),
+                version=characters.c.version + 1,
+                updated_at=func.now(),
+            ),
+            updates,
+        )
+    if new:
+        # RETURNING order is not guaranteed: match rows back by their values. Rows with equal
+        # values are interchangeable
+        created = {}
+        for chunk in _chunks(list(new.values())):
+            returned = db.execute(
+                insert(Character).values(chunk).returning(Character.id, Character.name, Character.description, Character.image_url)
+            )
+            for character_id, *values in returned:
+                created.setdefault(tuple(values), []).append(character_id)
+        for key, row in new.items():
+            ids[key] = created[(row["name"], row["description"], row["image_url"])].pop()
+    changes.record(db, conditional.CHARACTERS, changes.UPSERT, ids.values())
+    return ids
+
+
+def _write(db: Session, documents: List[schemas.AnimeImport]):
+    # A document repeated in one batch: the later line wins, as it would across batches
+    documents = list({_anime_key(document): document for document in documents}.values())
+    studios = {}
+    for document in documents:
+        if document.studio:
+            # A studio nested in several documents gets every field any of them gives
+            studio = studios.setdefault(document.studio.name, document.studio.dict())
+            studio.update(document.studio.dict(exclude_none=True))
+    studio_ids = _upsert_by_name(db, models.Studio, conditional.STUDIOS, studios, ["country", "founded_year"])
+    genre_ids = _upsert_by_name(db, models.Genre, conditional.GENRES, {name: {"name": name} for d in documents for name in d.genres}, [])
+    anime_ids = _upsert_anime(db, documents, studio_ids)
+    character_ids = _resolve_characters(db, anime_ids, documents)
+
+    genre_links, episodes, character_links = [], [], []
+    for anime_id, document in zip(anime_ids, documents):
+        genre_links.extend({"anime_id": anime_id, "genre_id": genre_ids[name]} for name in dict.fromkeys(document.genres))
+        episodes.extend(dict(episode.dict(), anime_id=anime_id) for episode in document.episodes)
+        roles = {character_ids[(anime_id, c.name)]: c.role for c in document.characters}
+        character_links.extend({"anime_id": anime_id, "character_id": cid, "role": role} for cid, role in roles.items())
+    # Re-imported anime get exactly the genres and characters of their document
+    db.execute(delete(models.anime_genres).where(models.anime_genres.c.anime_id.in_(anime_ids)))
+    db.execute(delete(models.anime_characters).where(models.anime_characters.c.anime_id.in_(anime_ids)))
+    if genre_links:
+        db.execute(insert(models.anime_genres), genre_links)
+    if character_links:
+        db.execute(insert(models.anime_characters), character_links)
+    if episodes:
+        _upsert_episodes(db, anime_ids, episodes)
+
+    changes.record(db, conditional.ANIME, changes.UPSERT, anime_ids)
+    conditional.bump_collections(
+        db, conditional.ANIME, conditional.STUDIOS, conditional.GENRES, conditional.CHARACTERS, conditional.EPISODES
+    )
+
+
+def _upsert_episodes(db: Session, anime_ids: List[int], episodes: List[dict]):
+    """Insert episodes, overwriting the fields given for numbers the anime already has."""
+    Episode = models.Episode
+    # Weeks an updated episode moves out of change too
+    previous_dates = db.execute(select(Episode.air_date).where(Episode.anime_id.in_(anime_ids), Episode.air_date.is_not(None))).scalars().all()
+    insert = _upsert_insert(db)
+    episode_ids = []
+    for chunk in _chunks(episodes):
+        statement = insert(Episode).values(chunk)
+        columns = ["title", "duration_minutes", "air_date"]
+        statement = statement.on_conflict_do_update(
+            index_elements=[Episode.anime_id, Episode.episode_number],
+            set_={**_given(Episode, statement.excluded, columns), "version": Episode.version + 1, "updated_at": func.now()},
+        )
+        episode_ids.extend(db.execute(statement.returning(Episode.id)).scalars())
+    airing_calendar.bump_weeks(db, [*previous_dates, *(episode["air_date"] for episode in episodes)])
+    changes.record(db, conditional.EPISODES, changes.UPSERT, episode_ids)
+
+
+def _db_error(exc: SQLAlchemyError) -> str:
+    return str(getattr(exc, "orig", None) or exc)
+
+
+def import_batch(db: Session, batch: List[Tuple[int, str]], report: ImportReport):
+    """Import (line number, NDJSON line) pairs in one transaction.
+
+    Invalid lines are reported and skipped. If the batch fails in the database, it is
+    rolled back and replayed one document per transaction so only the offending lines fail.
+    """
+    documents = []
+    for line_number, line in batch:
+        line = line.strip()
+        if not line:
+            continue
+        report.lines += 1
+        try:
+            documents.append((line_number, schemas.AnimeImport.parse_raw(line)))
+        except ValueError as exc:
+            report.fail(line_number, str(exc))
+    if not documents:
+        return
+
+    try:
+        _write(db, [document for _, document in documents])
+        db.commit()
+        report.imported += len(documents)
+        return
+    except SQLAlchemyError as exc:
+        db.rollback()
+        if len(documents) == 1:
+            report.fail(documents[0][0], _db_error(exc))
+            return
+
+    for line_number, document in documents:
+        try:
+            _write(db, [document])
+            db.commit()
+            report.imported += 1
+        except SQLAlchemyError as exc:
+            db.rollback()
+            report.fail(line_number, _db_error(exc))
+
+
+def import_lines(db: Session, lines: Iterable[str], batch_size: int = DEFAULT_BATCH_SIZE) -> ImportReport:
+    report = ImportReport()
+    batch = []
+    for line_number, line in enumerate(lines, start=1):
+        batch.append((line_number, line))
+        if len(batch) >= batch_size:
+            import_batch(db, batch, report)
+            batch = []
+    if batch:
+        import_batch(db, batch, report)
+    return report
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, str]]:
+    """Numbered lines of a streamed request body."""
+    line_number = 0
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, line.decode("utf-8", errors="replace")
+    if pending:
+        yield line_number + 1, pending.decode("utf-8", errors="replace")
@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import conditional
+from .database import AsyncSessionLocal
+from .fast_lists import ANIME_FIELDS, GENRE_FIELDS, STUDIO_FIELDS
+from .models import models
+
+load_dotenv()
+
+# Serve the anime, studio and genre GETs from an in-process copy of those tables
+CATALOG_SNAPSHOT = os.getenv("CATALOG_SNAPSHOT", "false").lower() in ("1", "true", "yes")
+# How often the collection versions are polled; also how stale the snapshot may get
+CATALOG_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_REFRESH_SECONDS", 5))
+
+# Ids per IN (...) when loading changed rows; below SQLite's old 999 variable limit
+LOAD_CHUNK_SIZE = 900
+
+logger = logging.getLogger("app.catalog_snapshot")
+
+
+class AnimeRecord:
+    __slots__ = (*ANIME_FIELDS, "genre_ids", "version", "updated_at")
+
+
+class StudioRecord:
+    __slots__ = (*STUDIO_FIELDS, "version", "updated_at")
+
+
+class GenreRecord:
+    __slots__ = (*GENRE_FIELDS, "version", "updated_at")
+
+
+def _record(cls, values: dict):
+    record = cls()
+    for name, value in values.items():
+        setattr(record, name, value)
+    return record
+
+
+def _document(record, fields) -> dict:
+    return {field: getattr(record, field) for field in fields}
+
+
+class Catalog:
+    """One immutable copy of the anime, studios and genres, indexed by id and by name.
+
+    `collections` holds the (version, updated_at) of each collection the copy was read at,
+    so ETags computed from it match the ones computed from the database.
+    """
+
+    def __init__(
+        self,
+        collections: Dict[str, Tuple[int, object]],
+        anime: Dict[int, AnimeRecord],
+        studios: Dict[int, StudioRecord],
+        genres: Dict[int, GenreRecord],
+    ):
+        self.collections = collections
+        self.anime = anime
+        self.studios = studios
+        self.genres = genres
+        self.studio_ids = sorted(studios)
+        self.genre_ids = sorted(genres)
+        self.studio_by_name = {studio.name: studio.id for studio in studios.values()}
+        self.genre_by_name = {genre.name: genre.id for genre in genres.values()}
+        anime_by_title = {}
+        for record in anime.values():
+            anime_by_title.setdefault(record.title, []).append(record.id)
+        self.anime_by_title = {title: tuple(ids) for title, ids in anime_by_title.items()}
+
+    def collection_state(self, *names: str):
+        """(version, updated_at) as conditional.collection_state computes them."""
+        states = [self.collections.get(name, (0, None)) for name in names]
+        updated = [updated_at for _, updated_at in states if updated_at is not None]
+        return sum(version for version, _ in states), max(updated) if updated else None
+
+    def anime_document(self, record: AnimeRecord) -> dict:
+        document = _document(record, ANIME_FIELDS)
+        studio = self.studios.get(record.studio_id)
+        document["studio"] = _document(studio, STUDIO_FIELDS) if studio is not None else None
+        document["genres"] = [_document(self.genres[genre_id], GENRE_FIELDS) for genre_id in record.genre_ids if genre_id in self.genres]
+        return document
+
+    def studio_document(self, record: StudioRecord) -> dict:
+        return _document(record, STUDIO_FIELDS)
+
+    def genre_document(self, record: GenreRecord) -> dict:
+        return _document(record, GENRE_FIELDS)
+
+
+def _chunks(ids: List[int]):
+    for start in range(0, len(ids), LOAD_CHUNK_SIZE):
+        yield ids[start:start + LOAD_CHUNK_SIZE]
+
+
+async def _reload(db: AsyncSession, model, cls, fields, previous: dict):
+    """Rows of `model` keyed by id, reusing the previous records whose version did not move.
+
+    Returns the records and the ids that were (re)loaded.
+    """
+    versions = dict((await db.execute(select(model.id, model.version))).all())
+    changed = [row_id for row_id, version in versions.items() if row_id not in previous or previous[row_id].version != version]
+    loaded = {}
+    columns = [getattr(model, field) for field in fields] + [model.version, model.updated_at]
+    for chunk in _chunks(changed):
+        for row in (await db.execute(select(*columns).where(model.id.in_(chunk)))).mappings():
+            loaded[row["id"]] = _record(cls, dict(row))
+    records = {row_id: loaded.get(row_id) or previous[row_id] for row_id in versions if row_id in loaded or row_id in previous}
+    return records, changed
+
+
+async def _load_genre_ids(db: AsyncSession, anime: Dict[int, AnimeRecord], changed: List[int]):
+    """Fill genre_ids of the freshly loaded anime records."""
+    for record_id in changed:
+        if record_id in anime:
+            anime[record_id].genre_ids = ()
+    anime_genres = models.anime_genres
+    genre_ids = {}
+    for chunk in _chunks(changed):
+        rows = await db.execute(select(anime_genres.c.anime_id, anime_genres.c.genre_id).where(anime_genres.c.anime_id.in_(chunk)))
+        for anime_id, genre_id in rows:
+            genre_ids.setdefault(anime_id, []).append(genre_id)
+    for anime_id, ids in genre_ids.items():
+        if anime_id in anime:
+            anime[anime_id].genre_ids = tuple(ids)
+
+
+def _size(catalog: Catalog) -> int:
+    """Approximate bytes held by the records and indexes (shared interned values counted once per use)."""
+    total = 0
+    for records in (catalog.anime, catalog.studios, catalog.genres):
+        total += sys.getsizeof(records)
+        for record in records.values():
+            total += sys.getsizeof(record) + sum(sys.getsizeof(getattr(record, slot)) for slot in record.__slots__)
+    for index in (catalog.studio_ids, catalog.genre_ids, catalog.studio_by_name, catalog.genre_by_name, catalog.anime_by_title):
+        total += sys.getsizeof(index)
+    total += sum(sys.getsizeof(ids) for ids in catalog.anime_by_title.values())
+    return total
+
+
+class CatalogSnapshot:
+    """Holds the current Catalog and refreshes it when the collection versions move.
+
+    Write handlers bump the collection versions in the same transaction as the write; a
+    background task polls them and reloads only the rows whose version changed, then swaps
+    in a new Catalog. Requests never wait on the database for these reads.
+    """
+
+    def __init__(self, refresh_seconds: float = CATALOG_SNAPSHOT_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self.catalog: Optional[Catalog] = None
+        self._task = None
+        self._stats = {"refreshes": 0, "last_refresh_ms": None, "last_reloaded_rows": 0, "loaded_at": None, "approx_bytes": 0}
+
+    def current(self) -> Optional[Catalog]:
+        return self.catalog
+
+    async def refresh(self) -> bool:
+        """Reload what changed; returns whether a new Catalog was swapped in."""
+        started = time.perf_counter()
+        async with AsyncSessionLocal() as db:
+            CollectionVersion = models.CollectionVersion
+            collections = {
+                name: (version, updated_at)
+                for name, version, updated_at in await db.execute(
+                    select(CollectionVersion.name, CollectionVersion.version, CollectionVersion.updated_at)
+                    .where(CollectionVersion.name.in_((conditional.ANIME, conditional.STUDIOS, conditional.GENRES)))
+                )
+            }
+            previous = self.catalog
+            if previous is not None and previous.collections == collections:
+                return False
+
+            # Unchanged records are shared with the previous Catalog; only new records are written to
+            anime, changed_anime = await _reload(db, models.Anime, AnimeRecord, ANIME_FIELDS, previous.anime if previous else {})
+            await _load_genre_ids(db, anime, changed_anime)
+            studios, changed_studios = await _reload(db, models.Studio, StudioRecord, STUDIO_FIELDS, previous.studios if previous else {})
+            genres, changed_genres = await _reload(db, models.Genre, GenreRecord, GENRE_FIELDS, previous.genres if previous else {})
+
+        catalog = Catalog(collections, anime, studios, genres)
+        self.catalog = catalog
+        self._stats.update(
+            refreshes=self._stats["refreshes"] + 1,
+            last_refresh_ms=round((time.perf_counter() - started) * 1000, 2),
+            last_reloaded_rows=len(changed_anime) + len(changed_studios) + len(changed_genres),
+            loaded_at=time.time(),
+            approx_bytes=_size(catalog),
+        )
+        return True
+
+    async def start(self):
+        await self.refresh()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.refresh_seconds)
+            try:
+                await self.refresh()
+            except Exception:
+                # Keep serving the last good copy; the next poll retries
+                logger.exception("catalog snapshot refresh failed")
+
+    def stats(self) -> dict:
+        catalog = self.catalog
+        return {
+            "enabled": catalog is not None,
+            "anime": len(catalog.anime) if catalog else 0,
+            "studios": len(catalog.studios) if catalog else 0,
+            "genres": len(catalog.genres) if catalog else 0,
+            "refresh_seconds": self.refresh_seconds,
+            **self._stats,
+        }
+
+
+snapshot = CatalogSnapshot()
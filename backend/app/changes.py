@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import schemas
+from .database import AsyncSessionLocal
+from .models import models
+
+load_dotenv()
+
+# How often each worker looks for new changes to push to its stream subscribers
+CHANGES_POLL_SECONDS = float(os.getenv("CHANGES_POLL_SECONDS", 1))
+# A sequence number missing for this long is taken as a rolled-back write, not a slow one
+CHANGES_GAP_SECONDS = float(os.getenv("CHANGES_GAP_SECONDS", 5))
+# Changes kept by prune_changes.py; consumers further behind must resync from the lists
+CHANGES_RETENTION_DAYS = float(os.getenv("CHANGES_RETENTION_DAYS", 7))
+
+UPSERT = "upsert"
+DELETE = "delete"
+
+# Changes per page of GET /changes and per poll of the stream
+PAGE_SIZE = 500
+# Pages a stream subscriber may fall behind before it is disconnected to catch up by itself
+SUBSCRIBER_BUFFER = 100
+# Seconds between SSE comments that keep idle connections open through proxies
+HEARTBEAT_SECONDS = 15
+# How long EventSource clients wait before reconnecting
+RETRY_MILLISECONDS = 3000
+
+logger = logging.getLogger("app.changes")
+
+
+def record(db: Session, entity: str, op: str, ids: Iterable[int]):
+    """Append changes of `entity` rows (a conditional collection name) to the outbox.
+
+    Call in the write's transaction, after a flush when the ids are new, so the changes
+    commit or roll back with it. An anime delete also removes its episodes.
+    """
+    rows = [{"entity": entity, "entity_id": entity_id, "op": op} for entity_id in dict.fromkeys(ids)]
+    if rows:
+        db.execute(insert(models.CatalogChange), rows)
+
+
+class GapTracker:
+    """When this worker first saw each gap in the sequence, keyed by its first missing number.
+
+    Shared by the feed poller and the paged reads, so a gap ages from the moment anything in
+    the worker first noticed it. The rows around a gap cannot date it: created_at is when
+    their transaction started (now() on Postgres), not when it committed.
+    """
+
+    # Gaps remembered, oldest dropped first. Kept after the feed moves past them so consumers
+    # paging through older changes skip known rollbacks without waiting again
+    MAX_TRACKED = 10000
+
+    def __init__(self, gap_seconds: float = CHANGES_GAP_SECONDS):
+        self.gap_seconds = gap_seconds
+        self._first_seen = {}
+
+    def waiting(self, first_missing: int) -> bool:
+        """Whether the gap starting at `first_missing` was first seen less than gap_seconds ago."""
+        now = time.monotonic()
+        first_seen = self._first_seen.setdefault(first_missing, now)
+        if len(self._first_seen) > self.MAX_TRACKED:
+            del self._first_seen[next(iter(self._first_seen))]
+        return now - first_seen < self.gap_seconds
+
+
+gaps = GapTracker()
+
+
+def settled(rows, after: int, tracker: GapTracker = gaps) -> list:
+    """The leading rows of `rows` (ordered by seq) that no still-running write can precede.
+
+    Sequence numbers are taken at insert but become visible at commit, so seq 7 may show up
+    after 8 has been read. Rows are handed out only up to a gap, until the missing numbers
+    have been seen missing for CHANGES_GAP_SECONDS: then they belong to a rollback. A write
+    transaction running longer than that can still be skipped, so keep the setting above
+    the longest one (e.g. a catalog import batch).
+    """
+    result, expected = [], after + 1
+    for row in rows:
+        if row.seq != expected and tracker.waiting(expected):
+            break
+        result.append(row)
+        expected = row.seq + 1
+    return result
+
+
+def as_schema(row) -> schemas.CatalogChange:
+    return schemas.CatalogChange(seq=row.seq, entity=row.entity, entity_id=row.entity_id, op=row.op, created_at=row.created_at)
+
+
+async def changes_after(db: AsyncSession, after: int, limit: int = PAGE_SIZE) -> list:
+    CatalogChange = models.CatalogChange
+    result = await db.execute(select(CatalogChange).where(CatalogChange.seq > after).order_by(CatalogChange.seq).limit(limit))
+    return settled(result.scalars().all(), after)
+
+
+async def retained_range(db: AsyncSession) -> Tuple[Optional[int], int]:
+    """(oldest, latest) retained sequence numbers; (None, 0) when the outbox is empty."""
+    CatalogChange = models.CatalogChange
+    oldest, latest = (await db.execute(select(func.min(CatalogChange.seq), func.max(CatalogChange.seq)))).one()
+    return oldest, latest or 0
+
+
+async def latest_seq(db: AsyncSession) -> int:
+    return (await db.execute(select(func.max(models.CatalogChange.seq)))).scalar() or 0
+
+
+def prune(db: Session, older_than: timedelta) -> int:
+    """Delete changes older than `older_than`; returns how many. Does not commit."""
+    CatalogChange = models.CatalogChange
+    cutoff = datetime.now(timezone.utc) - older_than
+    return db.execute(delete(CatalogChange).where(CatalogChange.created_at < cutoff)).rowcount
+
+
+def event(change: schemas.CatalogChange) -> str:
+    """One SSE event; its id lets a reconnecting client resume with Last-Event-ID."""
+    return f"id: {change.seq}\nevent: change\ndata: {change.json()}\n\n"
+
+
+class ChangeFeed:
+    """Fans new outbox rows out to this worker's stream subscribers.
+
+    One background task polls the outbox for every subscriber, instead of one query per
+    connection. Each subscriber has a bounded queue; one that falls too far behind is
+    dropped (its queue gets None) and reconnects with Last-Event-ID to page through the gap.
+    """
+
+    def __init__(self, poll_seconds: float = CHANGES_POLL_SECONDS):
+        self.poll_seconds = poll_seconds
+        self.last_seq: Optional[int] = None
+        self._subscribers = set()
+        self._task = None
+
+    async def start(self):
+        async with AsyncSessionLocal() as db:
+            self.last_seq = await latest_seq(db)
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_BUFFER)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            # Polled with no subscribers too, so last_seq stays current for the next one
+            try:
+                async with AsyncSessionLocal() as db:
+                    rows = await changes_after(db, self.last_seq)
+            except Exception:
+                logger.exception("change feed poll failed")
+                continue
+            if not rows:
+                continue
+            self.last_seq = rows[-1].seq
+            if not self._subscribers:
+                continue
+            page = [as_schema(row) for row in rows]
+            for queue in list(self._subscribers):
+                try:
+                    queue.put_nowait(page)
+                except asyncio.QueueFull:
+                    self._subscribers.discard(queue)
+                    # Make room for the end marker; the subscriber resumes from what it sent
+                    queue.get_nowait()
+                    queue.put_nowait(None)
+
+    def stats(self) -> dict:
+        return {"subscribers": len(self._subscribers), "last_seq": self.last_seq, "poll_seconds": self.poll_seconds}
+
+
+feed = ChangeFeed()
@@ -0,0 +1,146 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func, select, true, update
+from sqlalchemy.orm import Session
+
+from . import progress
+from .models import models
+
+# Collection names bumped by the write handlers; list ETags are derived from them
+ANIME = "anime"
+GENRES = "genres"
+STUDIOS = "studios"
+CHARACTERS = "characters"
+EPISODES = "episodes"
+
+
+def bump_version(row):
+    """Increment a catalog row's version in SQL (updated_at follows via onupdate)."""
+    row.version = type(row).version + 1
+
+
+def bump_collections(db: Session, *names: str):
+    """Increment collection versions; call in the same transaction as the write.
+
+    One upsert for any number of names, so concurrent first writes to a name cannot collide.
+    """
+    CollectionVersion = models.CollectionVersion
+    # Sorted, so transactions bumping overlapping names lock their rows in the same order
+    names = sorted(set(names))
+    if not names:
+        return
+    insert = progress.UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(CollectionVersion).values([{"name": name, "version": 1} for name in names])
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[CollectionVersion.name],
+            set_={"version": CollectionVersion.version + 1, "updated_at": func.now()},
+        ))
+        return
+
+    result = db.execute(
+        update(CollectionVersion)
+        .where(CollectionVersion.name.in_(names))
+        .values(version=CollectionVersion.version + 1, updated_at=func.now())
+    )
+    if result.rowcount < len(names):
+        existing = set()
+        if result.rowcount:
+            existing = set(db.execute(select(CollectionVersion.name).where(CollectionVersion.name.in_(names))).scalars())
+        db.add_all(CollectionVersion(name=name, version=1) for name in names if name not in existing)
+        db.flush()
+
+
+def collection_state(names: Iterable[str]):
+    """select() of (version, updated_at) summarising the given collections."""
+    CollectionVersion = models.CollectionVersion
+    return select(
+        func.coalesce(func.sum(CollectionVersion.version), 0).label("version"),
+        func.max(CollectionVersion.updated_at).label("updated_at"),
+    ).where(CollectionVersion.name.in_(list(names)))
+
+
+def row_state(model, row_id: int, depends_on: Iterable[str] = ()):
+    """select() of (version, updated_at[, collections version, collections updated_at]) for one row,
+    without loading the row itself. `depends_on` names collections embedded in the representation."""
+    statement = select(model.version, model.updated_at).where(model.id == row_id)
+    depends_on = list(depends_on)
+    if depends_on:
+        related = collection_state(depends_on).subquery()
+        statement = statement.add_columns(related.c.version, related.c.updated_at).join(related, true())
+    return statement
+
+
+def make_etag(*parts) -> str:
+    return '"%s"' % hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    # SQLite hands back naive timestamps; they are UTC (CURRENT_TIMESTAMP)
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _latest(*values: Optional[datetime]) -> Optional[datetime]:
+    values = [_utc(value) for value in values if value is not None]
+    return max(values) if values else None
+
+
+def row_validators(kind: str, row_id: int, version, updated_at, related_version=None, related_updated_at=None, variant: str = ""):
+    # `variant` tells apart representations of the same row, e.g. sparse fieldsets
+    parts = (kind, row_id, version, related_version) + ((variant,) if variant else ())
+    return make_etag(*parts), _latest(updated_at, related_updated_at)
+
+
+def collection_validators(kind: str, request: Request, version, updated_at):
+    # The same collection version can back many different pages and filters
+    return make_etag(kind, version, request.url.path, request.url.query), _latest(updated_at)
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _not_modified_since(header: str, last_modified: Optional[datetime]) -> bool:
+    if last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(header)
+    except (TypeError, ValueError):
+        return False
+    # HTTP dates have one-second resolution
+    return last_modified.replace(microsecond=0) <= _utc(since)
+
+
+def evaluate(request: Request, response: Response, etag: str, last_modified: Optional[datetime]) -> Optional[Response]:
+    """Set ETag/Last-Modified on `response`; return a 304 response when the client copy is current."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        fresh = _etag_matches(if_none_match, etag)
+    else:
+        if_modified_since = request.headers.get("if-modified-since")
+        fresh = if_modified_since is not None and _not_modified_since(if_modified_since, last_modified)
+    if fresh:
+        return Response(status_code=304, headers=headers)
+    return None
@@ -0,0 +1,124 @@
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import schemas
+from .models import models
+
+try:
+    _popcount = int.bit_count  # Python 3.10+
+except AttributeError:
+    def _popcount(bits: int) -> int:
+        return bin(bits).count("1")
+
+
+def bitmap(ids: Iterable[int]) -> int:
+    """Set of anime ids as an int with bit `id` set for each."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    # Set bits in a buffer and convert once; OR-ing into an int would copy it for every id
+    buffer = bytearray(max(ids) // 8 + 1)
+    for anime_id in ids:
+        buffer[anime_id >> 3] |= 1 << (anime_id & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def genre_filter(names: List[str], mode: str = "and"):
+    """WHERE clause keeping anime tagged with all (mode "and") or any ("or") of the genres."""
+    anime_genres = models.anime_genres
+    matching = (
+        select(anime_genres.c.anime_id)
+        .join(models.Genre, models.Genre.id == anime_genres.c.genre_id)
+        .where(models.Genre.name.in_(names))
+    )
+    if mode == "and":
+        matching = matching.group_by(anime_genres.c.anime_id).having(func.count() == len(set(names)))
+    return models.Anime.id.in_(matching)
+
+
+class FacetIndex:
+    """One bitmap of anime ids per genre, status and type, for counting facets by AND + popcount."""
+
+    def __init__(self, version, everything: int, genres: Dict[str, int], statuses: Dict[str, int], types: Dict[str, int]):
+        self.version = version
+        self.everything = everything
+        self.genres = genres
+        self.statuses = statuses
+        self.types = types
+
+    @classmethod
+    async def load(cls, db: AsyncSession, version) -> "FacetIndex":
+        statuses, types, ids = {}, {}, []
+        for anime_id, status, type_ in await db.execute(select(models.Anime.id, models.Anime.status, models.Anime.type)):
+            ids.append(anime_id)
+            if status is not None:
+                statuses.setdefault(status, []).append(anime_id)
+            if type_ is not None:
+                types.setdefault(type_, []).append(anime_id)
+        genres = {}
+        anime_genres = models.anime_genres
+        for anime_id, name in await db.execute(
+            select(anime_genres.c.anime_id, models.Genre.name).join(models.Genre, models.Genre.id == anime_genres.c.genre_id)
+        ):
+            genres.setdefault(name, []).append(anime_id)
+        return cls(
+            version,
+            bitmap(ids),
+            {name: bitmap(members) for name, members in genres.items()},
+            {name: bitmap(members) for name, members in statuses.items()},
+            {name: bitmap(members) for name, members in types.items()},
+        )
+
+    def matching(
+        self,
+        genres: Optional[List[str]] = None,
+        genre_mode: str = "and",
+        status: Optional[str] = None,
+        type_: Optional[str] = None,
+        ids: Optional[int] = None,
+    ) -> int:
+        """Bitmap of the anime passing the same filters as GET /anime/; `ids` is a bitmap to intersect."""
+        bits = self.everything if ids is None else self.everything & ids
+        if genres:
+            members = [self.genres.get(name, 0) for name in genres]
+            if genre_mode == "and":
+                for genre in members:
+                    bits &= genre
+            else:
+                bits &= reduce(or_, members, 0)
+        if status:
+            bits &= self.statuses.get(status, 0)
+        if type_:
+            bits &= self.types.get(type_, 0)
+        return bits
+
+    def counts(self, bits: int) -> schemas.AnimeFacets:
+        def count(bitmaps):
+            counts = {name: _popcount(bits & members) for name, members in bitmaps.items()}
+            return {name: n for name, n in sorted(counts.items()) if n}
+
+        return schemas.AnimeFacets(
+            total=_popcount(bits),
+            genres=count(self.genres),
+            statuses=count(self.statuses),
+            types=count(self.types),
+        )
+
+
+_index: Optional[FacetIndex] = None
+
+
+async def get_index(db: AsyncSession, version) -> FacetIndex:
+    """The facet index for the given anime + genres collection version, rebuilt when it moved.
+
+    Requests racing a rebuild may each build one; the last assignment wins.
+    """
+    global _index
+    index = _index
+    if index is None or index.version != version:
+        index = _index = await FacetIndex.load(db, version)
+    return index
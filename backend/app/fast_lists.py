@@ -0,0 +1,77 @@
+import json
+import os
+from collections import defaultdict
+from datetime import date, datetime
+from typing import List
+
+from dotenv import load_dotenv
+from fastapi import Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import schemas
+from .models import models
+
+try:
+    import orjson  # optional dependency; the stdlib encoder is used without it
+except ImportError:
+    orjson = None
+
+load_dotenv()
+
+# Serve the anime list from column rows encoded straight to JSON, skipping the ORM objects and
+# the per-item response_model validation. The JSON is the same as the schemas.Anime list.
+FAST_LIST_RESPONSES = os.getenv("FAST_LIST_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+# Field order follows schemas.Anime so both paths produce identical documents
+ANIME_FIELDS = [*schemas.AnimeBase.__fields__, "id"]
+STUDIO_FIELDS = list(schemas.StudioInDB.__fields__)
+GENRE_FIELDS = list(schemas.GenreInDB.__fields__)
+
+
+def anime_select():
+    """Anime columns plus the studio's, prefixed studio__, as a select() the list filters apply to."""
+    return select(
+        *(getattr(models.Anime, field) for field in ANIME_FIELDS),
+        *(getattr(models.Studio, field).label(f"studio__{field}") for field in STUDIO_FIELDS),
+    ).outerjoin(models.Studio, models.Studio.id == models.Anime.studio_id)
+
+
+async def anime_documents(db: AsyncSession, rows) -> List[dict]:
+    """schemas.Anime-shaped dicts for anime_select() rows; genres come from one extra IN query."""
+    genres = defaultdict(list)
+    if rows:
+        result = await db.execute(
+            select(models.anime_genres.c.anime_id, *(getattr(models.Genre, field) for field in GENRE_FIELDS))
+            .join(models.Genre, models.Genre.id == models.anime_genres.c.genre_id)
+            .where(models.anime_genres.c.anime_id.in_([row.id for row in rows]))
+        )
+        for anime_id, *values in result:
+            genres[anime_id].append(dict(zip(GENRE_FIELDS, values)))
+
+    documents = []
+    for row in rows:
+        document = {field: getattr(row, field) for field in ANIME_FIELDS}
+        studio = {field: getattr(row, f"studio__{field}") for field in STUDIO_FIELDS}
+        document["studio"] = studio if studio["id"] is not None else None
+        document["genres"] = genres[row.id]
+        documents.append(document)
+    return documents
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, default=_default, separators=(",", ":")).encode()
+
+
+def json_response(content, response: Response) -> Response:
+    """Encode content directly, carrying over headers set on the injected response (ETag, cursor)."""
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return Response(content=dumps(content), media_type="application/json", headers=headers)
@@ -0,0 +1,122 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Query
+from sqlalchemy.orm import joinedload, load_only, selectinload
+
+from . import schemas
+from .models import models
+
+
+def _split(value: Optional[str]) -> List[str]:
+    return [name for name in (part.strip() for part in (value or "").split(",")) if name]
+
+
+class Projection:
+    """The fields and relations one request asked for, as loader options and response documents."""
+
+    def __init__(self, resource: "Resource", fields: Sequence[str], include: Sequence[str]):
+        self.resource = resource
+        # Keep the schema's field order so projected documents read like the full ones
+        self.fields = [field for field in resource.fields if field in fields or field in resource.required]
+        self.include = [name for name in resource.relations if name in include]
+
+    @property
+    def variant(self) -> str:
+        """Canonical spelling of the projection, mixed into ETags of single resources."""
+        return "fields=%s;include=%s" % (",".join(self.fields), ",".join(self.include))
+
+    def options(self, *columns: str) -> list:
+        """load_only() of the projected fields plus `columns`, and the eager loads of the included relations."""
+        resource = self.resource
+        # Ordering columns are loaded too: the pagination cursor is read back from the last row
+        columns = dict.fromkeys((*self.fields, *resource.loaded, *columns))
+        options = [load_only(*(getattr(resource.model, column) for column in columns))]
+        for name in self.include:
+            loader, _schema, _many = resource.relations[name]
+            options.append(loader(getattr(resource.model, name)))
+        return options
+
+    def document(self, row) -> dict:
+        document = {field: getattr(row, field) for field in self.fields}
+        for name in self.include:
+            _loader, schema, many = self.resource.relations[name]
+            value = getattr(row, name)
+            if many:
+                document[name] = [_nested(schema, item) for item in value]
+            else:
+                document[name] = _nested(schema, value) if value is not None else None
+        return document
+
+
+def _nested(schema, row) -> dict:
+    return {field: getattr(row, field) for field in schema.__fields__}
+
+
+class Resource:
+    """?fields= (and ?include= when the schema embeds relations) for one catalog response schema.
+
+    `relations` maps an embedded attribute to (eager loader, its schema, is a list). `loaded`
+    names columns always read from the database, e.g. those the list is ordered by.
+    """
+
+    def __init__(
+        self,
+        model,
+        schema,
+        relations: Dict[str, Tuple] = None,
+        required: Sequence[str] = ("id",),
+        loaded: Sequence[str] = ("id",),
+    ):
+        self.model = model
+        self.relations = relations or {}
+        self.fields = [field for field in schema.__fields__ if field not in self.relations]
+        self.required = tuple(required)
+        self.loaded = tuple(loaded)
+        self.dependency = self._dependency()
+        # Projected documents skip response_model validation, so say in the OpenAPI document
+        # that the advertised schema is the unprojected one
+        self.responses = {200: {"description": self._description()}}
+
+    def _description(self) -> str:
+        if not self.relations:
+            return "Without ?fields= the full representation; with it, documents hold id and the listed fields only."
+        return (
+            "Without ?fields= or ?include= the full representation. With either, documents hold id, the fields "
+            "listed in ?fields= (all when omitted) and only the relations named in ?include= (%s)." % ", ".join(self.relations)
+        )
+
+    def parse(self, fields: Optional[str], include: Optional[str]) -> Optional[Projection]:
+        """None when neither parameter was given: the route serves its full representation."""
+        if fields is None and include is None:
+            return None
+        requested = _split(fields) if fields is not None else self.fields
+        included = _split(include)
+        unknown = [name for name in requested if name not in self.fields]
+        unknown += [name for name in included if name not in self.relations]
+        if unknown:
+            raise HTTPException(status_code=400, detail="Unknown field(s): %s" % ", ".join(unknown))
+        return Projection(self, requested, included)
+
+    def _dependency(self):
+        fields_query = Query(None, description="Comma-separated fields to return: %s (id is always returned)" % ", ".join(self.fields))
+        if not self.relations:
+            def projection(fields: Optional[str] = fields_query) -> Optional[Projection]:
+                return self.parse(fields, None)
+            return projection
+
+        include_query = Query(None, description="Comma-separated related objects to embed: %s" % ", ".join(self.relations))
+
+        def projection(fields: Optional[str] = fields_query, include: Optional[str] = include_query) -> Optional[Projection]:
+            return self.parse(fields, include)
+        return projection
+
+
+ANIME = Resource(
+    models.Anime,
+    schemas.Anime,
+    # genres are loaded with a separate IN query so the LIMIT applies to anime rows, not to the collection join
+    relations={"studio": (joinedload, schemas.StudioInDB, False), "genres": (selectinload, schemas.GenreInDB, True)},
+    loaded=("id", "title"),
+)
+CHARACTERS = Resource(models.Character, schemas.Character)
+EPISODES = Resource(models.Episode, schemas.Episode, loaded=("id", "episode_number"))
@@ -0,0 +1,98 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterator
+
+from sqlalchemy import select
+
+from .database import SessionLocal
+from .models import models
+
+# Rows fetched per round trip; with yield_per the driver streams (a server-side cursor on
+# Postgres) instead of buffering the whole result
+FETCH_SIZE = 1000
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+CSV_COLUMNS = [
+    "type", "anime_id", "anime_title", "character_id", "character_name",
+    "episodes_watched", "status", "score", "updated_at",
+]
+
+
+def _progress_rows(user_id: int):
+    progress = models.UserAnimeProgress
+    return (
+        select(
+            progress.anime_id,
+            models.Anime.title.label("anime_title"),
+            progress.episodes_watched,
+            progress.status,
+            progress.score,
+            progress.last_updated.label("updated_at"),
+        )
+        .join(models.Anime, models.Anime.id == progress.anime_id)
+        .where(progress.user_id == user_id)
+        .order_by(progress.id)
+    )
+
+
+def _favorite_rows(user_id: int):
+    favorite = models.UserFavorite
+    return (
+        select(
+            favorite.anime_id,
+            models.Anime.title.label("anime_title"),
+            favorite.character_id,
+            models.Character.name.label("character_name"),
+            favorite.created_at.label("updated_at"),
+        )
+        .outerjoin(models.Anime, models.Anime.id == favorite.anime_id)
+        .outerjoin(models.Character, models.Character.id == favorite.character_id)
+        .where(favorite.user_id == user_id)
+        .order_by(favorite.id)
+    )
+
+
+def _records(user_id: int) -> Iterator[list]:
+    """Chunks of export records (dicts), read through a session owned by the stream."""
+    with SessionLocal() as db:
+        for kind, statement in (("progress", _progress_rows(user_id)), ("favorite", _favorite_rows(user_id))):
+            result = db.execute(statement.execution_options(yield_per=FETCH_SIZE))
+            for rows in result.mappings().partitions():
+                yield [dict(row, type=kind) for row in rows]
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def stream_ndjson(user_id: int) -> Iterator[str]:
+    for records in _records(user_id):
+        yield "".join(json.dumps(record, default=_json_default) + "\n" for record in records)
+
+
+def stream_csv(user_id: int) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for records in _records(user_id):
+        writer.writerows(records)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    # Header only, for an empty library
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+STREAMS = {
+    "ndjson": stream_ndjson,
+    "csv": stream_csv,
+}
@@ -0,0 +1,183 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from sqlalchemy import Integer, cast, delete, func, insert, literal, null, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import schemas
+from .models import models
+from .pagination import decode_cursor, encode_cursor
+
+load_dotenv()
+
+# Rows changed this long before the previous sync's newest row are sent again: last_updated
+# is taken when a write starts, so a slow write can commit behind rows already handed out
+LIBRARY_SYNC_OVERLAP_SECONDS = float(os.getenv("LIBRARY_SYNC_OVERLAP_SECONDS", 60))
+# Tombstones kept by prune_changes.py; clients further behind must fetch the whole library
+LIBRARY_TOMBSTONE_RETENTION_DAYS = float(os.getenv("LIBRARY_TOMBSTONE_RETENTION_DAYS", 30))
+
+PROGRESS = "progress"
+FAVORITE = "favorite"
+
+
+def record_deletions(db: Session, anime_ids: Iterable[int] = (), character_ids: Iterable[int] = ()):
+    """Tombstone the progress and favorites ON DELETE CASCADE is about to remove with these
+    anime or characters; the tombstones are what their owners' next sync sees change.
+
+    One statement whatever the number of rows; call in the delete's transaction, before it.
+    """
+    progress, favorite = models.UserAnimeProgress, models.UserFavorite
+    anime_ids, character_ids = list(anime_ids), list(character_ids)
+    removed = []
+    if anime_ids:
+        removed.append(
+            select(progress.user_id, literal(PROGRESS).label("kind"), progress.anime_id, cast(null(), Integer).label("character_id"))
+            .where(progress.anime_id.in_(anime_ids))
+        )
+        removed.append(
+            select(favorite.user_id, literal(FAVORITE).label("kind"), favorite.anime_id, favorite.character_id)
+            .where(favorite.anime_id.in_(anime_ids))
+        )
+    if character_ids:
+        removed.append(
+            select(favorite.user_id, literal(FAVORITE).label("kind"), favorite.anime_id, favorite.character_id)
+            .where(favorite.character_id.in_(character_ids))
+        )
+    if not removed:
+        return
+
+    rows = union_all(*removed).subquery()
+    db.execute(
+        insert(models.LibraryTombstone).from_select(["user_id", "kind", "anime_id", "character_id"], select(rows))
+    )
+
+
+def prune(db: Session, older_than: timedelta) -> int:
+    """Delete tombstones older than `older_than`; returns how many. Does not commit."""
+    LibraryTombstone = models.LibraryTombstone
+    cutoff = datetime.now(timezone.utc) - older_than
+    return db.execute(delete(LibraryTombstone).where(LibraryTombstone.deleted_at < cutoff)).rowcount
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite hands back naive timestamps; they are UTC (CURRENT_TIMESTAMP)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _isoformat(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value is not None else None
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return _utc(datetime.fromisoformat(value)) if value is not None else None
+
+
+def encode_token(watermark: Optional[datetime], issued_at: datetime) -> str:
+    return encode_cursor([_isoformat(watermark), _isoformat(issued_at)])
+
+
+def parse_since(since: str) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """(watermark, issued at) of a token from an earlier sync, or (time, None) for an
+    ISO 8601 timestamp."""
+    try:
+        return _utc(datetime.fromisoformat(since.replace("Z", "+00:00"))), None
+    except ValueError:
+        pass
+    try:
+        watermark, issued_at = decode_cursor(since, 2)
+        return _parse(watermark), _parse(issued_at)
+    except (HTTPException, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="since must be an ISO 8601 timestamp or the token of an earlier sync")
+
+
+async def _probe(db: AsyncSession, user_id: int) -> Tuple[datetime, Optional[datetime]]:
+    """(database time, the user's newest progress, favorite or tombstone timestamp), each
+    read from the top of its (user_id, timestamp) index."""
+    progress, favorite, tombstone = models.UserAnimeProgress, models.UserFavorite, models.LibraryTombstone
+    now, *latest = (await db.execute(select(
+        func.now(),
+        select(func.max(progress.last_updated)).where(progress.user_id == user_id).scalar_subquery(),
+        select(func.max(favorite.created_at)).where(favorite.user_id == user_id).scalar_subquery(),
+        select(func.max(tombstone.deleted_at)).where(tombstone.user_id == user_id).scalar_subquery(),
+    ))).one()
+    return _utc(now), max((_utc(value) for value in latest if value is not None), default=None)
+
+
+def _unchanged(latest: Optional[datetime], watermark: Optional[datetime], issued_at: Optional[datetime]) -> bool:
+    """Whether nothing can have changed since the token was issued.
+
+    A write's timestamp is taken when it starts, so one that commits after the token may
+    still carry a timestamp at or below the watermark. Writes shorter than
+    LIBRARY_SYNC_OVERLAP_SECONDS cannot once the token was issued more than that after its
+    watermark (strictly: SQLite timestamps have one-second resolution); until then the rows
+    are fetched again.
+    """
+    if issued_at is None:
+        return False
+    if watermark is None:
+        return latest is None
+    return (latest is None or latest <= watermark) and watermark < issued_at - timedelta(seconds=LIBRARY_SYNC_OVERLAP_SECONDS)
+
+
+async def _progress_since(db: AsyncSession, user_id: int, floor: Optional[datetime]):
+    progress = models.UserAnimeProgress
+    statement = select(
+        progress.anime_id, progress.episodes_watched, progress.status, progress.score, progress.last_updated.label("updated_at")
+    ).where(progress.user_id == user_id)
+    if floor is not None:
+        statement = statement.where(progress.last_updated >= floor)
+    return [schemas.LibraryProgress(**row) for row in (await db.execute(statement.order_by(progress.last_updated))).mappings()]
+
+
+async def _favorites_since(db: AsyncSession, user_id: int, floor: Optional[datetime]):
+    favorite = models.UserFavorite
+    statement = select(
+        favorite.anime_id, favorite.character_id, favorite.created_at.label("updated_at")
+    ).where(favorite.user_id == user_id)
+    if floor is not None:
+        statement = statement.where(favorite.created_at >= floor)
+    return [schemas.LibraryFavorite(**row) for row in (await db.execute(statement.order_by(favorite.created_at))).mappings()]
+
+
+async def _tombstones_since(db: AsyncSession, user_id: int, floor: Optional[datetime]):
+    tombstone = models.LibraryTombstone
+    statement = select(
+        tombstone.kind, tombstone.anime_id, tombstone.character_id, tombstone.deleted_at
+    ).where(tombstone.user_id == user_id)
+    if floor is not None:
+        statement = statement.where(tombstone.deleted_at >= floor)
+    return [schemas.LibraryTombstone(**row) for row in (await db.execute(statement.order_by(tombstone.deleted_at))).mappings()]
+
+
+async def delta(db: AsyncSession, user_id: int, since: Optional[str] = None) -> schemas.LibraryDelta:
+    """The user's progress and favorites changed since `since`, plus tombstones of removed ones.
+
+    Without `since` the whole library is returned. With a token and nothing newer than its
+    newest row, the answer costs one statement probing the top of each (user_id, timestamp)
+    index. Otherwise each table is range-scanned on that index from the token's newest row
+    minus LIBRARY_SYNC_OVERLAP_SECONDS, so a few rows may come again; clients apply them by
+    key, newest timestamp winning.
+    """
+    # Probed before the rows: a write landing in between is newer than the token and fetched next time
+    now, latest = await _probe(db, user_id)
+    watermark, issued_at = parse_since(since) if since is not None else (None, None)
+    if _unchanged(latest, watermark, issued_at):
+        return schemas.LibraryDelta(full=False, token=since)
+    if watermark is not None and watermark < datetime.now(timezone.utc) - timedelta(days=LIBRARY_TOMBSTONE_RETENTION_DAYS):
+        raise HTTPException(status_code=410, detail="Deletions this old are no longer kept; sync again without since")
+
+    full = since is None
+    floor = watermark - timedelta(seconds=LIBRARY_SYNC_OVERLAP_SECONDS) if watermark is not None else None
+    progress = await _progress_since(db, user_id, floor)
+    favorites = await _favorites_since(db, user_id, floor)
+    deleted = [] if full else await _tombstones_since(db, user_id, floor)
+
+    seen = [item.updated_at for item in progress] + [item.updated_at for item in favorites] + [item.deleted_at for item in deleted]
+    newest = max([_utc(value) for value in seen if value is not None] + ([watermark] if watermark is not None else []), default=None)
+    return schemas.LibraryDelta(
+        full=full, progress=progress, favorites=favorites, deleted=deleted, token=encode_token(newest, now)
+    )
@@ -1,12 +1,13 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .database import engine
-from .models import models
-from .routers import auth, users, studios, genres, characters, episodes, anime, favorites
+from . import catalog_snapshot, changes
+from .pagination import NEXT_CURSOR_HEADER
+from .rate_limit import RateLimitMiddleware
+from .sql_instrumentation import SQL_STATS_HEADER, SQLStatsMiddleware
+from .routers import auth, users, studios, genres, characters, episodes, anime, favorites, admin, changes as changes_router
 
-# Create all tables in the database
-models.Base.metadata.create_all(bind=engine)
+# The schema is managed by migrations (alembic upgrade head / init_db.py), not created at import
 
 app = FastAPI(
     title="Anime Collection Tracker API",
@@ -14,6 +15,13 @@ app = FastAPI(
     version="0.1.0",
 )
 
+# Count the SQL each request runs (X-SQL-Stats header, N+1 warnings in the app.sql log)
+app.add_middleware(SQLStatsMiddleware)
+
+# Per-client rate limits and per-route-class concurrency caps (429/503 with Retry-After);
+# added after SQL stats so it runs before it, and before CORS so rejections carry CORS headers
+app.add_middleware(RateLimitMiddleware)
+
 # Configure CORS
 origins = [
     "http://localhost:3000",  # Common alternative frontend port
@@ -27,6 +35,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Last-Modified", "Retry-After", SQL_STATS_HEADER],
 )
 
 # Include routers
@@ -38,6 +47,27 @@ app.include_router(characters.router)
 app.include_router(episodes.router)
 app.include_router(anime.router)
 app.include_router(favorites.router)
+app.include_router(admin.router)
+app.include_router(changes_router.router)
+
+@app.on_event("startup")
+async def load_catalog_snapshot():
+    # Opt-in: serve the anime/studio/genre GETs from memory, refreshed in the background
+    if catalog_snapshot.CATALOG_SNAPSHOT:
+        await catalog_snapshot.snapshot.start()
+
+@app.on_event("shutdown")
+async def stop_catalog_snapshot():
+    await catalog_snapshot.snapshot.stop()
+
+@app.on_event("startup")
+async def start_change_feed():
+    # Started here rather than by the first subscriber so the poller runs outside any request context
+    await changes.feed.start()
+
+@app.on_event("shutdown")
+async def stop_change_feed():
+    await changes.feed.stop()
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,14 @@
+import os
+
+from alembic import command
+from alembic.config import Config
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+def upgrade(revision: str = "head"):
+    """Apply schema migrations up to `revision` (what `alembic upgrade head` does)."""
+    config = Config(ALEMBIC_INI)
+    # Leave the caller's logging setup alone
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, revision)
@@ -1,30 +1,33 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Text, Date, Table
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime, Text, Date, Table, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from .database import Base
+from ..database import Base
 
 # Association tables for many-to-many relationships
 anime_genres = Table(
     'anime_genres',
     Base.metadata,
-    Column('anime_id', Integer, ForeignKey('anime.id'), primary_key=True),
-    Column('genre_id', Integer, ForeignKey('genres.id'), primary_key=True)
+    Column('anime_id', Integer, ForeignKey('anime.id', ondelete='CASCADE'), primary_key=True),
+    Column('genre_id', Integer, ForeignKey('genres.id', ondelete='CASCADE'), primary_key=True),
+    Index('ix_anime_genres_genre_id', 'genre_id', 'anime_id') # reverse lookup: anime of a genre
 )
 
 anime_characters = Table(
     'anime_characters',
     Base.metadata,
-    Column('anime_id', Integer, ForeignKey('anime.id'), primary_key=True),
-    Column('character_id', Integer, ForeignKey('characters.id'), primary_key=True),
-    Column('role', String) # e.g., 'Main', 'Supporting'
+    Column('anime_id', Integer, ForeignKey('anime.id', ondelete='CASCADE'), primary_key=True),
+    Column('character_id', Integer, ForeignKey('characters.id', ondelete='CASCADE'), primary_key=True),
+    Column('role', String), # e.g., 'Main', 'Supporting'
+    Index('ix_anime_characters_character_id', 'character_id', 'anime_id') # reverse lookup: anime of a character
 )
 
 character_voice_actors = Table(
     'character_voice_actors',
     Base.metadata,
-    Column('character_id', Integer, ForeignKey('characters.id'), primary_key=True),
-    Column('voice_actor_id', Integer, ForeignKey('voice_actors.id'), primary_key=True),
-    Column('language', String) # e.g., 'Japanese', 'English'
+    Column('character_id', Integer, ForeignKey('characters.id', ondelete='CASCADE'), primary_key=True),
+    Column('voice_actor_id', Integer, ForeignKey('voice_actors.id', ondelete='CASCADE'), primary_key=True),
+    Column('language', String), # e.g., 'Japanese', 'English'
+    Index('ix_character_voice_actors_voice_actor_id', 'voice_actor_id', 'character_id') # reverse lookup: characters of a voice actor
 )
 
 
@@ -50,8 +53,11 @@ class Studio(Base):
     country = Column(String)
     founded_year = Column(Integer)
 
-    # Relationships
-    anime = relationship("Anime", back_populates="studio")
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relationships; deleting a studio leaves its anime without one (ON DELETE SET NULL)
+    anime = relationship("Anime", back_populates="studio", passive_deletes=True)
 
 
 class Anime(Base):
@@ -67,27 +73,38 @@ class Anime(Base):
     release_date = Column(Date)
     end_date = Column(Date)
     cover_url = Column(String)
+    external_id = Column(String, unique=True, index=True) # catalog import key; re-importing a document updates its anime
 
-    studio_id = Column(Integer, ForeignKey("studios.id"))
+    studio_id = Column(Integer, ForeignKey("studios.id", ondelete="SET NULL"), index=True)
 
-    # Relationships
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relationships; the database deletes the dependent rows (ON DELETE CASCADE), so the
+    # ORM never loads them to delete an anime
     studio = relationship("Studio", back_populates="anime")
-    episodes = relationship("Episode", back_populates="anime")
-    genres = relationship("Genre", secondary=anime_genres, back_populates="anime")
-    characters = relationship("Character", secondary=anime_characters, back_populates="anime")
-    user_anime_progress = relationship("UserAnimeProgress", back_populates="anime")
-    user_favorites = relationship("UserFavorite", back_populates="anime")
+    episodes = relationship("Episode", back_populates="anime", passive_deletes=True)
+    genres = relationship("Genre", secondary=anime_genres, back_populates="anime", passive_deletes=True)
+    characters = relationship("Character", secondary=anime_characters, back_populates="anime", passive_deletes=True)
+    user_anime_progress = relationship("UserAnimeProgress", back_populates="anime", passive_deletes=True)
+    user_favorites = relationship("UserFavorite", back_populates="anime", passive_deletes=True)
 
 
 class Episode(Base):
     __tablename__ = "episodes"
+    __table_args__ = (
+        UniqueConstraint("anime_id", "episode_number", name="uq_episodes_anime_episode_number"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    anime_id = Column(Integer, ForeignKey("anime.id"))
+    anime_id = Column(Integer, ForeignKey("anime.id", ondelete="CASCADE"))
     episode_number = Column(Integer, nullable=False)
     title = Column(String)
     duration_minutes = Column(Integer)
-    air_date = Column(Date)
+    air_date = Column(Date, index=True) # airing calendar range scans
+
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     # Relationships
     anime = relationship("Anime", back_populates="episodes")
@@ -95,28 +112,54 @@ class Episode(Base):
 
 class UserAnimeProgress(Base):
     __tablename__ = "user_anime_progress"
+    __table_args__ = (
+        # One progress row per user and anime; also the conflict target for batch sync upserts
+        UniqueConstraint("user_id", "anime_id", name="uq_user_anime_progress_user_anime"),
+        # Library delta sync: a user's rows changed since a point in time
+        Index("ix_user_anime_progress_user_last_updated", "user_id", "last_updated"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    anime_id = Column(Integer, ForeignKey("anime.id"))
+    anime_id = Column(Integer, ForeignKey("anime.id", ondelete="CASCADE"), index=True)
     episodes_watched = Column(Integer, default=0)
     status = Column(String) # e.g., 'Watching', 'Completed', 'On Hold', 'Dropped', 'Plan to Watch'
     score = Column(Integer) # 1-10
     last_updated = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    client_updated_at = Column(DateTime(timezone=True)) # when the client made the change; last writer wins
 
     # Relationships
     user = relationship("User", back_populates="user_anime_progress")
     anime = relationship("Anime", back_populates="user_anime_progress")
 
 
+# Aggregates of user_anime_progress per anime, kept current by the progress write paths
+class AnimeStats(Base):
+    __tablename__ = "anime_stats"
+
+    anime_id = Column(Integer, ForeignKey("anime.id", ondelete="CASCADE"), primary_key=True)
+    members = Column(Integer, nullable=False, server_default="0") # progress rows, whatever their status
+    scored = Column(Integer, nullable=False, server_default="0") # progress rows with a score
+    score_sum = Column(Integer, nullable=False, server_default="0")
+    watching = Column(Integer, nullable=False, server_default="0")
+    completed = Column(Integer, nullable=False, server_default="0")
+    on_hold = Column(Integer, nullable=False, server_default="0")
+    dropped = Column(Integer, nullable=False, server_default="0")
+    plan_to_watch = Column(Integer, nullable=False, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
 class Genre(Base):
     __tablename__ = "genres"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, index=True, nullable=False)
 
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
     # Relationships
-    anime = relationship("Anime", secondary=anime_genres, back_populates="genres")
+    anime = relationship("Anime", secondary=anime_genres, back_populates="genres", passive_deletes=True)
 
 
 class Character(Base):
@@ -127,10 +170,13 @@ class Character(Base):
     description = Column(Text)
     image_url = Column(String)
 
-    # Relationships
-    anime = relationship("Anime", secondary=anime_characters, back_populates="characters")
-    voice_actors = relationship("VoiceActor", secondary=character_voice_actors, back_populates="characters")
-    user_favorites = relationship("UserFavorite", back_populates="character")
+    version = Column(Integer, nullable=False, server_default="1")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    # Relationships; links and favorites go with the character (ON DELETE CASCADE)
+    anime = relationship("Anime", secondary=anime_characters, back_populates="characters", passive_deletes=True)
+    voice_actors = relationship("VoiceActor", secondary=character_voice_actors, back_populates="characters", passive_deletes=True)
+    user_favorites = relationship("UserFavorite", back_populates="character", passive_deletes=True)
 
 
 class VoiceActor(Base):
@@ -142,19 +188,62 @@ class VoiceActor(Base):
     birthdate = Column(Date)
 
     # Relationships
-    characters = relationship("Character", secondary=character_voice_actors, back_populates="voice_actors")
+    characters = relationship("Character", secondary=character_voice_actors, back_populates="voice_actors", passive_deletes=True)
 
 
 class UserFavorite(Base):
     __tablename__ = "user_favorites"
+    __table_args__ = (
+        # A user's favorites, and for library delta sync the ones added since a point in time
+        Index("ix_user_favorites_user_created_at", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
-    anime_id = Column(Integer, ForeignKey("anime.id"), nullable=True) # Either anime or character can be favorited
-    character_id = Column(Integer, ForeignKey("characters.id"), nullable=True)
+    anime_id = Column(Integer, ForeignKey("anime.id", ondelete="CASCADE"), nullable=True) # Either anime or character can be favorited
+    character_id = Column(Integer, ForeignKey("characters.id", ondelete="CASCADE"), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
     user = relationship("User", back_populates="user_favorites")
     anime = relationship("Anime", back_populates="user_favorites")
-    character = relationship("Character", back_populates="user_favorites")
\ No newline at end of file
+    character = relationship("Character", back_populates="user_favorites")
+
+
+# Progress and favorites removed with their anime or character, kept so library delta sync
+# can report deletions; pruned by prune_changes.py
+class LibraryTombstone(Base):
+    __tablename__ = "library_tombstones"
+    __table_args__ = (
+        Index("ix_library_tombstones_user_deleted_at", "user_id", "deleted_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    kind = Column(String, nullable=False) # 'progress' or 'favorite'
+    anime_id = Column(Integer)
+    character_id = Column(Integer)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# Version counter per catalog collection, bumped by every write to it (backs list ETags)
+class CollectionVersion(Base):
+    __tablename__ = "collection_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, server_default="0")
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+# Outbox of catalog writes, appended in the same transaction as the write; read by GET /changes
+# and its SSE stream. seq orders the changes; entity is a collection name from app.conditional
+class CatalogChange(Base):
+    __tablename__ = "catalog_changes"
+    # Never reuse a pruned seq on SQLite, or a consumer holding it would silently skip changes
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False) # 'upsert' or 'delete'
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True) # retention pruning
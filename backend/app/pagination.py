@@ -0,0 +1,111 @@
+import base64
+import binascii
+import bisect
+import json
+from typing import Any, List, Optional, Sequence
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Response header carrying the cursor for the next page (absent on the last page)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def _after(columns, values):
+    # Row-value comparison (c1, c2, ...) > (v1, v2, ...) spelled out so it works on every backend
+    clauses = []
+    for i, column in enumerate(columns):
+        equal_prefix = [columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal_prefix, column > values[i]))
+    return or_(*clauses)
+
+
+def _page(query, columns, after, skip, limit):
+    query = query.order_by(*columns)
+    if after is not None:
+        query = query.filter(_after(columns, decode_cursor(after, len(columns))))
+    elif skip:
+        query = query.offset(skip)
+    return query.limit(limit)
+
+
+def _set_next_cursor(items, columns, response: Response, limit: int):
+    if items and len(items) == limit:
+        last = items[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([getattr(last, column.key) for column in columns])
+
+
+def paginate(
+    query,
+    columns: Sequence,
+    response: Response,
+    after: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+):
+    """Page a query either by keyset cursor (`after`) or by the legacy `skip` offset.
+
+    `columns` must be a unique, non-null ordering (ending with the primary key). When a
+    full page is returned, the cursor for the next page is sent in the X-Next-Cursor header.
+    """
+    items = _page(query, columns, after, skip, limit).all()
+    _set_next_cursor(items, columns, response, limit)
+    return items
+
+
+async def paginate_async(
+    db: AsyncSession,
+    statement,
+    columns: Sequence,
+    response: Response,
+    after: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    scalars: bool = True,
+):
+    """`paginate` for a `select()` statement run on an AsyncSession.
+
+    With `scalars=False` the statement's rows are returned instead of the first entity.
+    """
+    result = await db.execute(_page(statement, columns, after, skip, limit))
+    items = result.scalars().all() if scalars else result.all()
+    _set_next_cursor(items, columns, response, limit)
+    return items
+
+
+def paginate_ids(
+    ids: Sequence[int],
+    response: Response,
+    after: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+) -> List[int]:
+    """`paginate` over ids already sorted in memory, with the same cursors as paging by (id,)."""
+    if after is not None:
+        (last_id,) = decode_cursor(after, 1)
+        if not isinstance(last_id, int):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        start = bisect.bisect_right(ids, last_id)
+    else:
+        start = skip
+    page = list(ids[start:start + limit])
+    if page and len(page) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor([page[-1]])
+    return page
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+# Upper bounds (ms) of the checkout-wait histogram buckets; the last bucket is unbounded
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class CheckoutHistogram:
+    def __init__(self, buckets=WAIT_BUCKETS_MS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(buckets) + 1)
+        self._count = 0
+        self._sum_ms = 0.0
+        self._max_ms = 0.0
+        self._timeouts = 0
+
+    def observe(self, seconds: float):
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(self.buckets) if ms <= bound), len(self.buckets))
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum_ms += ms
+            self._max_ms = max(self._max_ms, ms)
+
+    def timed_out(self):
+        with self._lock:
+            self._timeouts += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            return {
+                "count": self._count,
+                "timeouts": self._timeouts,
+                "sum_ms": round(self._sum_ms, 2),
+                "max_ms": round(self._max_ms, 2),
+                # Per-bucket counts keyed by upper bound, not cumulative
+                "buckets": dict(zip([f"le_{bound}" for bound in self.buckets] + ["inf"], counts)),
+            }
+
+
+class _InstrumentedPool:
+    """Times every checkout: waiting for a free connection, opening an overflow one and the pre-ping."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkout_wait = CheckoutHistogram()
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep the history
+        new_pool = super().recreate()
+        new_pool.checkout_wait = self.checkout_wait
+        return new_pool
+
+    def connect(self):
+        started_at = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            self.checkout_wait.timed_out()
+            raise
+        finally:
+            self.checkout_wait.observe(time.perf_counter() - started_at)
+
+
+class InstrumentedQueuePool(_InstrumentedPool, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_InstrumentedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(pool) -> dict:
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            in_use=pool.checkedout(),
+            idle=pool.checkedin(),
+            # QueuePool counts overflow from -size while the pool is filling up
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+            timeout_seconds=pool.timeout(),
+        )
+    stats["recycle_seconds"] = pool._recycle
+    stats["pre_ping"] = pool._pre_ping
+    if isinstance(pool, _InstrumentedPool):
+        stats["checkout_wait_ms"] = pool.checkout_wait.snapshot()
+    return stats
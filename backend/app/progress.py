@@ -0,0 +1,91 @@
+from datetime import datetime, timezone
+from typing import List
+
+from fastapi import HTTPException
+from sqlalchemy import func, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import anime_stats, schemas
+from .models import models
+
+# Dialects whose INSERT supports ON CONFLICT ... DO UPDATE ... WHERE with RETURNING
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def _utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def upsert_progress_batch(db: Session, user_id: int, items: List[schemas.UserAnimeProgressSyncItem]) -> schemas.UserAnimeProgressBatchResult:
+    """Apply many progress changes for one user in a single INSERT ... ON CONFLICT DO UPDATE.
+
+    A change only overwrites a stored row whose client_updated_at is older (last writer wins).
+    Does not commit.
+    """
+    insert = UPSERT_INSERTS.get(db.get_bind().dialect.name)
+    if insert is None:
+        raise HTTPException(status_code=501, detail="Batch progress sync is not supported on this database")
+
+    # Within one batch the newest change per anime wins as well
+    latest = {}
+    for item in items:
+        current = latest.get(item.anime_id)
+        if current is None or _utc(item.client_updated_at) > _utc(current.client_updated_at):
+            latest[item.anime_id] = item
+    if not latest:
+        return schemas.UserAnimeProgressBatchResult()
+
+    existing = set(db.execute(select(models.Anime.id).where(models.Anime.id.in_(list(latest)))).scalars())
+    progress = models.UserAnimeProgress.__table__
+    # Stored (status, score) of the rows about to change, for the anime_stats deltas
+    before = {
+        row.anime_id: (row.status, row.score)
+        for row in db.execute(
+            select(progress.c.anime_id, progress.c.status, progress.c.score)
+            .where(progress.c.user_id == user_id, progress.c.anime_id.in_(list(existing)))
+        )
+    }
+    unknown = sorted(set(latest) - existing)
+    rows = [
+        {
+            "user_id": user_id,
+            "anime_id": item.anime_id,
+            "episodes_watched": item.episodes_watched,
+            "status": item.status,
+            "score": item.score,
+            "client_updated_at": _utc(item.client_updated_at),
+        }
+        for anime_id, item in latest.items()
+        if anime_id in existing
+    ]
+    if not rows:
+        return schemas.UserAnimeProgressBatchResult(unknown=unknown)
+
+    statement = insert(progress).values(rows)
+    statement = statement.on_conflict_do_update(
+        index_elements=[progress.c.user_id, progress.c.anime_id],
+        set_={
+            "episodes_watched": statement.excluded.episodes_watched,
+            "status": statement.excluded.status,
+            "score": statement.excluded.score,
+            "client_updated_at": statement.excluded.client_updated_at,
+            "last_updated": func.now(),
+        },
+        where=or_(progress.c.client_updated_at.is_(None), progress.c.client_updated_at < statement.excluded.client_updated_at),
+    ).returning(progress.c.anime_id)
+    applied = set(db.execute(statement).scalars())
+    anime_stats.record_changes(
+        db, ((anime_id, before.get(anime_id), (latest[anime_id].status, latest[anime_id].score)) for anime_id in applied)
+    )
+
+    return schemas.UserAnimeProgressBatchResult(
+        applied=sorted(applied),
+        stale=sorted(anime_id for anime_id in existing if anime_id not in applied),
+        unknown=unknown,
+    )
@@ -0,0 +1,275 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from typing import Callable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from dotenv import load_dotenv
+from jose import JWTError, jwt
+
+from .auth.auth import ALGORITHM, SECRET_KEY
+
+load_dotenv()
+
+logger = logging.getLogger("app.rate_limit")
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+# Optional shared store so all workers count against the same limits, e.g. redis://localhost:6379/1
+RATE_LIMIT_URL = os.getenv("RATE_LIMIT_URL")
+# Client keys kept by the in-process store before idle ones are dropped
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# Identify clients by the first X-Forwarded-For address; only behind a proxy that sets it
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() in ("1", "true", "yes")
+
+SEARCH_PATHS = ("/anime/", "/anime/facets", "/characters/")
+
+
+class RouteClass:
+    """Requests limited together: `rate` per second and `burst` at once per client, and at
+    most `concurrency` in flight per worker across all clients."""
+
+    def __init__(self, name: str, rate: float, burst: int, concurrency: int, matches: Callable[[str, str, bytes], bool]):
+        prefix = f"RATE_LIMIT_{name.upper()}_"
+        self.name = name
+        self.rate = float(os.getenv(prefix + "RATE", rate))
+        self.burst = int(os.getenv(prefix + "BURST", burst))
+        self.concurrency = int(os.getenv(prefix + "CONCURRENCY", concurrency))
+        self.matches = matches
+        self.in_flight = 0
+        self.allowed = 0
+        self.limited = 0
+        self.shed = 0
+
+    def stats(self) -> dict:
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "shed": self.shed,
+        }
+
+
+def _has_search(query_string: bytes) -> bool:
+    return bool(parse_qs(query_string.decode("latin-1")).get("search"))
+
+
+# First match wins; every request falls into one class
+ROUTE_CLASSES = [
+    # bcrypt makes every call expensive
+    RouteClass("auth", 0.2, 5, 32, lambda method, path, query: method == "POST" and path in ("/auth/token", "/auth/register")),
+    # Ranked search cannot use the list ETags or the catalog snapshot
+    RouteClass("search", 2, 10, 16, lambda method, path, query: method == "GET" and path in SEARCH_PATHS and _has_search(query)),
+    # Long-lived SSE connections; kept out of the read class so they cannot fill its slots
+    RouteClass("stream", 0.2, 5, 500, lambda method, path, query: method == "GET" and path == "/changes/stream"),
+    RouteClass("write", 10, 20, 64, lambda method, path, query: method not in ("GET", "HEAD")),
+    RouteClass("read", 20, 50, 256, lambda method, path, query: True),
+]
+
+
+def classify(method: str, path: str, query_string: bytes) -> RouteClass:
+    for route_class in ROUTE_CLASSES:
+        if route_class.matches(method, path, query_string):
+            return route_class
+    return ROUTE_CLASSES[-1]
+
+
+class LocalRateLimitBackend:
+    """In-process GCRA (the token bucket kept as one "theoretical arrival time" per key).
+
+    Only the event loop thread touches it and `hit` never awaits between reading and
+    writing a key, so no lock is needed. Counts are per worker.
+    """
+
+    name = "local"
+
+    def __init__(self, max_keys: int):
+        self.max_keys = max_keys
+        self._arrivals = {}
+
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        now = time.monotonic()
+        interval = 1 / rate
+        arrival = max(self._arrivals.get(key, now), now) + interval
+        allowed_at = arrival - burst * interval
+        if allowed_at > now:
+            return allowed_at - now
+        self._arrivals[key] = arrival
+        if len(self._arrivals) > self.max_keys:
+            self._prune(now)
+        return 0.0
+
+    def _prune(self, now: float):
+        # A key whose arrival time has passed holds a full bucket: same as no key at all
+        self._arrivals = {key: arrival for key, arrival in self._arrivals.items() if arrival > now}
+        while len(self._arrivals) > self.max_keys:
+            del self._arrivals[next(iter(self._arrivals))]
+
+    def size(self) -> int:
+        return len(self._arrivals)
+
+
+# KEYS[1]: bucket; ARGV: now (ms), interval (ms), burst. Returns the ms to wait, 0 when allowed.
+GCRA_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local arrival = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now) + interval
+local allowed_at = arrival - tonumber(ARGV[3]) * interval
+if allowed_at > now then
+    return math.ceil(allowed_at - now)
+end
+redis.call('SET', KEYS[1], arrival, 'PX', math.ceil(arrival - now))
+return 0
+"""
+
+
+class RedisRateLimitBackend:
+    """Shared GCRA state, updated atomically by a Lua script, so the limits hold across workers."""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis.asyncio  # optional dependency, only needed when RATE_LIMIT_URL is set
+
+        self._redis = redis.asyncio.Redis.from_url(url)
+        self._script = self._redis.register_script(GCRA_SCRIPT)
+
+    async def hit(self, key: str, rate: float, burst: int) -> float:
+        # Wall clock, the same on every worker
+        wait_ms = await self._script(keys=[f"rate:{key}"], args=[int(time.time() * 1000), 1000 / rate, burst])
+        return float(wait_ms) / 1000
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+def _subject(authorization: bytes) -> Optional[str]:
+    """The user a valid bearer token was issued to; None for a missing, forged or expired one."""
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+
+def _address(scope, headers) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED and b"x-forwarded-for" in headers:
+        return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _client_key(scope, route_class: RouteClass) -> str:
+    headers = dict(scope.get("headers") or [])
+    authorization = headers.get(b"authorization")
+    # Sign-in attempts are limited per address: a made-up header must not buy a fresh bucket
+    if authorization and route_class.name != "auth":
+        # Only a token with a valid signature moves the client off its address, and every
+        # token of one user shares that user's buckets
+        subject = _subject(authorization)
+        if subject is not None:
+            return "user:" + hashlib.sha256(subject.encode()).hexdigest()[:32]
+    return "ip:" + _address(scope, headers)
+
+
+def _reject(status: int, detail: str, retry_after: float) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    body = json.dumps({"detail": detail}).encode()
+    headers = [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode("latin-1")),
+        (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+    ]
+    return status, headers, body
+
+
+class RateLimiter:
+    def __init__(self, backend):
+        self.backend = backend
+        self.backend_errors = 0
+
+    async def admit(self, route_class: RouteClass, client: str):
+        """None when the request may run, else the (status, headers, body) to answer with.
+
+        An admitted request holds one of its class's in-flight slots until `release`.
+        """
+        if route_class.in_flight >= route_class.concurrency:
+            route_class.shed += 1
+            return _reject(503, "Server busy, retry shortly", 1)
+        # Taken before awaiting the store, so requests arriving meanwhile see it
+        route_class.in_flight += 1
+        try:
+            wait = await self.backend.hit(f"{route_class.name}:{client}", route_class.rate, route_class.burst)
+        except Exception:
+            self.backend_errors += 1
+            logger.exception("rate limit store unavailable; letting the request through")
+            wait = 0.0
+        except BaseException:
+            # Cancelled while waiting on the store: give the slot back
+            route_class.in_flight -= 1
+            raise
+        if wait > 0:
+            route_class.in_flight -= 1
+            route_class.limited += 1
+            return _reject(429, "Too many requests", wait)
+        route_class.allowed += 1
+        return None
+
+    def release(self, route_class: RouteClass):
+        route_class.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "enabled": RATE_LIMIT_ENABLED,
+            "backend": self.backend.name,
+            "keys": self.backend.size(),
+            "backend_errors": self.backend_errors,
+            "classes": {route_class.name: route_class.stats() for route_class in ROUTE_CLASSES},
+        }
+
+
+class RateLimitMiddleware:
+    """Per-client token buckets per route class, plus a per-worker concurrency cap per class.
+
+    Over the rate a request gets 429, over the concurrency cap 503; both carry Retry-After.
+    Shedding at the door keeps queues from growing without bound behind slow routes. If the
+    shared store is unreachable requests are let through rather than failed.
+    """
+
+    def __init__(self, app, limiter: Optional[RateLimiter] = None):
+        self.app = app
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = self.limiter or rate_limiter
+        route_class = classify(scope["method"], scope["path"], scope.get("query_string", b""))
+        rejection = await limiter.admit(route_class, _client_key(scope, route_class))
+        if rejection is not None:
+            status, headers, body = rejection
+            await send({"type": "http.response.start", "status": status, "headers": headers})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(route_class)
+
+
+def _create_backend():
+    if RATE_LIMIT_URL:
+        return RedisRateLimitBackend(RATE_LIMIT_URL)
+    return LocalRateLimitBackend(RATE_LIMIT_MAX_KEYS)
+
+
+rate_limiter = RateLimiter(_create_backend())
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Written by build_recommendations.py, read by every API worker
+RECOMMENDATIONS_PATH = os.getenv("RECOMMENDATIONS_PATH", "recommendations.npz")
+# How often a worker looks for a newer index file
+RECOMMENDATIONS_RELOAD_SECONDS = float(os.getenv("RECOMMENDATIONS_RELOAD_SECONDS", 60))
+
+
+class RecommendationIndex:
+    """Immutable top-k similar anime per anime, plus every user's weighted library.
+
+    Anime and users are addressed by id (array position = id). `neighbors[a]` holds the
+    ids of the anime most similar to anime `a` (-1 pads rows with fewer), `similarities[a]`
+    their scores. The library is CSR: a user's anime are
+    `library_anime[library_indptr[u]:library_indptr[u + 1]]`.
+    """
+
+    def __init__(self, neighbors, similarities, library_indptr, library_anime, library_weights, built_at: float):
+        self.neighbors = neighbors
+        self.similarities = similarities
+        self.library_indptr = library_indptr
+        self.library_anime = library_anime
+        self.library_weights = library_weights
+        self.built_at = built_at
+
+    def recommend(self, user_id: int, limit: int) -> List[Tuple[int, float]]:
+        """(anime_id, score) pairs, best first, excluding anime already in the user's library."""
+        if not 0 <= user_id < len(self.library_indptr) - 1:
+            return []
+        start, end = self.library_indptr[user_id], self.library_indptr[user_id + 1]
+        owned, weights = self.library_anime[start:end], self.library_weights[start:end]
+        # Anime added after the build have no neighbors yet
+        known = owned < len(self.neighbors)
+        owned, weights = owned[known], weights[known]
+        if not len(owned):
+            return []
+
+        candidates = self.neighbors[owned].ravel()
+        scores = (self.similarities[owned] * weights[:, None]).ravel()
+        keep = (candidates >= 0) & ~np.isin(candidates, owned)
+        candidates, inverse = np.unique(candidates[keep], return_inverse=True)
+        totals = np.bincount(inverse, weights=scores[keep])
+        best = np.argsort(-totals, kind="stable")[:limit]
+        return [(int(candidates[i]), float(totals[i])) for i in best]
+
+    def save(self, path: str):
+        # Written next to the target and renamed over it, so readers never see half a file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            np.savez(
+                f,
+                neighbors=self.neighbors,
+                similarities=self.similarities,
+                library_indptr=self.library_indptr,
+                library_anime=self.library_anime,
+                library_weights=self.library_weights,
+                built_at=np.array(self.built_at),
+            )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RecommendationIndex":
+        with np.load(path) as arrays:
+            return cls(
+                arrays["neighbors"],
+                arrays["similarities"],
+                arrays["library_indptr"],
+                arrays["library_anime"],
+                arrays["library_weights"],
+                float(arrays["built_at"]),
+            )
+
+
+class IndexHolder:
+    """The index a worker serves from. A newer file is loaded in the background and swapped
+    in with a single assignment, so requests always see one complete index."""
+
+    def __init__(self, path: str, reload_seconds: float):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._index: Optional[RecommendationIndex] = None
+        self._loaded_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._loading = False
+
+    def current(self) -> Optional[RecommendationIndex]:
+        now = time.monotonic()
+        if now - self._checked_at >= self.reload_seconds or self._index is None:
+            self._checked_at = now
+            self._maybe_reload()
+        return self._index
+
+    def _maybe_reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime or self._loading:
+                return
+            self._loading = True
+        if self._index is None:
+            # Nothing to serve meanwhile: load on this request
+            self._load(mtime)
+        else:
+            threading.Thread(target=self._load, args=(mtime,), daemon=True).start()
+
+    def _load(self, mtime):
+        try:
+            index = RecommendationIndex.load(self.path)
+            self._index, self._loaded_mtime = index, mtime
+        finally:
+            with self._lock:
+                self._loading = False
+
+
+holder = IndexHolder(RECOMMENDATIONS_PATH, RECOMMENDATIONS_RELOAD_SECONDS)
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends
+
+from ..auth import auth, hashing
+from ..auth.principal_cache import principal_cache
+from ..catalog_snapshot import snapshot as catalog_snapshot
+from ..changes import feed as change_feed
+from ..database import async_engine, engine
+from ..pool_metrics import pool_stats
+from ..rate_limit import rate_limiter
+
+# Pool saturation and limiter state help time load or brute-force attempts: admins only
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(auth.get_current_admin_user)]
+)
+
+@router.get("/hashing")
+def read_hashing_metrics():
+    return hashing.pool.metrics()
+
+@router.get("/principal-cache")
+def read_principal_cache_stats():
+    return principal_cache.stats()
+
+@router.get("/pool")
+def read_pool_stats():
+    return {"sync": pool_stats(engine.pool), "async": pool_stats(async_engine.pool)}
+
+@router.get("/catalog-snapshot")
+def read_catalog_snapshot_stats():
+    return catalog_snapshot.stats()
+
+@router.get("/rate-limits")
+def read_rate_limit_stats():
+    return rate_limiter.stats()
+
+@router.get("/change-feed")
+def read_change_feed_stats():
+    return change_feed.stats()
\ No newline at end of file
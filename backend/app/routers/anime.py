@@ -1,12 +1,20 @@
+from datetime import datetime, timezone
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 from .. import schemas
 from ..models import models
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..auth import auth
+from .. import anime_stats, bulk_delete, changes, conditional, catalog_import, catalog_snapshot, facets, fast_lists, fieldsets, library_sync, progress as progress_sync
+from ..pagination import paginate_async
+from ..search import search as search_index
 
 router = APIRouter(
     prefix="/anime",
@@ -17,7 +25,7 @@ router = APIRouter(
 def create_anime(
     anime: schemas.AnimeBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     # Check if studio exists
     if anime.studio_id:
@@ -27,50 +35,186 @@ def create_anime(
 
     db_anime = models.Anime(**anime.dict())
     db.add(db_anime)
+    db.flush()
+    search_index.index_anime(db, db_anime)
+    conditional.bump_collections(db, conditional.ANIME)
+    changes.record(db, conditional.ANIME, changes.UPSERT, [db_anime.id])
     db.commit()
     db.refresh(db_anime)
     return db_anime
 
-@router.get("/", response_model=List[schemas.Anime])
-def read_anime_list(
+@router.post("/import", response_model=schemas.ImportReport)
+async def import_anime_catalog(
+    request: Request,
+    batch_size: int = Query(catalog_import.DEFAULT_BATCH_SIZE, ge=1, le=5000, description="Documents per transaction"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
+):
+    """Stream an NDJSON body of anime documents (schemas.AnimeImport), one per line.
+    Bad lines are reported by line number and do not abort the import."""
+    report = catalog_import.ImportReport()
+    batch = []
+    async for line in catalog_import.iter_lines(request.stream()):
+        batch.append(line)
+        if len(batch) >= batch_size:
+            await run_in_threadpool(catalog_import.import_batch, db, batch, report)
+            batch = []
+    if batch:
+        await run_in_threadpool(catalog_import.import_batch, db, batch, report)
+    return report.as_schema()
+
+@router.get("/", response_model=List[schemas.Anime], responses=fieldsets.ANIME.responses)
+async def read_anime_list(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
     genre_name: Optional[str] = Query(None, description="Filter by genre name"),
+    genres: Optional[List[str]] = Query(None, description="Filter by several genres (repeat the parameter), combined by genre_mode"),
+    genre_mode: str = Query("and", pattern="^(and|or)$", description="and: tagged with every genre, or: with any of them"),
     status: Optional[str] = Query(None, description="Filter by anime status"),
-    search: Optional[str] = Query(None, description="Search by anime title or japanese title"),
-    db: Session = Depends(get_db)
+    type: Optional[str] = Query(None, description="Filter by anime type"),
+    search: Optional[str] = Query(None, description="Ranked prefix search over title, japanese title and synopsis"),
+    sort: Optional[str] = Query(None, pattern="^(popularity|score)$", description="Order by member count (popularity) or mean score instead of title"),
+    projection: Optional[fieldsets.Projection] = Depends(fieldsets.ANIME.dependency),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    query = db.query(models.Anime).options(joinedload(models.Anime.studio)).options(joinedload(models.Anime.genres))
+    # Stats change with every progress write without bumping the catalog versions, so pages
+    # ordered by them are not validated
+    if sort is None:
+        # Each item embeds its studio and genres, so their collections count towards the list version
+        state = (await db.execute(conditional.collection_state((conditional.ANIME, conditional.STUDIOS, conditional.GENRES)))).first()
+        not_modified = conditional.evaluate(request, response, *conditional.collection_validators(conditional.ANIME, request, *state))
+        if not_modified:
+            return not_modified
 
-    if genre_name:
-        query = query.join(models.Anime.genres).filter(models.Genre.name == genre_name)
+    fast = fast_lists.FAST_LIST_RESPONSES and projection is None
+    if projection is not None:
+        query = select(models.Anime).options(*projection.options())
+    elif fast:
+        query = fast_lists.anime_select()
+    else:
+        # genres are loaded with a separate IN query so the LIMIT applies to anime rows, not to the collection join
+        query = select(models.Anime).options(joinedload(models.Anime.studio)).options(selectinload(models.Anime.genres))
+
+    genre_names = _genre_names(genre_name, genres)
+    if genre_names:
+        query = query.filter(facets.genre_filter(genre_names, genre_mode))
     if status:
         query = query.filter(models.Anime.status == status)
+    if type:
+        query = query.filter(models.Anime.type == type)
+    order = None
     if search:
-        query = query.filter(
-            (models.Anime.title.ilike(f"%{search}%")) |
-            (models.Anime.japanese_title.ilike(f"%{search}%"))
+        results = search_index.ranked_anime_ids(db, search)
+        if results is None:
+            return []
+        query = query.join(results, results.c.anime_id == models.Anime.id)
+        order = results.c.rank.desc()
+    if sort:
+        # Anime nobody tracks have no stats row and sort last
+        query = query.outerjoin(models.AnimeStats, models.AnimeStats.anime_id == models.Anime.id)
+        key = models.AnimeStats.members if sort == "popularity" else anime_stats.mean_score()
+        order = func.coalesce(key, 0).desc()
+
+    if order is not None:
+        if after is not None:
+            raise HTTPException(status_code=400, detail="Cursor pagination is not supported for ranked search results or stats sorts, use skip")
+        result = await db.execute(query.order_by(order, models.Anime.id).offset(skip).limit(limit))
+        anime_list = result.all() if fast else result.scalars().all()
+    else:
+        anime_list = await paginate_async(
+            db, query, (models.Anime.title, models.Anime.id), response, after=after, skip=skip, limit=limit, scalars=not fast
         )
-    
-    anime_list = query.offset(skip).limit(limit).all()
+    if fast:
+        return fast_lists.json_response(await fast_lists.anime_documents(db, anime_list), response)
+    if projection is not None:
+        return fast_lists.json_response([projection.document(anime) for anime in anime_list], response)
     return anime_list
 
-@router.get("/{anime_id}", response_model=schemas.Anime)
-def read_anime(
+@router.get("/facets", response_model=schemas.AnimeFacets)
+async def read_anime_facets(
+    request: Request,
+    response: Response,
+    genre_name: Optional[str] = Query(None, description="Filter by genre name"),
+    genres: Optional[List[str]] = Query(None, description="Filter by several genres (repeat the parameter), combined by genre_mode"),
+    genre_mode: str = Query("and", pattern="^(and|or)$", description="and: tagged with every genre, or: with any of them"),
+    status: Optional[str] = Query(None, description="Filter by anime status"),
+    type: Optional[str] = Query(None, description="Filter by anime type"),
+    search: Optional[str] = Query(None, description="Ranked prefix search over title, japanese title and synopsis"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Number of anime per genre, status and type among those matching the same filters as GET /anime/."""
+    state = (await db.execute(conditional.collection_state((conditional.ANIME, conditional.GENRES)))).first()
+    not_modified = conditional.evaluate(request, response, *conditional.collection_validators(conditional.ANIME, request, *state))
+    if not_modified:
+        return not_modified
+
+    # Counted on bitmaps cached per catalog version; only a search goes to the database
+    index = await facets.get_index(db, state.version)
+    ids = None
+    if search:
+        results = search_index.ranked_anime_ids(db, search)
+        ids = 0 if results is None else facets.bitmap((await db.execute(select(results.c.anime_id))).scalars())
+    return index.counts(index.matching(_genre_names(genre_name, genres), genre_mode, status, type, ids))
+
+@router.get("/{anime_id}", response_model=schemas.Anime, responses=fieldsets.ANIME.responses)
+async def read_anime(
     anime_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    projection: Optional[fieldsets.Projection] = Depends(fieldsets.ANIME.dependency),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    anime = db.query(models.Anime).options(joinedload(models.Anime.studio)).options(joinedload(models.Anime.genres)).filter(models.Anime.id == anime_id).first()
+    catalog = catalog_snapshot.snapshot.current()
+    record = catalog.anime.get(anime_id) if catalog is not None and projection is None else None
+    if record is not None:
+        # Served from the in-process snapshot; anime it does not have yet fall through to the database
+        validators = conditional.row_validators(
+            conditional.ANIME, anime_id, record.version, record.updated_at, *catalog.collection_state(conditional.STUDIOS, conditional.GENRES)
+        )
+        return conditional.evaluate(request, response, *validators) or fast_lists.json_response(catalog.anime_document(record), response)
+
+    # Check freshness from the version columns alone before loading synopsis, studio and genres
+    state = (await db.execute(conditional.row_state(models.Anime, anime_id, (conditional.STUDIOS, conditional.GENRES)))).first()
+    if state is None:
+        raise HTTPException(status_code=404, detail="Anime not found")
+    variant = projection.variant if projection is not None else ""
+    not_modified = conditional.evaluate(request, response, *conditional.row_validators(conditional.ANIME, anime_id, *state, variant=variant))
+    if not_modified:
+        return not_modified
+
+    if projection is not None:
+        query = select(models.Anime).options(*projection.options())
+    else:
+        query = select(models.Anime).options(joinedload(models.Anime.studio)).options(selectinload(models.Anime.genres))
+    result = await db.execute(query.filter(models.Anime.id == anime_id))
+    anime = result.scalars().first()
     if anime is None:
         raise HTTPException(status_code=404, detail="Anime not found")
+    if projection is not None:
+        return fast_lists.json_response(projection.document(anime), response)
     return anime
 
+@router.get("/{anime_id}/stats", response_model=schemas.AnimeStats)
+async def read_anime_stats(anime_id: int, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(
+        select(models.Anime.id, models.AnimeStats)
+        .outerjoin(models.AnimeStats, models.AnimeStats.anime_id == models.Anime.id)
+        .filter(models.Anime.id == anime_id)
+    )
+    row = result.first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Anime not found")
+    return anime_stats.as_schema(anime_id, row[1])
+
 @router.put("/{anime_id}", response_model=schemas.Anime)
 def update_anime(
     anime_id: int,
     anime: schemas.AnimeBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_anime = db.query(models.Anime).filter(models.Anime.id == anime_id).first()
     if db_anime is None:
@@ -85,6 +229,10 @@ def update_anime(
     for key, value in anime.dict(exclude_unset=True).items():
         setattr(db_anime, key, value)
     
+    search_index.index_anime(db, db_anime)
+    conditional.bump_version(db_anime)
+    conditional.bump_collections(db, conditional.ANIME)
+    changes.record(db, conditional.ANIME, changes.UPSERT, [anime_id])
     db.commit()
     db.refresh(db_anime)
     return db_anime
@@ -93,22 +241,41 @@ def update_anime(
 def delete_anime(
     anime_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
-    db_anime = db.query(models.Anime).filter(models.Anime.id == anime_id).first()
-    if db_anime is None:
+    if not _delete_anime(db, [anime_id]):
         raise HTTPException(status_code=404, detail="Anime not found")
-    
-    db.delete(db_anime)
     db.commit()
     return {"ok": True}
 
+@router.post("/bulk-delete", response_model=schemas.BulkDeleteResult)
+def delete_anime_bulk(
+    request: schemas.BulkDelete,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
+):
+    """Delete many anime in one transaction; ids that do not exist are reported, not an error."""
+    ids = bulk_delete.validate(request)
+    deleted = _delete_anime(db, ids)
+    db.commit()
+    return bulk_delete.result(ids, deleted)
+
+def _delete_anime(db: Session, anime_ids: List[int]) -> List[int]:
+    # Episodes, genre/character links, progress, stats and favorites go by ON DELETE CASCADE
+    library_sync.record_deletions(db, anime_ids=anime_ids)
+    deleted = bulk_delete.delete_rows(db, models.Anime, anime_ids)
+    if deleted:
+        search_index.remove_anime_many(db, deleted)
+        conditional.bump_collections(db, conditional.ANIME, conditional.EPISODES)
+        changes.record(db, conditional.ANIME, changes.DELETE, deleted)
+    return deleted
+
 @router.post("/{anime_id}/genres/{genre_id}", response_model=schemas.Anime)
 def add_genre_to_anime(
     anime_id: int,
     genre_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_anime = db.query(models.Anime).filter(models.Anime.id == anime_id).first()
     if not db_anime:
@@ -120,6 +287,9 @@ def add_genre_to_anime(
     
     if db_genre not in db_anime.genres:
         db_anime.genres.append(db_genre)
+        conditional.bump_version(db_anime)
+        conditional.bump_collections(db, conditional.ANIME)
+        changes.record(db, conditional.ANIME, changes.UPSERT, [anime_id])
         db.commit()
         db.refresh(db_anime)
     return db_anime
@@ -129,7 +299,7 @@ def remove_genre_from_anime(
     anime_id: int,
     genre_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_anime = db.query(models.Anime).filter(models.Anime.id == anime_id).first()
     if not db_anime:
@@ -141,6 +311,9 @@ def remove_genre_from_anime(
     
     if db_genre in db_anime.genres:
         db_anime.genres.remove(db_genre)
+        conditional.bump_version(db_anime)
+        conditional.bump_collections(db, conditional.ANIME)
+        changes.record(db, conditional.ANIME, changes.UPSERT, [anime_id])
         db.commit()
         db.refresh(db_anime)
     return db_anime
@@ -151,7 +324,7 @@ def add_character_to_anime(
     character_id: int,
     role: str = Query(..., description="Role of the character in the anime (e.g., Main, Supporting)"),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_anime = db.query(models.Anime).filter(models.Anime.id == anime_id).first()
     if not db_anime:
@@ -173,6 +346,7 @@ def add_character_to_anime(
         role=role
     )
     db.execute(insert_stmt)
+    changes.record(db, conditional.ANIME, changes.UPSERT, [anime_id])
     db.commit()
     
     # Refresh the relationship to show the new character
@@ -186,7 +360,7 @@ def remove_character_from_anime(
     anime_id: int,
     character_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_anime = db.query(models.Anime).filter(models.Anime.id == anime_id).first()
     if not db_anime:
@@ -198,31 +372,54 @@ def remove_character_from_anime(
     
     if db_character in db_anime.characters:
         db_anime.characters.remove(db_character)
+        changes.record(db, conditional.ANIME, changes.UPSERT, [anime_id])
         db.commit()
         db.refresh(db_anime)
     return db_anime
 
 
+def _genre_names(genre_name: Optional[str], genres: Optional[List[str]]) -> List[str]:
+    # genre_name is the original single-genre filter; it combines with genres like one more entry
+    return list(dict.fromkeys([*([genre_name] if genre_name else []), *(genres or [])]))
+
+def _require_anime(db: Session, anime_id: int):
+    # Checked before inserting progress, which would otherwise fail on the foreign key
+    if db.scalar(select(models.Anime.id).where(models.Anime.id == anime_id)) is None:
+        raise HTTPException(status_code=404, detail="Anime not found")
+
+def _get_progress(db: Session, user_id: int, anime_id: int):
+    return db.query(models.UserAnimeProgress).filter(
+        models.UserAnimeProgress.user_id == user_id,
+        models.UserAnimeProgress.anime_id == anime_id
+    ).first()
+
 @router.get("/{anime_id}/progress/{user_id}", response_model=schemas.UserAnimeProgress)
 def get_user_anime_progress(
     anime_id: int,
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     if user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view this user's progress")
     
-    progress = db.query(models.UserAnimeProgress).filter(
-        models.UserAnimeProgress.user_id == user_id,
-        models.UserAnimeProgress.anime_id == anime_id
-    ).first()
+    progress = _get_progress(db, user_id, anime_id)
     
     if progress is None:
+        _require_anime(db, anime_id)
         # Create a default progress entry if none exists
         new_progress = models.UserAnimeProgress(user_id=user_id, anime_id=anime_id, episodes_watched=0, status="Plan to Watch", score=None)
         db.add(new_progress)
-        db.commit()
+        try:
+            anime_stats.record_change(db, anime_id, None, (new_progress.status, new_progress.score))
+            db.commit()
+        except IntegrityError:
+            # A concurrent request created it first
+            db.rollback()
+            progress = _get_progress(db, user_id, anime_id)
+            if progress is None:
+                raise
+            return progress
         db.refresh(new_progress)
         return new_progress
     
@@ -233,34 +430,57 @@ def update_user_anime_progress(
     anime_id: int,
     progress_update: schemas.UserAnimeProgressBase, # Only allow specific fields to be updated
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     if progress_update.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to update this user's progress")
     
-    progress = db.query(models.UserAnimeProgress).filter(
-        models.UserAnimeProgress.user_id == current_user.id,
-        models.UserAnimeProgress.anime_id == anime_id
-    ).first()
+    progress = _get_progress(db, current_user.id, anime_id)
 
     if progress is None:
+        _require_anime(db, anime_id)
         # Create new progress entry
         db_progress = models.UserAnimeProgress(
             user_id=current_user.id,
             anime_id=anime_id,
             episodes_watched=progress_update.episodes_watched,
             status=progress_update.status,
-            score=progress_update.score
+            score=progress_update.score,
+            client_updated_at=datetime.now(timezone.utc)
         )
         db.add(db_progress)
-        db.commit()
-        db.refresh(db_progress)
-        return db_progress
-    else:
-        # Update existing progress entry
-        for key, value in progress_update.dict(exclude_unset=True).items():
-            setattr(progress, key, value)
-        
-        db.commit()
-        db.refresh(progress)
-        return progress
\ No newline at end of file
+        try:
+            anime_stats.record_change(db, anime_id, None, (db_progress.status, db_progress.score))
+            db.commit()
+            db.refresh(db_progress)
+            return db_progress
+        except IntegrityError:
+            # A concurrent request created it first; update that row instead
+            db.rollback()
+            progress = _get_progress(db, current_user.id, anime_id)
+            if progress is None:
+                raise
+
+    # Update existing progress entry
+    before = (progress.status, progress.score)
+    # The row's user and anime come from the path and the token, never from the body
+    for key, value in progress_update.dict(exclude_unset=True, exclude={"user_id", "anime_id"}).items():
+        setattr(progress, key, value)
+    # Online edits count as changes made now for batch sync's last-writer-wins
+    progress.client_updated_at = datetime.now(timezone.utc)
+    anime_stats.record_change(db, anime_id, before, (progress.status, progress.score))
+    
+    db.commit()
+    db.refresh(progress)
+    return progress
+
+@router.post("/progress/batch", response_model=schemas.UserAnimeProgressBatchResult)
+def sync_user_anime_progress(
+    batch: schemas.UserAnimeProgressBatch,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
+):
+    """Apply many progress changes for the current user in one transaction (last writer wins on client_updated_at)."""
+    result = progress_sync.upsert_progress_batch(db, current_user.id, batch.items)
+    db.commit()
+    return result
\ No newline at end of file
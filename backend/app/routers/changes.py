@@ -0,0 +1,93 @@
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import changes, schemas
+from ..database import AsyncSessionLocal, get_async_db
+
+router = APIRouter(
+    prefix="/changes",
+    tags=["changes"]
+)
+
+async def _check_retained(db: AsyncSession, since: int):
+    # 0 means "from the oldest retained change"
+    if not since:
+        return
+    oldest, latest = await changes.retained_range(db)
+    if oldest is not None and since < oldest - 1:
+        raise HTTPException(status_code=410, detail="Changes after this sequence number were pruned; reload the lists and start from the latest")
+    # Not handed out by this feed, e.g. from before the database was restored or recreated
+    if since > latest:
+        raise HTTPException(status_code=410, detail="This sequence number is ahead of the feed; reload the lists and start from the latest")
+
+@router.get("/", response_model=schemas.CatalogChangePage)
+async def read_changes(
+    since: int = Query(0, ge=0, description="Last sequence number already applied; 0 for the oldest retained change"),
+    limit: int = Query(changes.PAGE_SIZE, ge=1, le=changes.PAGE_SIZE),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Catalog changes after `since`, oldest first. Apply them and ask again with next_since."""
+    await _check_retained(db, since)
+    rows = await changes.changes_after(db, since, limit)
+    return schemas.CatalogChangePage(
+        changes=[changes.as_schema(row) for row in rows],
+        next_since=rows[-1].seq if rows else since,
+        has_more=len(rows) == limit,
+    )
+
+@router.get("/stream")
+async def stream_changes(
+    request: Request,
+    since: Optional[int] = Query(None, ge=0, description="Replay changes after this sequence number first; default: only new ones"),
+    last_event_id: Optional[int] = Header(None, description="Sent by EventSource when it reconnects; takes precedence over since"),
+):
+    """Server-Sent Events: one `change` event per catalog change, with the sequence number as its id."""
+    after = last_event_id if last_event_id is not None else since
+    async with AsyncSessionLocal() as db:
+        if after is None:
+            # The feed only moves past settled changes; the newest seq may still have gaps below it
+            after = changes.feed.last_seq if changes.feed.last_seq is not None else await changes.latest_seq(db)
+        else:
+            await _check_retained(db, after)
+
+    # Subscribe before catching up, so nothing committed in between is missed; the overlap is skipped
+    queue = changes.feed.subscribe()
+
+    async def events():
+        sent = after
+        try:
+            yield f"retry: {changes.RETRY_MILLISECONDS}\n\n"
+            while True:
+                async with AsyncSessionLocal() as db:
+                    rows = await changes.changes_after(db, sent)
+                for row in rows:
+                    yield changes.event(changes.as_schema(row))
+                    sent = row.seq
+                if len(rows) < changes.PAGE_SIZE:
+                    break
+
+            while not await request.is_disconnected():
+                try:
+                    page = await asyncio.wait_for(queue.get(), changes.HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if page is None:
+                    # Fell behind the feed; the client reconnects with Last-Event-ID and pages through
+                    return
+                for change in page:
+                    if change.seq > sent:
+                        yield changes.event(change)
+                        sent = change.seq
+        finally:
+            changes.feed.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
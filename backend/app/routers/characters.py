@@ -1,12 +1,14 @@
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 
 from .. import schemas
 from ..models import models
 from ..database import get_db
 from ..auth import auth
+from .. import bulk_delete, changes, conditional, fast_lists, fieldsets, library_sync
+from ..pagination import paginate
 
 router = APIRouter(
     prefix="/characters",
@@ -17,35 +19,63 @@ router = APIRouter(
 def create_character(
     character: schemas.CharacterBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_character = models.Character(**character.dict())
     db.add(db_character)
+    db.flush()
+    conditional.bump_collections(db, conditional.CHARACTERS)
+    changes.record(db, conditional.CHARACTERS, changes.UPSERT, [db_character.id])
     db.commit()
     db.refresh(db_character)
     return db_character
 
-@router.get("/", response_model=List[schemas.Character])
+@router.get("/", response_model=List[schemas.Character], responses=fieldsets.CHARACTERS.responses)
 def read_characters(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
     search: Optional[str] = Query(None, description="Search by character name"),
+    projection: Optional[fieldsets.Projection] = Depends(fieldsets.CHARACTERS.dependency),
     db: Session = Depends(get_db)
 ):
+    state = db.execute(conditional.collection_state((conditional.CHARACTERS,))).first()
+    not_modified = conditional.evaluate(request, response, *conditional.collection_validators(conditional.CHARACTERS, request, *state))
+    if not_modified:
+        return not_modified
+
     query = db.query(models.Character)
+    if projection is not None:
+        query = query.options(*projection.options())
     if search:
         query = query.filter(models.Character.name.ilike(f"%{search}%"))
-    characters = query.offset(skip).limit(limit).all()
+    characters = paginate(query, (models.Character.id,), response, after=after, skip=skip, limit=limit)
+    if projection is not None:
+        return fast_lists.json_response([projection.document(character) for character in characters], response)
     return characters
 
-@router.get("/{character_id}", response_model=schemas.Character)
+@router.get("/{character_id}", response_model=schemas.Character, responses=fieldsets.CHARACTERS.responses)
 def read_character(
     character_id: int,
+    request: Request,
+    response: Response,
+    projection: Optional[fieldsets.Projection] = Depends(fieldsets.CHARACTERS.dependency),
     db: Session = Depends(get_db)
 ):
-    character = db.query(models.Character).filter(models.Character.id == character_id).first()
+    query = db.query(models.Character)
+    if projection is not None:
+        query = query.options(*projection.options("version", "updated_at"))
+    character = query.filter(models.Character.id == character_id).first()
     if character is None:
         raise HTTPException(status_code=404, detail="Character not found")
+    variant = projection.variant if projection is not None else ""
+    not_modified = conditional.evaluate(request, response, *conditional.row_validators(conditional.CHARACTERS, character_id, character.version, character.updated_at, variant=variant))
+    if not_modified:
+        return not_modified
+    if projection is not None:
+        return fast_lists.json_response(projection.document(character), response)
     return character
 
 @router.put("/{character_id}", response_model=schemas.Character)
@@ -53,7 +83,7 @@ def update_character(
     character_id: int,
     character: schemas.CharacterBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_character = db.query(models.Character).filter(models.Character.id == character_id).first()
     if db_character is None:
@@ -62,6 +92,9 @@ def update_character(
     for key, value in character.dict(exclude_unset=True).items():
         setattr(db_character, key, value)
     
+    conditional.bump_version(db_character)
+    conditional.bump_collections(db, conditional.CHARACTERS)
+    changes.record(db, conditional.CHARACTERS, changes.UPSERT, [character_id])
     db.commit()
     db.refresh(db_character)
     return db_character
@@ -70,12 +103,30 @@ def update_character(
 def delete_character(
     character_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
-    db_character = db.query(models.Character).filter(models.Character.id == character_id).first()
-    if db_character is None:
+    if not _delete_characters(db, [character_id]):
         raise HTTPException(status_code=404, detail="Character not found")
-    
-    db.delete(db_character)
     db.commit()
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
+
+@router.post("/bulk-delete", response_model=schemas.BulkDeleteResult)
+def delete_characters_bulk(
+    request: schemas.BulkDelete,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
+):
+    """Delete many characters in one transaction; ids that do not exist are reported, not an error."""
+    ids = bulk_delete.validate(request)
+    deleted = _delete_characters(db, ids)
+    db.commit()
+    return bulk_delete.result(ids, deleted)
+
+def _delete_characters(db: Session, character_ids: List[int]) -> List[int]:
+    # Anime and voice actor links and favorites go by ON DELETE CASCADE
+    library_sync.record_deletions(db, character_ids=character_ids)
+    deleted = bulk_delete.delete_rows(db, models.Character, character_ids)
+    if deleted:
+        conditional.bump_collections(db, conditional.CHARACTERS)
+        changes.record(db, conditional.CHARACTERS, changes.DELETE, deleted)
+    return deleted
\ No newline at end of file
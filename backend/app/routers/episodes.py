@@ -1,23 +1,34 @@
-from typing import List
+from collections import Counter
+from datetime import date
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .. import schemas
 from ..models import models
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..auth import auth
+from .. import airing_calendar, changes, conditional, fast_lists, fieldsets
+from ..pagination import paginate_async
 
 router = APIRouter(
     prefix="/episodes",
     tags=["episodes"]
 )
 
+# Episodes per POST /episodes/bulk; enough for the longest-running shows, and at five columns
+# a row the single INSERT stays under SQLite's 32766 bind parameters
+MAX_BULK_EPISODES = 5000
+
 @router.post("/", response_model=schemas.Episode, status_code=status.HTTP_201_CREATED)
 def create_episode(
     episode: schemas.EpisodeBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     # Ensure the anime exists
     anime = db.query(models.Anime).filter(models.Anime.id == episode.anime_id).first()
@@ -26,33 +37,138 @@ def create_episode(
 
     db_episode = models.Episode(**episode.dict())
     db.add(db_episode)
+    db.flush()
+    conditional.bump_collections(db, conditional.EPISODES)
+    airing_calendar.bump_weeks(db, [episode.air_date])
+    changes.record(db, conditional.EPISODES, changes.UPSERT, [db_episode.id])
     db.commit()
     db.refresh(db_episode)
     return db_episode
 
-@router.get("/anime/{anime_id}", response_model=List[schemas.Episode])
-def read_episodes_for_anime(
+@router.post("/bulk", response_model=schemas.EpisodeBulkResult, status_code=status.HTTP_201_CREATED)
+def create_episodes_bulk(
+    season: schemas.EpisodeBulkCreate,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
+):
+    """Create many episodes of one anime in one transaction, with one multi-row INSERT."""
+    if not season.episodes:
+        raise HTTPException(status_code=400, detail="No episodes given")
+    if len(season.episodes) > MAX_BULK_EPISODES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_EPISODES} episodes per request")
+    numbers = [episode.episode_number for episode in season.episodes]
+    duplicates = sorted(number for number, count in Counter(numbers).items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate episode_number(s): {', '.join(map(str, duplicates))}")
+
+    if db.scalar(select(models.Anime.id).where(models.Anime.id == season.anime_id)) is None:
+        raise HTTPException(status_code=404, detail="Anime not found")
+    existing = set(db.scalars(select(models.Episode.episode_number).where(models.Episode.anime_id == season.anime_id)))
+    taken = sorted(existing.intersection(numbers))
+    if taken:
+        raise HTTPException(status_code=409, detail=f"Episode number(s) already exist: {', '.join(map(str, taken))}")
+
+    rows = [dict(episode.dict(), anime_id=season.anime_id) for episode in season.episodes]
+    try:
+        # One INSERT ... VALUES (...), (...) RETURNING; RETURNING order is not guaranteed, so ids
+        # are matched back to the request by episode number
+        inserted = dict(
+            (number, episode_id)
+            for episode_id, number in db.execute(
+                insert(models.Episode).values(rows).returning(models.Episode.id, models.Episode.episode_number)
+            )
+        )
+    except IntegrityError:
+        # Episodes with these numbers were created concurrently
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Episode numbers conflict with a concurrent write")
+    ids = [inserted[number] for number in numbers]
+
+    collections = [conditional.EPISODES]
+    episodes_total = None
+    if season.update_episodes_total:
+        count = select(func.count()).where(models.Episode.anime_id == season.anime_id).scalar_subquery()
+        episodes_total = db.execute(
+            update(models.Anime)
+            .where(models.Anime.id == season.anime_id)
+            .values(episodes_total=count, version=models.Anime.version + 1)
+            .returning(models.Anime.episodes_total)
+        ).scalar_one()
+        collections.append(conditional.ANIME)
+        changes.record(db, conditional.ANIME, changes.UPSERT, [season.anime_id])
+    conditional.bump_collections(db, *collections, *airing_calendar.week_markers(row["air_date"] for row in rows))
+    changes.record(db, conditional.EPISODES, changes.UPSERT, ids)
+    db.commit()
+    return schemas.EpisodeBulkResult(anime_id=season.anime_id, ids=ids, episodes_total=episodes_total)
+
+@router.get("/anime/{anime_id}", response_model=List[schemas.Episode], responses=fieldsets.EPISODES.responses)
+async def read_episodes_for_anime(
     anime_id: int,
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    after: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    projection: Optional[fieldsets.Projection] = Depends(fieldsets.EPISODES.dependency),
+    db: AsyncSession = Depends(get_async_db)
 ):
     # Ensure the anime exists
-    anime = db.query(models.Anime).filter(models.Anime.id == anime_id).first()
+    anime = await db.scalar(select(models.Anime.id).filter(models.Anime.id == anime_id))
     if not anime:
         raise HTTPException(status_code=404, detail="Anime not found")
 
-    episodes = db.query(models.Episode).filter(models.Episode.anime_id == anime_id).order_by(models.Episode.episode_number).offset(skip).limit(limit).all()
+    state = (await db.execute(conditional.collection_state((conditional.EPISODES,)))).first()
+    not_modified = conditional.evaluate(request, response, *conditional.collection_validators(conditional.EPISODES, request, *state))
+    if not_modified:
+        return not_modified
+
+    query = select(models.Episode).filter(models.Episode.anime_id == anime_id)
+    if projection is not None:
+        query = query.options(*projection.options())
+    episodes = await paginate_async(db, query, (models.Episode.episode_number, models.Episode.id), response, after=after, skip=skip, limit=limit)
+    if projection is not None:
+        return fast_lists.json_response([projection.document(episode) for episode in episodes], response)
     return episodes
 
-@router.get("/{episode_id}", response_model=schemas.Episode)
-def read_episode(
+@router.get("/calendar", response_model=List[schemas.CalendarEpisode])
+async def read_episode_calendar(
+    request: Request,
+    response: Response,
+    from_date: date = Query(..., alias="from", description="First air date, inclusive"),
+    to_date: date = Query(..., alias="to", description="Last air date, inclusive"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Episodes airing in a date range with their anime's title and cover, ordered by air date."""
+    airing_calendar.validate_range(from_date, to_date)
+    states = await airing_calendar.marker_states(db, airing_calendar.weeks_between(from_date, to_date))
+    not_modified = conditional.evaluate(
+        request, response, *conditional.collection_validators("calendar", request, *airing_calendar.combined_state(states))
+    )
+    if not_modified:
+        return not_modified
+    episodes = await airing_calendar.episodes_between(db, from_date, to_date, states)
+    return fast_lists.json_response(episodes, response)
+
+@router.get("/{episode_id}", response_model=schemas.Episode, responses=fieldsets.EPISODES.responses)
+async def read_episode(
     episode_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    projection: Optional[fieldsets.Projection] = Depends(fieldsets.EPISODES.dependency),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    episode = db.query(models.Episode).filter(models.Episode.id == episode_id).first()
+    options = []
+    if projection is not None:
+        options = projection.options("version", "updated_at")
+    episode = await db.get(models.Episode, episode_id, options=options)
     if episode is None:
         raise HTTPException(status_code=404, detail="Episode not found")
+    variant = projection.variant if projection is not None else ""
+    not_modified = conditional.evaluate(request, response, *conditional.row_validators(conditional.EPISODES, episode_id, episode.version, episode.updated_at, variant=variant))
+    if not_modified:
+        return not_modified
+    if projection is not None:
+        return fast_lists.json_response(projection.document(episode), response)
     return episode
 
 @router.put("/{episode_id}", response_model=schemas.Episode)
@@ -60,7 +176,7 @@ def update_episode(
     episode_id: int,
     episode: schemas.EpisodeBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_episode = db.query(models.Episode).filter(models.Episode.id == episode_id).first()
     if db_episode is None:
@@ -72,9 +188,14 @@ def update_episode(
         if not anime:
             raise HTTPException(status_code=404, detail="Anime not found for the provided anime_id")
 
+    previous_air_date = db_episode.air_date
     for key, value in episode.dict(exclude_unset=True).items():
         setattr(db_episode, key, value)
     
+    conditional.bump_version(db_episode)
+    conditional.bump_collections(db, conditional.EPISODES)
+    airing_calendar.bump_weeks(db, [previous_air_date, db_episode.air_date])
+    changes.record(db, conditional.EPISODES, changes.UPSERT, [episode_id])
     db.commit()
     db.refresh(db_episode)
     return db_episode
@@ -83,12 +204,15 @@ def update_episode(
 def delete_episode(
     episode_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_episode = db.query(models.Episode).filter(models.Episode.id == episode_id).first()
     if db_episode is None:
         raise HTTPException(status_code=404, detail="Episode not found")
     
     db.delete(db_episode)
+    conditional.bump_collections(db, conditional.EPISODES)
+    airing_calendar.bump_weeks(db, [db_episode.air_date])
+    changes.record(db, conditional.EPISODES, changes.DELETE, [episode_id])
     db.commit()
     return {"ok": True}
\ No newline at end of file
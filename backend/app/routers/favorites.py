@@ -1,11 +1,13 @@
 from typing import List, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
 
 from .. import schemas
 from ..models import models
-from ..database import get_db
+from ..database import get_async_db
 from ..auth import auth
 
 router = APIRouter(
@@ -14,17 +16,19 @@ router = APIRouter(
 )
 
 @router.get("/{user_id}/favorites", response_model=List[schemas.UserFavorite])
-def read_user_favorites(
+async def read_user_favorites(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(auth.get_current_active_user)
 ):
     if user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view this user's favorites")
 
-    favorites = db.query(models.UserFavorite).filter(models.UserFavorite.user_id == user_id)\
-        .options(joinedload(models.UserFavorite.anime))\
-        .options(joinedload(models.UserFavorite.character))\
-        .all()
+    result = await db.execute(
+        select(models.UserFavorite).filter(models.UserFavorite.user_id == user_id)
+        .options(joinedload(models.UserFavorite.anime))
+        .options(joinedload(models.UserFavorite.character))
+    )
+    favorites = result.scalars().all()
     
     return favorites
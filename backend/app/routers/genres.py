@@ -1,12 +1,16 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .. import schemas
 from ..models import models
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..auth import auth
+from .. import catalog_snapshot, changes, conditional, fast_lists
+from ..pagination import paginate_async, paginate_ids
 
 router = APIRouter(
     prefix="/genres",
@@ -17,7 +21,7 @@ router = APIRouter(
 def create_genre(
     genre: schemas.GenreBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_genre = db.query(models.Genre).filter(models.Genre.name == genre.name).first()
     if db_genre:
@@ -25,27 +29,58 @@ def create_genre(
     
     db_genre = models.Genre(**genre.dict())
     db.add(db_genre)
+    db.flush()
+    conditional.bump_collections(db, conditional.GENRES)
+    changes.record(db, conditional.GENRES, changes.UPSERT, [db_genre.id])
     db.commit()
     db.refresh(db_genre)
     return db_genre
 
 @router.get("/", response_model=List[schemas.Genre])
-def read_genres(
+async def read_genres(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    after: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    genres = db.query(models.Genre).offset(skip).limit(limit).all()
+    catalog = catalog_snapshot.snapshot.current()
+    if catalog is not None:
+        validators = conditional.collection_validators(conditional.GENRES, request, *catalog.collection_state(conditional.GENRES))
+        not_modified = conditional.evaluate(request, response, *validators)
+        if not_modified:
+            return not_modified
+        page = paginate_ids(catalog.genre_ids, response, after=after, skip=skip, limit=limit)
+        return fast_lists.json_response([catalog.genre_document(catalog.genres[genre_id]) for genre_id in page], response)
+
+    state = (await db.execute(conditional.collection_state((conditional.GENRES,)))).first()
+    not_modified = conditional.evaluate(request, response, *conditional.collection_validators(conditional.GENRES, request, *state))
+    if not_modified:
+        return not_modified
+
+    genres = await paginate_async(db, select(models.Genre), (models.Genre.id,), response, after=after, skip=skip, limit=limit)
     return genres
 
 @router.get("/{genre_id}", response_model=schemas.Genre)
-def read_genre(
+async def read_genre(
     genre_id: int,
-    db: Session = Depends(get_db)
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    genre = db.query(models.Genre).filter(models.Genre.id == genre_id).first()
+    catalog = catalog_snapshot.snapshot.current()
+    record = catalog.genres.get(genre_id) if catalog is not None else None
+    if record is not None:
+        validators = conditional.row_validators(conditional.GENRES, genre_id, record.version, record.updated_at)
+        return conditional.evaluate(request, response, *validators) or fast_lists.json_response(catalog.genre_document(record), response)
+
+    genre = await db.get(models.Genre, genre_id)
     if genre is None:
         raise HTTPException(status_code=404, detail="Genre not found")
+    not_modified = conditional.evaluate(request, response, *conditional.row_validators(conditional.GENRES, genre_id, genre.version, genre.updated_at))
+    if not_modified:
+        return not_modified
     return genre
 
 @router.put("/{genre_id}", response_model=schemas.Genre)
@@ -53,7 +88,7 @@ def update_genre(
     genre_id: int,
     genre: schemas.GenreBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_genre = db.query(models.Genre).filter(models.Genre.id == genre_id).first()
     if db_genre is None:
@@ -62,6 +97,11 @@ def update_genre(
     for key, value in genre.dict(exclude_unset=True).items():
         setattr(db_genre, key, value)
     
+    conditional.bump_version(db_genre)
+    conditional.bump_collections(db, conditional.GENRES)
+    changes.record(db, conditional.GENRES, changes.UPSERT, [genre_id])
+    # Anime embed their genres
+    changes.record(db, conditional.ANIME, changes.UPSERT, _anime_of_genre(db, genre_id))
     db.commit()
     db.refresh(db_genre)
     return db_genre
@@ -70,12 +110,21 @@ def update_genre(
 def delete_genre(
     genre_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_genre = db.query(models.Genre).filter(models.Genre.id == genre_id).first()
     if db_genre is None:
         raise HTTPException(status_code=404, detail="Genre not found")
     
+    # Read before the delete: its links go by ON DELETE CASCADE
+    tagged = _anime_of_genre(db, genre_id)
     db.delete(db_genre)
+    conditional.bump_collections(db, conditional.GENRES)
+    changes.record(db, conditional.GENRES, changes.DELETE, [genre_id])
+    changes.record(db, conditional.ANIME, changes.UPSERT, tagged)
     db.commit()
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
+
+def _anime_of_genre(db: Session, genre_id: int) -> List[int]:
+    anime_genres = models.anime_genres
+    return db.scalars(select(anime_genres.c.anime_id).where(anime_genres.c.genre_id == genre_id)).all()
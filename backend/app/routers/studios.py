@@ -1,12 +1,15 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 
 from .. import schemas
 from ..models import models
 from ..database import get_db
 from ..auth import auth
+from .. import bulk_delete, catalog_snapshot, changes, conditional, fast_lists
+from ..pagination import paginate, paginate_ids
 
 router = APIRouter(
     prefix="/studios",
@@ -17,32 +20,63 @@ router = APIRouter(
 def create_studio(
     studio: schemas.StudioBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     # Only authenticated users can create studios. Add specific role-based authorization if needed.
     db_studio = models.Studio(**studio.dict())
     db.add(db_studio)
+    db.flush()
+    conditional.bump_collections(db, conditional.STUDIOS)
+    changes.record(db, conditional.STUDIOS, changes.UPSERT, [db_studio.id])
     db.commit()
     db.refresh(db_studio)
     return db_studio
 
 @router.get("/", response_model=List[schemas.Studio])
 def read_studios(
+    request: Request,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    after: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
     db: Session = Depends(get_db)
 ):
-    studios = db.query(models.Studio).offset(skip).limit(limit).all()
+    catalog = catalog_snapshot.snapshot.current()
+    if catalog is not None:
+        validators = conditional.collection_validators(conditional.STUDIOS, request, *catalog.collection_state(conditional.STUDIOS))
+        not_modified = conditional.evaluate(request, response, *validators)
+        if not_modified:
+            return not_modified
+        page = paginate_ids(catalog.studio_ids, response, after=after, skip=skip, limit=limit)
+        return fast_lists.json_response([catalog.studio_document(catalog.studios[studio_id]) for studio_id in page], response)
+
+    state = db.execute(conditional.collection_state((conditional.STUDIOS,))).first()
+    not_modified = conditional.evaluate(request, response, *conditional.collection_validators(conditional.STUDIOS, request, *state))
+    if not_modified:
+        return not_modified
+
+    studios = paginate(db.query(models.Studio), (models.Studio.id,), response, after=after, skip=skip, limit=limit)
     return studios
 
 @router.get("/{studio_id}", response_model=schemas.Studio)
 def read_studio(
     studio_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db)
 ):
+    catalog = catalog_snapshot.snapshot.current()
+    record = catalog.studios.get(studio_id) if catalog is not None else None
+    if record is not None:
+        validators = conditional.row_validators(conditional.STUDIOS, studio_id, record.version, record.updated_at)
+        return conditional.evaluate(request, response, *validators) or fast_lists.json_response(catalog.studio_document(record), response)
+
     studio = db.query(models.Studio).filter(models.Studio.id == studio_id).first()
     if studio is None:
         raise HTTPException(status_code=404, detail="Studio not found")
+    not_modified = conditional.evaluate(request, response, *conditional.row_validators(conditional.STUDIOS, studio_id, studio.version, studio.updated_at))
+    if not_modified:
+        return not_modified
     return studio
 
 @router.put("/{studio_id}", response_model=schemas.Studio)
@@ -50,7 +84,7 @@ def update_studio(
     studio_id: int,
     studio: schemas.StudioBase,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
     db_studio = db.query(models.Studio).filter(models.Studio.id == studio_id).first()
     if db_studio is None:
@@ -59,6 +93,11 @@ def update_studio(
     for key, value in studio.dict(exclude_unset=True).items():
         setattr(db_studio, key, value)
     
+    conditional.bump_version(db_studio)
+    conditional.bump_collections(db, conditional.STUDIOS)
+    changes.record(db, conditional.STUDIOS, changes.UPSERT, [studio_id])
+    # Anime embed their studio
+    changes.record(db, conditional.ANIME, changes.UPSERT, db.scalars(select(models.Anime.id).where(models.Anime.studio_id == studio_id)).all())
     db.commit()
     db.refresh(db_studio)
     return db_studio
@@ -67,12 +106,38 @@ def update_studio(
 def delete_studio(
     studio_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_active_user)
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
 ):
-    db_studio = db.query(models.Studio).filter(models.Studio.id == studio_id).first()
-    if db_studio is None:
+    if not _delete_studios(db, [studio_id]):
         raise HTTPException(status_code=404, detail="Studio not found")
-    
-    db.delete(db_studio)
     db.commit()
-    return {"ok": True}
\ No newline at end of file
+    return {"ok": True}
+
+@router.post("/bulk-delete", response_model=schemas.BulkDeleteResult)
+def delete_studios_bulk(
+    request: schemas.BulkDelete,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_active_user_sync)
+):
+    """Delete many studios in one transaction; ids that do not exist are reported, not an error."""
+    ids = bulk_delete.validate(request)
+    deleted = _delete_studios(db, ids)
+    db.commit()
+    return bulk_delete.result(ids, deleted)
+
+def _delete_studios(db: Session, studio_ids: List[int]) -> List[int]:
+    # ON DELETE SET NULL would clear anime.studio_id too, but without bumping the versions
+    # the anime ETags and the catalog snapshot are keyed on; clear it here in one statement
+    orphaned = db.execute(
+        update(models.Anime)
+        .where(models.Anime.studio_id.in_(studio_ids))
+        .values(studio_id=None, version=models.Anime.version + 1)
+        .returning(models.Anime.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    deleted = bulk_delete.delete_rows(db, models.Studio, studio_ids)
+    if deleted:
+        conditional.bump_collections(db, conditional.STUDIOS, *([conditional.ANIME] if orphaned else []))
+        changes.record(db, conditional.STUDIOS, changes.DELETE, deleted)
+        changes.record(db, conditional.ANIME, changes.UPSERT, orphaned)
+    return deleted
\ No newline at end of file
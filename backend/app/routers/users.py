@@ -1,12 +1,17 @@
-from typing import List
+from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from .. import schemas
 from ..models import models
-from ..database import get_db
+from ..database import get_db, get_async_db
 from ..auth import auth
+from .. import library_export, library_sync
+from ..recommendations.index import holder as recommendation_index
 
 router = APIRouter(
     prefix="/users",
@@ -18,10 +23,66 @@ async def read_users_me(current_user: models.User = Depends(auth.get_current_act
     return current_user
 
 @router.get("/{user_id}", response_model=schemas.User)
-def read_user(user_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user)):
+def read_user(user_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_user_sync)):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     # For now, allow any logged-in user to view any user's public profile (username, email, created_at)
     # More restrictive access can be implemented later if needed.
-    return user
\ No newline at end of file
+    return user
+
+@router.get("/{user_id}/export")
+def export_user_library(
+    user_id: int,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """Download the user's watch progress and favorites, streamed row by row."""
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to export this user's library")
+
+    return StreamingResponse(
+        library_export.STREAMS[format](user_id),
+        media_type=library_export.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="library-{user_id}.{format}"'},
+    )
+
+@router.get("/{user_id}/library", response_model=schemas.LibraryDelta)
+async def sync_user_library(
+    user_id: int,
+    since: Optional[str] = Query(None, description="token from the previous sync, or an ISO 8601 timestamp"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """Progress and favorites changed since the last sync, with tombstones for removed ones."""
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to sync this user's library")
+
+    return await library_sync.delta(db, user_id, since)
+
+@router.get("/{user_id}/recommendations", response_model=List[schemas.Recommendation])
+async def read_user_recommendations(
+    user_id: int,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(auth.get_current_active_user)
+):
+    """Anime similar to the user's library, from the index built by build_recommendations.py."""
+    if user_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not authorized to view this user's recommendations")
+
+    index = recommendation_index.current()
+    if index is None:
+        raise HTTPException(status_code=503, detail="Recommendations have not been built yet")
+    ranked = index.recommend(user_id, limit)
+    if not ranked:
+        return []
+
+    # Anime deleted since the build drop out here
+    anime = await db.execute(select(models.Anime).where(models.Anime.id.in_([anime_id for anime_id, _ in ranked])))
+    anime_by_id = {item.id: item for item in anime.scalars()}
+    return [
+        schemas.Recommendation(anime_id=anime_id, score=score, anime=schemas.AnimeInFavorite.from_orm(anime_by_id[anime_id]))
+        for anime_id, score in ranked
+        if anime_id in anime_by_id
+    ]
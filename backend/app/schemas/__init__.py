@@ -0,0 +1 @@
+from .schemas import *  # noqa: F401,F403
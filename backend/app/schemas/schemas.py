@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime, date
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 # Base Schemas (for creation/update)
 class UserBase(BaseModel):
@@ -134,6 +134,10 @@ class Episode(EpisodeBase):
     class Config:
         orm_mode = True
 
+class CalendarEpisode(Episode):
+    anime_title: str
+    cover_url: Optional[str] = None
+
 class Anime(AnimeBase):
     id: int
     studio: Optional[StudioInDB] = None
@@ -189,6 +193,135 @@ class CharacterInFavorite(BaseModel):
 # Update forward references
 UserFavorite.update_forward_refs()
 
+# Matching anime per filter value, for the browse sidebar
+class AnimeFacets(BaseModel):
+    total: int
+    genres: Dict[str, int] = {}
+    statuses: Dict[str, int] = {}
+    types: Dict[str, int] = {}
+
+# Per-anime aggregates of user progress
+class AnimeStats(BaseModel):
+    anime_id: int
+    members: int = 0 # users with the anime in their library, whatever the status
+    scored: int = 0
+    mean_score: Optional[float] = None
+    watching: int = 0
+    completed: int = 0
+    on_hold: int = 0
+    dropped: int = 0
+    plan_to_watch: int = 0
+
+# Item-to-item recommendations
+class Recommendation(BaseModel):
+    anime_id: int
+    score: float
+    anime: Optional[AnimeInFavorite] = None
+
+# Batch progress sync (offline clients)
+class UserAnimeProgressSyncItem(BaseModel):
+    anime_id: int
+    episodes_watched: Optional[int] = 0
+    status: Optional[str] = None
+    score: Optional[int] = None # 1-10
+    client_updated_at: datetime # the change only applies if newer than the stored one
+
+# Items per batch sync; one multi-row upsert of this many stays under SQLite's 32766 bind parameters
+MAX_PROGRESS_BATCH_ITEMS = 2000
+
+class UserAnimeProgressBatch(BaseModel):
+    items: List[UserAnimeProgressSyncItem] = Field(..., max_items=MAX_PROGRESS_BATCH_ITEMS) # larger syncs send several batches
+
+class UserAnimeProgressBatchResult(BaseModel):
+    applied: List[int] = [] # anime ids written
+    stale: List[int] = [] # anime ids where a newer change was already stored
+    unknown: List[int] = [] # anime ids that do not exist
+
+# Library delta sync (GET /users/{id}/library?since=)
+class LibraryProgress(BaseModel):
+    anime_id: int
+    episodes_watched: Optional[int] = None
+    status: Optional[str] = None
+    score: Optional[int] = None
+    updated_at: datetime
+
+class LibraryFavorite(BaseModel):
+    anime_id: Optional[int] = None
+    character_id: Optional[int] = None
+    updated_at: datetime
+
+class LibraryTombstone(BaseModel):
+    kind: str # progress or favorite
+    anime_id: Optional[int] = None
+    character_id: Optional[int] = None
+    deleted_at: datetime
+
+class LibraryDelta(BaseModel):
+    full: bool # no usable since: progress and favorites are the whole library
+    progress: List[LibraryProgress] = []
+    favorites: List[LibraryFavorite] = []
+    deleted: List[LibraryTombstone] = []
+    token: str # pass as ?since= on the next sync
+
+# Bulk catalog import (one NDJSON line per anime, referenced entities nested by name)
+class EpisodeImport(BaseModel):
+    episode_number: int
+    title: Optional[str] = None
+    duration_minutes: Optional[int] = None
+    air_date: Optional[date] = None
+
+class CharacterImport(CharacterBase):
+    role: Optional[str] = None # e.g., 'Main', 'Supporting'
+
+class AnimeImport(AnimeBase):
+    external_id: Optional[str] = None # idempotency key; defaults to "title|type|release_date"
+    studio: Optional[StudioBase] = None
+    genres: List[str] = []
+    episodes: List[EpisodeImport] = []
+    characters: List[CharacterImport] = []
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+class ImportReport(BaseModel):
+    lines: int
+    imported: int
+    failed: int
+    errors: List[ImportLineError] = []
+
+# Bulk season creation: episodes of one anime, in the import shape
+class EpisodeBulkCreate(BaseModel):
+    anime_id: int
+    episodes: List[EpisodeImport]
+    update_episodes_total: bool = False # set the anime's episodes_total to its episode count
+
+class EpisodeBulkResult(BaseModel):
+    anime_id: int
+    ids: List[int] # created episode ids, in request order
+    episodes_total: Optional[int] = None
+
+# Bulk delete of catalog rows by id
+class BulkDelete(BaseModel):
+    ids: List[int]
+
+class BulkDeleteResult(BaseModel):
+    deleted: List[int] = [] # ids removed
+    missing: List[int] = [] # ids that did not exist
+
+# Catalog change feed (GET /changes, GET /changes/stream)
+class CatalogChange(BaseModel):
+    seq: int
+    entity: str # anime, episodes, genres, studios or characters
+    entity_id: int
+    op: str # upsert: fetch the row again; delete: drop it
+    created_at: datetime
+
+class CatalogChangePage(BaseModel):
+    changes: List[CatalogChange] = []
+    next_since: int # pass as ?since= for the next page
+    has_more: bool
+
 # JWT Token schemas
 class Token(BaseModel):
     access_token: str
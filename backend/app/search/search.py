@@ -0,0 +1,175 @@
+import re
+import unicodedata
+from typing import List, Optional
+
+from sqlalchemy import Float, Integer, or_, select, text, literal
+from sqlalchemy.orm import Session
+
+from ..models import models
+
+# Latin letters/digits form words; CJK scripts have no word boundaries and are indexed as bigrams
+_TOKEN_RE = re.compile("[0-9a-z]+|[\u3040-\u309f\u4e00-\u9fff\u3400-\u4dbf\uac00-\ud7af]+")
+_CJK_RE = re.compile("[\u3040-\u309f\u4e00-\u9fff\u3400-\u4dbf\uac00-\ud7af]")
+# Romaji long vowels are written several ways (Shōnen / Shounen / Shonen); fold them to one form
+_LONG_VOWELS = (("ou", "o"), ("oo", "o"), ("uu", "u"))
+
+
+def normalize(value: Optional[str]) -> str:
+    """Fold text to the form stored in the index: NFKC, case-folded, katakana as hiragana,
+    Latin diacritics and long vowel spellings removed."""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKC", value).casefold()
+    # Katakana (ァ..ヶ) sits 0x60 above the matching hiragana
+    value = "".join(chr(ord(c) - 0x60) if "\u30a1" <= c <= "\u30f6" else c for c in value)
+    value = value.replace("\u30fc", "")  # prolonged sound mark
+    decomposed = unicodedata.normalize("NFKD", value)
+    value = unicodedata.normalize("NFC", "".join(c for c in decomposed if not "\u0300" <= c <= "\u036f"))
+    for long, short in _LONG_VOWELS:
+        value = value.replace(long, short)
+    return value
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    tokens = []
+    for token in _TOKEN_RE.findall(normalize(value)):
+        if _CJK_RE.match(token) and len(token) > 1:
+            tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            tokens.append(token)
+    return tokens
+
+
+def _document(*values: Optional[str]) -> str:
+    return " ".join(token for value in values for token in tokenize(value))
+
+
+def _entry(anime) -> dict:
+    return {
+        "anime_id": anime.id,
+        "title": _document(anime.title, anime.japanese_title),
+        "synopsis": _document(anime.synopsis),
+    }
+
+
+class PostgresSearchBackend:
+    """tsvector (weighted title > synopsis) for ranked prefix search, pg_trgm for typo tolerance on titles.
+    Tables and indexes are created by migration 0002."""
+
+    def index(self, db: Session, anime_list):
+        db.execute(
+            text(
+                "INSERT INTO anime_search (anime_id, title_doc, document) "
+                "VALUES (:anime_id, :title, setweight(to_tsvector('simple', :title), 'A') "
+                "|| setweight(to_tsvector('simple', :synopsis), 'B')) "
+                "ON CONFLICT (anime_id) DO UPDATE SET title_doc = excluded.title_doc, document = excluded.document"
+            ),
+            [_entry(anime) for anime in anime_list],
+        )
+
+    def remove(self, db: Session, anime_ids: List[int]):
+        db.execute(text("DELETE FROM anime_search WHERE anime_id = :anime_id"), [{"anime_id": anime_id} for anime_id in anime_ids])
+
+    def ranked(self, query: str, tokens: List[str]):
+        statement = text(
+            "SELECT anime_id, ts_rank(document, query) + similarity(title_doc, :phrase) AS rank "
+            "FROM anime_search, to_tsquery('simple', :query) AS query "
+            "WHERE document @@ query OR title_doc % :phrase"
+        ).bindparams(query=" & ".join(f"{token}:*" for token in tokens), phrase=" ".join(tokens))
+        return statement.columns(anime_id=Integer, rank=Float).subquery("search_results")
+
+
+class SQLiteSearchBackend:
+    """FTS5 with bm25 ranking; used for local development and tests."""
+
+    def index(self, db: Session, anime_list):
+        entries = [_entry(anime) for anime in anime_list]
+        db.execute(text("DELETE FROM anime_fts WHERE rowid = :anime_id"), entries)
+        db.execute(text("INSERT INTO anime_fts (rowid, title, synopsis) VALUES (:anime_id, :title, :synopsis)"), entries)
+
+    def remove(self, db: Session, anime_ids: List[int]):
+        db.execute(text("DELETE FROM anime_fts WHERE rowid = :anime_id"), [{"anime_id": anime_id} for anime_id in anime_ids])
+
+    def ranked(self, query: str, tokens: List[str]):
+        # bm25() is lower-is-better; titles weigh ten times the synopsis
+        statement = text(
+            "SELECT rowid AS anime_id, -bm25(anime_fts, 10.0, 1.0) AS rank "
+            "FROM anime_fts WHERE anime_fts MATCH :query"
+        ).bindparams(query=" ".join(f'"{token}"*' for token in tokens))
+        return statement.columns(anime_id=Integer, rank=Float).subquery("search_results")
+
+
+class LikeSearchBackend:
+    """Unindexed fallback for databases without a full-text engine."""
+
+    def index(self, db: Session, anime_list):
+        pass
+
+    def remove(self, db: Session, anime_ids: List[int]):
+        pass
+
+    def ranked(self, query: str, tokens: List[str]):
+        # The columns hold titles as stored, not folded: match the query as the user typed it
+        phrase = query.strip()
+        return (
+            select(models.Anime.id.label("anime_id"), literal(1.0).label("rank"))
+            .where(or_(models.Anime.title.icontains(phrase, autoescape=True), models.Anime.japanese_title.icontains(phrase, autoescape=True)))
+            .subquery("search_results")
+        )
+
+
+_backends = {
+    "postgresql": PostgresSearchBackend(),
+    "sqlite": SQLiteSearchBackend(),
+}
+
+
+def get_backend(dialect_name: str):
+    return _backends.get(dialect_name, LikeSearchBackend())
+
+
+def _backend_for(db: Session):
+    return get_backend(db.get_bind().dialect.name)
+
+
+def index_anime(db: Session, anime: models.Anime):
+    """Write (or overwrite) the index entry for an anime; call inside the same transaction as the change."""
+    _backend_for(db).index(db, [anime])
+
+
+def index_anime_many(db: Session, anime_list):
+    """Batch form of index_anime; entries only need id, title, japanese_title and synopsis attributes."""
+    if anime_list:
+        _backend_for(db).index(db, anime_list)
+
+
+def remove_anime(db: Session, anime_id: int):
+    _backend_for(db).remove(db, [anime_id])
+
+
+def remove_anime_many(db: Session, anime_ids: List[int]):
+    if anime_ids:
+        _backend_for(db).remove(db, anime_ids)
+
+
+def ranked_anime_ids(db: Session, query: str):
+    """Selectable of (anime_id, rank) matching every term of `query` as a prefix, or None when
+    the query has no searchable terms."""
+    tokens = tokenize(query)
+    if not tokens:
+        return None
+    return _backend_for(db).ranked(query, tokens)
+
+
+def rebuild_index(db: Session, batch_size: int = 1000):
+    backend = _backend_for(db)
+    columns = (models.Anime.id, models.Anime.title, models.Anime.japanese_title, models.Anime.synopsis)
+    batch = []
+    for row in db.query(*columns).yield_per(batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            backend.index(db, batch)
+            batch = []
+    if batch:
+        backend.index(db, batch)
+    db.commit()
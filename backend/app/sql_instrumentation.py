@@ -0,0 +1,123 @@
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from dotenv import load_dotenv
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+load_dotenv()
+
+logger = logging.getLogger("app.sql")
+
+SQL_STATS_HEADER = "X-SQL-Stats"
+SQL_STATS_ENABLED = os.getenv("SQL_STATS_ENABLED", "false").lower() in ("1", "true", "yes")
+# A statement run this many times in one request is reported as a likely N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", 5))
+
+
+class StatementStats:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # Statement text -> executions; the text is parameterized, so it identifies a query shape
+        self.statements = Counter()
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.duration += duration
+        self.statements[statement] += 1
+
+    @property
+    def max_repeat(self) -> int:
+        return max(self.statements.values(), default=0)
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD):
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+    def header_value(self) -> str:
+        return f"statements={self.count}; db_ms={self.duration * 1000:.2f}; max_repeat={self.max_repeat}"
+
+
+_current: ContextVar[Optional[StatementStats]] = ContextVar("sql_statement_stats", default=None)
+
+
+# Registered on the Engine class, so it covers the sync engine and the async engine's sync core.
+# The start time lives on the statement's execution context, so a statement that raises
+# leaves nothing behind on the pooled connection for a later one to pair with
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None and context is not None:
+        context._sql_stats_started_at = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = getattr(context, "_sql_stats_started_at", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+@contextmanager
+def count_statements():
+    """Collect the statements executed in this context (and in threadpool calls made from it)."""
+    stats = StatementStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+def parse_header(value: str) -> dict:
+    fields = dict(part.strip().split("=", 1) for part in value.split(";"))
+    return {"statements": int(fields["statements"]), "db_ms": float(fields["db_ms"]), "max_repeat": int(fields["max_repeat"])}
+
+
+def assert_statement_budget(source, budget: int, max_repeat: Optional[int] = None):
+    """Fail when a request (a response carrying X-SQL-Stats) or a count_statements() block went over budget."""
+    if isinstance(source, StatementStats):
+        stats = {"statements": source.count, "max_repeat": source.max_repeat}
+    else:
+        value = source.headers.get(SQL_STATS_HEADER)
+        assert value is not None, f"response has no {SQL_STATS_HEADER} header"
+        stats = parse_header(value)
+    assert stats["statements"] <= budget, f"{stats['statements']} SQL statements, budget is {budget}"
+    if max_repeat is not None:
+        assert stats["max_repeat"] <= max_repeat, f"a statement ran {stats['max_repeat']} times, limit is {max_repeat}"
+
+
+class SQLStatsMiddleware:
+    """Counts the SQL run for each request, returns it in X-SQL-Stats and logs it.
+
+    Plain ASGI rather than BaseHTTPMiddleware so streamed responses pass through untouched. The
+    header goes out with the response start; statements run while a body streams are only logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_STATS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_stats(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((SQL_STATS_HEADER.lower().encode("latin-1"), stats.header_value().encode("latin-1")))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        with count_statements() as stats:
+            await self.app(scope, receive, send_with_stats)
+
+        route = f"{scope['method']} {scope['path']}"
+        logger.debug("%s: %s", route, stats.header_value())
+        for statement, count in stats.repeated():
+            logger.warning("%s: possible N+1, statement ran %d times: %s", route, count, " ".join(statement.split()))
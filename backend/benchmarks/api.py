@@ -0,0 +1,221 @@
+"""API benchmark: throughput and p50/p95/p99 latency per endpoint, compared with a saved baseline.
+
+Runs against a database filled by benchmarks.seed (the ids it picks come from DATABASE_URL).
+Requests go to the app in-process, or to a running server with --base-url. Write endpoints
+change the data, so use a benchmark database:
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.seed --scale small
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.api --save baseline.json
+    # ...change something...
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.api --compare baseline.json --max-regression 15
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+# The benchmark is one client sending as fast as it can; the in-process app must not throttle it
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx  # noqa: E402
+from sqlalchemy import func, select  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models import models  # noqa: E402
+
+from .seed import GENRES, PASSWORD, USERNAME, WORDS  # noqa: E402
+
+
+def _ids(db, column):
+    return db.scalar(select(func.min(column))), db.scalar(select(func.max(column)))
+
+
+class Scenario:
+    """Random, valid request arguments drawn from the seeded id ranges."""
+
+    def __init__(self, rng, ranges, user_id):
+        self.rng = rng
+        self.ranges = ranges
+        self.user_id = user_id
+        self._new_users = itertools.count()
+
+    def id(self, name):
+        low, high = self.ranges[name]
+        return self.rng.randint(low, high)
+
+    def word(self):
+        return self.rng.choice(WORDS)
+
+    def new_user(self):
+        n = f"{int(time.time())}_{next(self._new_users)}"
+        return {"username": f"bench_new_{n}", "email": f"bench_new_{n}@example.com", "password": PASSWORD}
+
+    def progress(self):
+        anime_id = self.id("anime")
+        body = {"user_id": self.user_id, "anime_id": anime_id, "episodes_watched": self.rng.randint(0, 12), "status": "Watching"}
+        return f"/anime/{anime_id}/progress", body
+
+    def progress_batch(self):
+        now = datetime.now(timezone.utc).isoformat()
+        return {"items": [
+            {"anime_id": self.id("anime"), "episodes_watched": self.rng.randint(0, 12), "client_updated_at": now}
+            for _ in range(20)
+        ]}
+
+
+# name -> (method, scenario -> path or (path, json body), needs auth). Names are stable: baselines key on them.
+ENDPOINTS = {
+    "auth.token": ("POST", lambda s: "/auth/token", False),
+    "auth.register": ("POST", lambda s: ("/auth/register", s.new_user()), False),
+    "auth.me": ("GET", lambda s: "/auth/me/", True),
+    "anime.list": ("GET", lambda s: f"/anime/?skip={s.rng.randint(0, 500)}&limit=50", False),
+    "anime.list_by_genre": ("GET", lambda s: f"/anime/?genre_name={s.rng.choice(GENRES)}&limit=50", False),
+    "anime.search": ("GET", lambda s: f"/anime/?search={s.word()[:4]}&limit=20", False),
+    "anime.read": ("GET", lambda s: f"/anime/{s.id('anime')}", False),
+    "anime.progress_read": ("GET", lambda s: f"/anime/{s.id('anime')}/progress/{s.user_id}", True),
+    "anime.progress_write": ("POST", lambda s: s.progress(), True),
+    "anime.progress_batch": ("POST", lambda s: ("/anime/progress/batch", s.progress_batch()), True),
+    "anime.add_genre": ("POST", lambda s: f"/anime/{s.id('anime')}/genres/{s.id('genres')}", True),
+    "episodes.by_anime": ("GET", lambda s: f"/episodes/anime/{s.id('anime')}", False),
+    "episodes.read": ("GET", lambda s: f"/episodes/{s.id('episodes')}", False),
+    "genres.list": ("GET", lambda s: "/genres/", False),
+    "genres.read": ("GET", lambda s: f"/genres/{s.id('genres')}", False),
+    "characters.list": ("GET", lambda s: f"/characters/?skip={s.rng.randint(0, 500)}&limit=50", False),
+    "characters.search": ("GET", lambda s: f"/characters/?search={s.word().title()}&limit=20", False),
+    "characters.read": ("GET", lambda s: f"/characters/{s.id('characters')}", False),
+    "studios.list": ("GET", lambda s: "/studios/?limit=50", False),
+    "studios.read": ("GET", lambda s: f"/studios/{s.id('studios')}", False),
+    "favorites.list": ("GET", lambda s: f"/users/{s.user_id}/favorites", True),
+}
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, max(0, round(len(ordered) * fraction) - 1))]
+
+
+async def run_endpoint(client, scenario, name, requests, concurrency, headers):
+    method, build, needs_auth = ENDPOINTS[name]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one():
+        nonlocal errors
+        request = build(scenario)
+        path, body = request if isinstance(request, tuple) else (request, None)
+        kwargs = {"headers": headers if needs_auth else None, "json": body}
+        if name == "auth.token":
+            kwargs["data"] = {"username": USERNAME.format(scenario.user_id), "password": PASSWORD}
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+def compare(results, baseline, max_regression):
+    """Print the change against the baseline; returns the endpoints that regressed past the limit."""
+    regressed = []
+    print(f"\n{'vs baseline':<24}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, result in results.items():
+        before = baseline["results"].get(name)
+        if not before:
+            print(f"{name:<24}{'(new)':>10}")
+            continue
+        deltas = {key: (result[key] - before[key]) / before[key] * 100 if before[key] else 0.0 for key in ("rps", "p50_ms", "p95_ms", "p99_ms")}
+        print(f"{name:<24}" + "".join(f"{deltas[key]:>+9.1f}%" for key in ("rps", "p50_ms", "p95_ms", "p99_ms")))
+        if max_regression is not None and (deltas["p95_ms"] > max_regression or deltas["rps"] < -max_regression):
+            regressed.append(name)
+    return regressed
+
+
+async def main(args):
+    with SessionLocal() as db:
+        ranges = {
+            "anime": _ids(db, models.Anime.id),
+            "episodes": _ids(db, models.Episode.id),
+            "genres": _ids(db, models.Genre.id),
+            "characters": _ids(db, models.Character.id),
+            "studios": _ids(db, models.Studio.id),
+        }
+        user_id = db.scalar(select(models.User.id).where(models.User.username == USERNAME.format(1)))
+    if user_id is None or None in ranges["anime"]:
+        raise SystemExit("Seed the database first: python -m benchmarks.seed")
+    scenario = Scenario(random.Random(args.seed), ranges, user_id)
+    names = [name for name in ENDPOINTS if not args.only or any(name.startswith(prefix) for prefix in args.only)]
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from app.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://bench", timeout=60)
+
+    async with client:
+        response = await client.post("/auth/token", data={"username": USERNAME.format(user_id), "password": PASSWORD})
+        response.raise_for_status()
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+        results = {}
+        print(f"{'endpoint':<24}{'req':>7}{'err':>6}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name in names:
+            # Warm up caches and connections so the measured run is steady state
+            await run_endpoint(client, scenario, name, min(args.requests, 20), args.concurrency, headers)
+            result = await run_endpoint(client, scenario, name, args.requests, args.concurrency, headers)
+            results[name] = result
+            print(f"{name:<24}{result['requests']:>7}{result['errors']:>6}{result['rps']:>10.1f}"
+                  f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+
+    report = {
+        "meta": {
+            "database": engine.dialect.name,
+            "target": args.base_url or "in-process",
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "anime_ids": ranges["anime"],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nsaved to {args.save}")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressed = compare(results, baseline, args.max_regression)
+        if regressed:
+            print(f"\nregressed more than {args.max_regression}%: {', '.join(regressed)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="benchmark a running server instead of the app in-process")
+    parser.add_argument("--requests", type=int, default=500, help="measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="endpoint name prefixes, e.g. anime. auth.token")
+    parser.add_argument("--seed", type=int, default=0, help="random seed for the request mix")
+    parser.add_argument("--save", help="write the results as a baseline JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--max-regression", type=float, help="exit 1 if p95 grows or rps drops by more than this percent")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,107 @@
+"""Concurrency scaling of GET /anime/{id}: blocking handler (before) vs AsyncSession handler (after).
+
+The "before" route is the pre-async handler shape: an `async def` endpoint running a
+synchronous Session query on the event loop. Both routes are served by the same app,
+in-process, against DATABASE_URL. Against SQLite, --db-latency-ms adds a sleep to every
+statement in the thread that executes it, standing in for a database round trip:
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.async_concurrency --db-latency-ms 2
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+# Measures the handlers, not admission control
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.orm import joinedload, selectinload  # noqa: E402
+
+from app.database import SessionLocal, engine, async_engine  # noqa: E402
+from app import schemas  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrate import upgrade  # noqa: E402
+from app.models import models  # noqa: E402
+
+
+@app.get("/_bench/blocking/anime/{anime_id}", response_model=schemas.Anime, include_in_schema=False)
+async def read_anime_blocking(anime_id: int):
+    db = SessionLocal()
+    try:
+        return db.query(models.Anime).options(joinedload(models.Anime.studio)).options(selectinload(models.Anime.genres)).filter(models.Anime.id == anime_id).first()
+    finally:
+        db.close()
+
+
+def seed(count):
+    db = SessionLocal()
+    try:
+        existing = db.query(models.Anime.id).count()
+        db.add_all(models.Anime(title=f"Bench {i}", synopsis="x" * 500) for i in range(existing, count))
+        db.commit()
+        return [row.id for row in db.query(models.Anime.id).limit(count)]
+    finally:
+        db.close()
+
+
+def add_sqlite_latency(seconds):
+    def delay(statement):
+        time.sleep(seconds)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.set_trace_callback(delay)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def on_async_connect(dbapi_connection, connection_record):
+        # aiosqlite runs statements on its own thread, so the delay lands there
+        dbapi_connection.run_async(lambda connection: connection.set_trace_callback(delay))
+
+    engine.dispose()
+
+
+async def run(client, path, ids, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.get(path.format(random.choice(ids)))
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return requests / elapsed, statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+async def main(args):
+    upgrade()
+    ids = seed(args.anime)
+    if args.db_latency_ms:
+        if engine.dialect.name != "sqlite":
+            raise SystemExit("--db-latency-ms is only supported for SQLite")
+        add_sqlite_latency(args.db_latency_ms / 1000)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        print(f"{'route':<10}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, path in (("before", "/_bench/blocking/anime/{}"), ("after", "/anime/{}")):
+            for concurrency in args.concurrency:
+                rps, p50, p95 = await run(client, path, ids, args.requests, concurrency)
+                print(f"{name:<10}{concurrency:>6}{rps:>10.0f}{p50 * 1000:>10.2f}{p95 * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--anime", type=int, default=2000, help="rows to seed")
+    parser.add_argument("--requests", type=int, default=1000, help="requests per concurrency level")
+    parser.add_argument("--db-latency-ms", type=float, default=0, help="simulated per-statement latency (SQLite only)")
+    parser.add_argument("--concurrency", type=lambda v: [int(c) for c in v.split(",")], default=[1, 8, 32, 64])
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,77 @@
+"""GET /anime/ serialization: ORM objects + response_model validation vs the fast_lists path.
+
+Both paths are served by the same app, in-process, against a database filled by
+benchmarks.seed; the fast path is switched on per run through fast_lists.FAST_LIST_RESPONSES.
+Before timing, every sampled page is fetched both ways and the JSON compared, so the fast
+path is checked to publish the same documents:
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.list_serialization --limit 100
+"""
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from app import fast_lists
+from app.main import app
+
+from .api import percentile
+from .seed import GENRES
+
+
+def paths(rng, count, limit):
+    return [
+        rng.choice((
+            f"/anime/?skip={rng.randint(0, 1000)}&limit={limit}",
+            f"/anime/?genre_name={rng.choice(GENRES)}&skip={rng.randint(0, 100)}&limit={limit}",
+        ))
+        for _ in range(count)
+    ]
+
+
+async def fetch(client, path, fast):
+    fast_lists.FAST_LIST_RESPONSES = fast
+    response = await client.get(path)
+    response.raise_for_status()
+    return response
+
+
+async def run(client, requests, fast):
+    latencies = []
+    started = time.perf_counter()
+    for path in requests:
+        request_started = time.perf_counter()
+        await fetch(client, path, fast)
+        latencies.append(time.perf_counter() - request_started)
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return len(requests) / elapsed, percentile(latencies, 0.5), percentile(latencies, 0.95)
+
+
+async def main(args):
+    rng = random.Random(args.seed)
+    requests = paths(rng, args.requests, args.limit)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in requests[:args.verify]:
+            orm, fast = await fetch(client, path, False), await fetch(client, path, True)
+            if orm.json() != fast.json() or orm.headers.get("x-next-cursor") != fast.headers.get("x-next-cursor"):
+                raise SystemExit(f"fast path differs from the ORM path for {path}")
+        print(f"checked {min(args.verify, len(requests))} pages: identical JSON and cursors")
+
+        print(f"{'path':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, fast in (("orm", False), ("fast", True)):
+            await run(client, requests[:20], fast)
+            rps, p50, p95 = await run(client, requests, fast)
+            print(f"{name:<8}{rps:>10.1f}{p50 * 1000:>10.2f}{p95 * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=100, help="page size")
+    parser.add_argument("--requests", type=int, default=300, help="requests per path")
+    parser.add_argument("--verify", type=int, default=50, help="pages compared between the two paths")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,226 @@
+"""Synthetic catalog generator for the benchmarks.
+
+Fills an empty database (DATABASE_URL, migrated to head) with a deterministic catalog at a
+preset scale, optionally overriding single counts:
+
+    DATABASE_URL=sqlite:///./bench.db python -m benchmarks.seed --scale small
+    DATABASE_URL=postgresql://localhost/bench python -m benchmarks.seed --scale large
+
+Every seeded user is named bench_user_<n> and has the password "bench".
+"""
+import argparse
+import random
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import func, insert, select, text
+
+from app import anime_stats, conditional
+from app.auth.hashing import pwd_context
+from app.database import SessionLocal, engine
+from app.migrate import upgrade
+from app.models import models
+from app.search import search
+
+PASSWORD = "bench"
+USERNAME = "bench_user_{}"
+
+SCALES = {
+    "tiny": dict(anime=1_000, episodes_per_anime=12, users=1_000, progress_per_user=20),
+    "small": dict(anime=10_000, episodes_per_anime=20, users=50_000, progress_per_user=20),
+    # 100k anime, 2M episodes, 1M users, 20M progress rows
+    "large": dict(anime=100_000, episodes_per_anime=20, users=1_000_000, progress_per_user=20),
+}
+
+CHUNK_SIZE = 10_000
+
+GENRES = [
+    "Action", "Adventure", "Comedy", "Drama", "Fantasy", "Horror", "Isekai", "Mecha", "Music", "Mystery",
+    "Psychological", "Romance", "Sci-Fi", "Slice of Life", "Sports", "Supernatural", "Thriller", "Historical",
+    "Military", "School",
+]
+WORDS = [
+    "shadow", "blade", "star", "academy", "dragon", "spirit", "summer", "garden", "knight", "ocean", "memory",
+    "signal", "crimson", "frontier", "echo", "festival", "machine", "moon", "labyrinth", "witch", "rain", "clockwork",
+]
+KANA = ["ア", "カ", "サ", "タ", "ナ", "ハ", "マ", "ヤ", "ラ", "ワ", "キ", "シ", "チ", "ニ", "ヒ", "ミ", "リ", "ン", "ー"]
+STATUSES = ["Finished Airing", "Currently Airing", "Not yet aired"]
+TYPES = ["TV", "Movie", "OVA", "ONA", "Special"]
+PROGRESS_STATUSES = ["Watching", "Completed", "On Hold", "Dropped", "Plan to Watch"]
+ROLES = ["Main", "Supporting"]
+
+
+def _title(rng, n):
+    return f"{' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))).title()} {n}"
+
+
+def _kana(rng):
+    return "".join(rng.choice(KANA) for _ in range(rng.randint(3, 8)))
+
+
+def _insert(connection, table, rows):
+    """Insert an iterable of row dicts in executemany chunks; returns the row count."""
+    count, chunk = 0, []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= CHUNK_SIZE:
+            connection.execute(insert(table), chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        connection.execute(insert(table), chunk)
+        count += len(chunk)
+    return count
+
+
+def _reset_sequences(connection, tables):
+    # Rows are inserted with explicit ids; move the serial sequences past them
+    if connection.dialect.name != "postgresql":
+        return
+    for table in tables:
+        connection.execute(
+            text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+        )
+
+
+def generate(scale: dict, seed: int = 0, log=print):
+    rng = random.Random(seed)
+    anime_count = scale["anime"]
+    studio_count = max(10, anime_count // 200)
+    character_count = anime_count * 2
+    voice_actor_count = max(10, character_count // 4)
+    user_count = scale["users"]
+    progress_per_user = min(scale["progress_per_user"], anime_count)
+    hashed_password = pwd_context.hash(PASSWORD)
+    first_air = date(1990, 1, 1)
+
+    def step(name, table, rows):
+        started = time.perf_counter()
+        count = _insert(connection, table, rows)
+        log(f"{name:<24}{count:>12,} rows {time.perf_counter() - started:>8.1f}s")
+
+    with engine.begin() as connection:
+        if connection.dialect.name == "sqlite":
+            connection.exec_driver_sql("PRAGMA synchronous = OFF")
+
+        step("studios", models.Studio.__table__, (
+            {"id": i, "name": f"Studio {i}", "country": "Japan", "founded_year": rng.randint(1950, 2020)}
+            for i in range(1, studio_count + 1)
+        ))
+        step("genres", models.Genre.__table__, ({"id": i, "name": name} for i, name in enumerate(GENRES, start=1)))
+        step("voice_actors", models.VoiceActor.__table__, (
+            {"id": i, "name": f"Voice Actor {i}", "nationality": "Japanese"} for i in range(1, voice_actor_count + 1)
+        ))
+        step("characters", models.Character.__table__, (
+            {"id": i, "name": f"{rng.choice(WORDS).title()} {i}", "description": "A synthetic character."}
+            for i in range(1, character_count + 1)
+        ))
+
+        def anime_rows():
+            for i in range(1, anime_count + 1):
+                release = first_air + timedelta(days=rng.randint(0, 12_000))
+                yield {
+                    "id": i,
+                    "title": _title(rng, i),
+                    "japanese_title": _kana(rng),
+                    "status": rng.choice(STATUSES),
+                    "type": rng.choice(TYPES),
+                    "synopsis": " ".join(rng.choice(WORDS) for _ in range(40)),
+                    "episodes_total": scale["episodes_per_anime"],
+                    "release_date": release,
+                    "studio_id": rng.randint(1, studio_count),
+                }
+        step("anime", models.Anime.__table__, anime_rows())
+
+        step("anime_genres", models.anime_genres, (
+            {"anime_id": anime_id, "genre_id": genre_id}
+            for anime_id in range(1, anime_count + 1)
+            for genre_id in rng.sample(range(1, len(GENRES) + 1), rng.randint(1, 4))
+        ))
+        step("anime_characters", models.anime_characters, (
+            {"anime_id": anime_id, "character_id": character_id, "role": ROLES[n > 0]}
+            for anime_id in range(1, anime_count + 1)
+            for n, character_id in enumerate(rng.sample(range(1, character_count + 1), 3))
+        ))
+        step("character_voice_actors", models.character_voice_actors, (
+            {"character_id": i, "voice_actor_id": rng.randint(1, voice_actor_count), "language": "Japanese"}
+            for i in range(1, character_count + 1)
+        ))
+
+        def episode_rows():
+            episode_id = 0
+            for anime_id in range(1, anime_count + 1):
+                for number in range(1, scale["episodes_per_anime"] + 1):
+                    episode_id += 1
+                    yield {
+                        "id": episode_id,
+                        "anime_id": anime_id,
+                        "episode_number": number,
+                        "title": f"Episode {number}",
+                        "duration_minutes": 24,
+                        "air_date": first_air + timedelta(days=anime_id % 12_000 + 7 * number),
+                    }
+        step("episodes", models.Episode.__table__, episode_rows())
+
+        step("users", models.User.__table__, (
+            {"id": i, "username": USERNAME.format(i), "email": f"bench{i}@example.com", "hashed_password": hashed_password}
+            for i in range(1, user_count + 1)
+        ))
+
+        def progress_rows():
+            for user_id in range(1, user_count + 1):
+                for anime_id in rng.sample(range(1, anime_count + 1), progress_per_user):
+                    yield {
+                        "user_id": user_id,
+                        "anime_id": anime_id,
+                        "episodes_watched": rng.randint(0, scale["episodes_per_anime"]),
+                        "status": rng.choice(PROGRESS_STATUSES),
+                        "score": rng.randint(1, 10),
+                    }
+        step("user_anime_progress", models.UserAnimeProgress.__table__, progress_rows())
+        step("user_favorites", models.UserFavorite.__table__, (
+            {"user_id": user_id, "anime_id": anime_id}
+            for user_id in range(1, user_count + 1)
+            for anime_id in rng.sample(range(1, anime_count + 1), min(5, anime_count))
+        ))
+
+        _reset_sequences(connection, ("studios", "genres", "voice_actors", "characters", "anime", "episodes", "users"))
+
+
+def main(args):
+    upgrade()
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+
+    with SessionLocal() as db:
+        if db.scalar(select(func.count()).select_from(models.Anime)):
+            raise SystemExit("The database already has anime; seed an empty one")
+
+    started = time.perf_counter()
+    generate(scale, seed=args.seed)
+    with SessionLocal() as db:
+        conditional.bump_collections(
+            db, conditional.ANIME, conditional.STUDIOS, conditional.GENRES, conditional.CHARACTERS, conditional.EPISODES
+        )
+        # Progress rows were inserted directly, so build their stats in one pass
+        anime_stats.reconcile(db)
+        db.commit()
+        if not args.skip_search_index:
+            step_started = time.perf_counter()
+            search.rebuild_index(db)
+            print(f"{'search index':<24}{scale['anime']:>12,} rows {time.perf_counter() - step_started:>8.1f}s")
+    print(f"seeded {args.scale} scale in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=SCALES, default="tiny")
+    parser.add_argument("--anime", type=int)
+    parser.add_argument("--episodes-per-anime", type=int)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--progress-per-user", type=int)
+    parser.add_argument("--seed", type=int, default=0, help="random seed; the same seed gives the same data")
+    parser.add_argument("--skip-search-index", action="store_true")
+    main(parser.parse_args())
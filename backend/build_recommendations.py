@@ -0,0 +1,33 @@
+"""Build the recommendation index read by GET /users/{id}/recommendations.
+
+Writes RECOMMENDATIONS_PATH (replaced atomically; API workers pick it up within
+RECOMMENDATIONS_RELOAD_SECONDS). With --every the process stays up and each later run
+only reads the progress rows changed since the previous one:
+
+    python build_recommendations.py --every 3600
+"""
+import argparse
+import time
+
+from app.database import SessionLocal
+from app.recommendations.build import RecommendationBuilder
+from app.recommendations.index import RECOMMENDATIONS_PATH
+
+
+def build(builder, path):
+    with SessionLocal() as db:
+        index = builder.refresh(db)
+    index.save(path)
+    print(f"recommendation index written to {path}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--every", type=float, help="seconds between incremental refreshes; without it, build once and exit")
+    parser.add_argument("--output", default=RECOMMENDATIONS_PATH)
+    args = parser.parse_args()
+    builder = RecommendationBuilder()
+    build(builder, args.output)
+    while args.every:
+        time.sleep(args.every)
+        build(builder, args.output)
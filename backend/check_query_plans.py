@@ -0,0 +1,105 @@
+"""Check that the hot queries are planned on the indexes added by the migrations.
+
+Runs the migrations against DATABASE_URL, EXPLAINs each query and exits non-zero if a
+plan does not use one of the expected indexes. Run it in CI against SQLite and Postgres:
+
+    DATABASE_URL=sqlite:///./plans.db python check_query_plans.py
+"""
+import sys
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.migrate import upgrade
+
+# (description, query, index names any of which may serve it). SQLite names the index
+# behind a UNIQUE constraint sqlite_autoindex_<table>_<n>.
+HOT_QUERIES = [
+    (
+        "progress of a user for an anime",
+        "SELECT * FROM user_anime_progress WHERE user_id = 1 AND anime_id = 1",
+        ("uq_user_anime_progress_user_anime", "sqlite_autoindex_user_anime_progress_"),
+    ),
+    (
+        "progress rows of an anime",
+        "SELECT * FROM user_anime_progress WHERE anime_id = 1",
+        ("ix_user_anime_progress_anime_id",),
+    ),
+    (
+        "episodes of an anime by number",
+        "SELECT * FROM episodes WHERE anime_id = 1 ORDER BY episode_number, id LIMIT 100",
+        ("uq_episodes_anime_episode_number", "sqlite_autoindex_episodes_"),
+    ),
+    (
+        "episodes airing in a date range",
+        "SELECT * FROM episodes WHERE air_date >= '2026-01-05' AND air_date < '2026-01-12' ORDER BY air_date",
+        ("ix_episodes_air_date",),
+    ),
+    (
+        "favorites of a user",
+        "SELECT * FROM user_favorites WHERE user_id = 1",
+        ("ix_user_favorites_user_created_at",),
+    ),
+    (
+        "progress of a user changed since a sync",
+        "SELECT * FROM user_anime_progress WHERE user_id = 1 AND last_updated >= '2026-01-01' ORDER BY last_updated",
+        ("ix_user_anime_progress_user_last_updated",),
+    ),
+    (
+        "favorites of a user added since a sync",
+        "SELECT * FROM user_favorites WHERE user_id = 1 AND created_at >= '2026-01-01' ORDER BY created_at",
+        ("ix_user_favorites_user_created_at",),
+    ),
+    (
+        "library tombstones of a user since a sync",
+        "SELECT * FROM library_tombstones WHERE user_id = 1 AND deleted_at >= '2026-01-01' ORDER BY deleted_at",
+        ("ix_library_tombstones_user_deleted_at",),
+    ),
+    (
+        "anime of a studio",
+        "SELECT id FROM anime WHERE studio_id = 1",
+        ("ix_anime_studio_id",),
+    ),
+    (
+        "anime of a genre",
+        "SELECT anime_id FROM anime_genres WHERE genre_id = 1",
+        ("ix_anime_genres_genre_id",),
+    ),
+    (
+        "anime of a character",
+        "SELECT anime_id FROM anime_characters WHERE character_id = 1",
+        ("ix_anime_characters_character_id",),
+    ),
+    (
+        "characters of a voice actor",
+        "SELECT character_id FROM character_voice_actors WHERE voice_actor_id = 1",
+        ("ix_character_voice_actors_voice_actor_id",),
+    ),
+]
+
+
+def explain(connection, query):
+    if connection.dialect.name == "sqlite":
+        return "\n".join(str(row[-1]) for row in connection.execute(text(f"EXPLAIN QUERY PLAN {query}")))
+    return "\n".join(row[0] for row in connection.execute(text(f"EXPLAIN {query}")))
+
+
+def main():
+    upgrade()
+    failures = 0
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # Near-empty tables are cheapest to scan; we want to know the index is usable
+            connection.execute(text("SET enable_seqscan = off"))
+        for description, query, indexes in HOT_QUERIES:
+            plan = explain(connection, query)
+            if any(index in plan for index in indexes):
+                print(f"ok    {description}")
+            else:
+                failures += 1
+                print(f"FAIL  {description}: expected one of {', '.join(indexes)}\n{plan}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
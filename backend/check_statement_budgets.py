@@ -0,0 +1,114 @@
+"""Fail when a route runs more SQL statements than its budget.
+
+Seeds a small catalog through the API and calls each route below, reading the statement
+count from the X-SQL-Stats header. Point DATABASE_URL at a scratch database (it is written
+to); without it a temporary SQLite file is used:
+
+    python check_statement_budgets.py
+"""
+import os
+import sys
+import tempfile
+
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'budgets.db')}"
+os.environ.setdefault("SECRET_KEY", "statement-budgets")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ["SQL_STATS_ENABLED"] = "true"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+from app.migrate import upgrade  # noqa: E402
+from app.models import models  # noqa: E402
+from app.sql_instrumentation import assert_statement_budget  # noqa: E402
+
+# (method, path, statement budget, most times one statement may run). Paths are formatted
+# with the ids of the seeded rows.
+BUDGETS = [
+    ("GET", "/anime/", 3, 1),
+    ("GET", "/anime/{anime_id}", 3, 1),
+    ("GET", "/anime/facets", 3, 1),
+    ("GET", "/genres/", 2, 1),
+    ("GET", "/studios/", 2, 1),
+    ("GET", "/characters/", 2, 1),
+    ("GET", "/episodes/anime/{anime_id}", 3, 1),
+    ("GET", "/episodes/calendar?from=2026-01-01&to=2026-03-31", 2, 1),
+    # Outbox rows for the episodes and for the anime whose episodes_total moved
+    ("POST", "/episodes/bulk", 9, 2),
+    ("POST", "/anime/{anime_id}/genres/{genre_id}", 10, 2),
+    ("DELETE", "/anime/{anime_id}/genres/{genre_id}", 10, 2),
+    ("POST", "/anime/{anime_id}/characters/{character_id}?role=Main", 8, 1),
+    ("DELETE", "/anime/{anime_id}/characters/{character_id}", 8, 1),
+    ("GET", "/users/{user_id}/favorites", 1, 1),
+    ("GET", "/anime/{anime_id}/progress/{user_id}", 1, 1),
+    ("POST", "/anime/{anime_id}/progress", 3, 1),
+    ("GET", "/users/{user_id}/library", 3, 1),
+    ("GET", "/anime/{anime_id}/stats", 1, 1),
+    ("GET", "/changes/?since=1", 2, 1),
+    # Deletes last: they remove seeded rows
+    ("POST", "/characters/bulk-delete", 6, 1),
+    ("DELETE", "/anime/{anime_id}", 7, 1),
+]
+# Request bodies, built from the seeded ids
+REQUEST_BODIES = {
+    "POST /anime/{anime_id}/progress": lambda ids: {
+        "user_id": ids["user_id"], "anime_id": ids["anime_id"], "episodes_watched": 2, "status": "watching",
+    },
+    "POST /characters/bulk-delete": lambda ids: {"ids": [ids["character_id"], 0]},
+    "POST /episodes/bulk": lambda ids: {
+        "anime_id": ids["anime_id"],
+        "episodes": [{"episode_number": number, "air_date": f"2026-01-{number:02d}"} for number in range(2, 14)],
+        "update_episodes_total": True,
+    },
+}
+
+
+def seed(client):
+    user = client.post("/auth/register", json={"username": "budget", "email": "budget@example.com", "password": "budget"}).json()
+    token = client.post("/auth/token", data={"username": "budget", "password": "budget"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    studio = client.post("/studios/", json={"name": "Budget Studio"}, headers=headers).json()
+    genres = [client.post("/genres/", json={"name": f"Genre {i}"}, headers=headers).json() for i in range(3)]
+    characters = [client.post("/characters/", json={"name": f"Character {i}"}, headers=headers).json() for i in range(3)]
+    anime_ids = []
+    for i in range(20):
+        anime = client.post("/anime/", json={"title": f"Anime {i}", "studio_id": studio["id"]}, headers=headers).json()
+        for genre in genres[1:]:
+            client.post(f"/anime/{anime['id']}/genres/{genre['id']}", headers=headers)
+        for character in characters[1:]:
+            client.post(f"/anime/{anime['id']}/characters/{character['id']}", headers=headers)
+        client.post("/episodes/", json={"anime_id": anime["id"], "episode_number": 1}, headers=headers)
+        client.post(f"/anime/{anime['id']}/progress", json={"user_id": user["id"], "anime_id": anime["id"], "episodes_watched": 1}, headers=headers)
+        anime_ids.append(anime["id"])
+    # There is no favorites endpoint to create them with
+    with SessionLocal() as db:
+        db.add_all(models.UserFavorite(user_id=user["id"], anime_id=anime_id) for anime_id in anime_ids)
+        db.commit()
+    ids = {"user_id": user["id"], "anime_id": anime_ids[-1], "genre_id": genres[0]["id"], "character_id": characters[0]["id"]}
+    return headers, ids
+
+
+def main():
+    upgrade()
+    client = TestClient(app)
+    headers, ids = seed(client)
+    failures = 0
+    for method, path, budget, max_repeat in BUDGETS:
+        route = f"{method} {path}"
+        body = REQUEST_BODIES.get(route)
+        response = client.request(method, path.format(**ids), json=body(ids) if body else None, headers=headers)
+        try:
+            assert response.status_code < 400, f"status {response.status_code}: {response.text}"
+            assert_statement_budget(response, budget, max_repeat=max_repeat)
+            print(f"ok    {route}: {response.headers['X-SQL-Stats']}")
+        except AssertionError as exc:
+            failures += 1
+            print(f"FAIL  {route}: {exc}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+import argparse
+import sys
+
+from app.database import SessionLocal
+from app.catalog_import import DEFAULT_BATCH_SIZE, import_lines
+
+parser = argparse.ArgumentParser(description="Import an NDJSON file of anime documents (one per line).")
+parser.add_argument("path", help="NDJSON file, or - for stdin")
+parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="documents per transaction")
+args = parser.parse_args()
+
+source = sys.stdin if args.path == "-" else open(args.path, encoding="utf-8")
+db = SessionLocal()
+try:
+    print(f"Importing {args.path}...")
+    report = import_lines(db, source, batch_size=args.batch_size)
+finally:
+    db.close()
+    source.close()
+
+for error in report.errors:
+    print(f"line {error.line}: {error.error}", file=sys.stderr)
+print(f"{report.imported} imported, {report.failed} failed, {report.lines} lines read")
+sys.exit(1 if report.failed else 0)
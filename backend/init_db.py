@@ -1,6 +1,15 @@
-from app.database import Base, engine
-from app.models import models # Import models to ensure they are registered with Base.metadata
+from app.database import SessionLocal
+from app.migrate import upgrade
+from app.search import search
 
-print("Creating database tables...")
-Base.metadata.create_all(bind=engine)
-print("Database tables created!")
\ No newline at end of file
+print("Applying database migrations...")
+upgrade()
+print("Database schema is up to date!")
+
+print("Rebuilding search index...")
+db = SessionLocal()
+try:
+    search.rebuild_index(db)
+finally:
+    db.close()
+print("Search index rebuilt!")
\ No newline at end of file
@@ -0,0 +1,151 @@
+"""Baseline: the schema previously created by Base.metadata.create_all
+
+Databases created that way can adopt migrations with `alembic stamp 0001_baseline`.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("username", sa.String(), nullable=False),
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("hashed_password", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "studios",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("country", sa.String()),
+        sa.Column("founded_year", sa.Integer()),
+    )
+    op.create_index("ix_studios_id", "studios", ["id"])
+    op.create_index("ix_studios_name", "studios", ["name"], unique=True)
+
+    op.create_table(
+        "anime",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("japanese_title", sa.String()),
+        sa.Column("status", sa.String()),
+        sa.Column("type", sa.String()),
+        sa.Column("synopsis", sa.Text()),
+        sa.Column("episodes_total", sa.Integer()),
+        sa.Column("release_date", sa.Date()),
+        sa.Column("end_date", sa.Date()),
+        sa.Column("cover_url", sa.String()),
+        sa.Column("studio_id", sa.Integer(), sa.ForeignKey("studios.id")),
+    )
+    op.create_index("ix_anime_id", "anime", ["id"])
+    op.create_index("ix_anime_title", "anime", ["title"])
+    op.create_index("ix_anime_japanese_title", "anime", ["japanese_title"])
+
+    op.create_table(
+        "episodes",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("anime_id", sa.Integer(), sa.ForeignKey("anime.id")),
+        sa.Column("episode_number", sa.Integer(), nullable=False),
+        sa.Column("title", sa.String()),
+        sa.Column("duration_minutes", sa.Integer()),
+        sa.Column("air_date", sa.Date()),
+    )
+    op.create_index("ix_episodes_id", "episodes", ["id"])
+
+    op.create_table(
+        "user_anime_progress",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("anime_id", sa.Integer(), sa.ForeignKey("anime.id")),
+        sa.Column("episodes_watched", sa.Integer()),
+        sa.Column("status", sa.String()),
+        sa.Column("score", sa.Integer()),
+        sa.Column("last_updated", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_user_anime_progress_id", "user_anime_progress", ["id"])
+
+    op.create_table(
+        "genres",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+    )
+    op.create_index("ix_genres_id", "genres", ["id"])
+    op.create_index("ix_genres_name", "genres", ["name"], unique=True)
+
+    op.create_table(
+        "characters",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("description", sa.Text()),
+        sa.Column("image_url", sa.String()),
+    )
+    op.create_index("ix_characters_id", "characters", ["id"])
+    op.create_index("ix_characters_name", "characters", ["name"])
+
+    op.create_table(
+        "voice_actors",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("nationality", sa.String()),
+        sa.Column("birthdate", sa.Date()),
+    )
+    op.create_index("ix_voice_actors_id", "voice_actors", ["id"])
+    op.create_index("ix_voice_actors_name", "voice_actors", ["name"])
+
+    op.create_table(
+        "user_favorites",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id")),
+        sa.Column("anime_id", sa.Integer(), sa.ForeignKey("anime.id"), nullable=True),
+        sa.Column("character_id", sa.Integer(), sa.ForeignKey("characters.id"), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.create_index("ix_user_favorites_id", "user_favorites", ["id"])
+
+    op.create_table(
+        "anime_genres",
+        sa.Column("anime_id", sa.Integer(), sa.ForeignKey("anime.id"), primary_key=True),
+        sa.Column("genre_id", sa.Integer(), sa.ForeignKey("genres.id"), primary_key=True),
+    )
+    op.create_table(
+        "anime_characters",
+        sa.Column("anime_id", sa.Integer(), sa.ForeignKey("anime.id"), primary_key=True),
+        sa.Column("character_id", sa.Integer(), sa.ForeignKey("characters.id"), primary_key=True),
+        sa.Column("role", sa.String()),
+    )
+    op.create_table(
+        "character_voice_actors",
+        sa.Column("character_id", sa.Integer(), sa.ForeignKey("characters.id"), primary_key=True),
+        sa.Column("voice_actor_id", sa.Integer(), sa.ForeignKey("voice_actors.id"), primary_key=True),
+        sa.Column("language", sa.String()),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in (
+        "character_voice_actors", "anime_characters", "anime_genres", "user_favorites", "voice_actors",
+        "characters", "genres", "user_anime_progress", "episodes", "anime", "studios", "users",
+    ):
+        op.drop_table(table)
@@ -0,0 +1,97 @@
+"""Search index tables, catalog row/collection versions, progress sync columns
+
+Existing anime are not indexed here; run init_db.py (or search.rebuild_index) afterwards.
+
+Revision ID: 0002_search_versions_progress_sync
+Revises: 0001_baseline
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_search_versions_progress_sync"
+down_revision: Union[str, Sequence[str], None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+VERSIONED_TABLES = ("studios", "anime", "episodes", "genres", "characters")
+# Catalog collections bumped by the write handlers (app.conditional); markers such as
+# calendar weeks are created by their first write
+COLLECTIONS = ("anime", "genres", "studios", "characters", "episodes")
+
+
+def _recreate():
+    # SQLite cannot ADD COLUMN with a CURRENT_TIMESTAMP default, so rebuild the table there
+    return "always" if op.get_bind().dialect.name == "sqlite" else "auto"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute(
+            """CREATE TABLE anime_search (
+                anime_id INTEGER PRIMARY KEY REFERENCES anime(id) ON DELETE CASCADE,
+                title_doc TEXT NOT NULL,
+                document TSVECTOR NOT NULL
+            )"""
+        )
+        op.execute("CREATE INDEX ix_anime_search_document ON anime_search USING gin (document)")
+        op.execute("CREATE INDEX ix_anime_search_title_trgm ON anime_search USING gin (title_doc gin_trgm_ops)")
+    elif dialect == "sqlite":
+        op.execute("CREATE VIRTUAL TABLE anime_fts USING fts5(title, synopsis, tokenize='unicode61')")
+
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table, recreate=_recreate()) as batch:
+            batch.add_column(sa.Column("version", sa.Integer(), nullable=False, server_default="1"))
+            batch.add_column(sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()))
+
+    collection_versions = op.create_table(
+        "collection_versions",
+        sa.Column("name", sa.String(), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+    op.bulk_insert(collection_versions, [{"name": name, "version": 0} for name in COLLECTIONS])
+
+    # The baseline allowed several rows per user and anime (e.g. racing default-creates);
+    # keep the most recently updated one, the highest id among equals
+    op.execute(
+        """DELETE FROM user_anime_progress WHERE EXISTS (
+            SELECT 1 FROM user_anime_progress newer
+            WHERE newer.user_id = user_anime_progress.user_id
+              AND newer.anime_id = user_anime_progress.anime_id
+              AND (COALESCE(newer.last_updated, '1970-01-01') > COALESCE(user_anime_progress.last_updated, '1970-01-01')
+                   OR (COALESCE(newer.last_updated, '1970-01-01') = COALESCE(user_anime_progress.last_updated, '1970-01-01')
+                       AND newer.id > user_anime_progress.id))
+        )"""
+    )
+    with op.batch_alter_table("user_anime_progress") as batch:
+        batch.add_column(sa.Column("client_updated_at", sa.DateTime(timezone=True)))
+        batch.create_unique_constraint("uq_user_anime_progress_user_anime", ["user_id", "anime_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("user_anime_progress") as batch:
+        batch.drop_constraint("uq_user_anime_progress_user_anime", type_="unique")
+        batch.drop_column("client_updated_at")
+
+    op.drop_table("collection_versions")
+
+    for table in VERSIONED_TABLES:
+        with op.batch_alter_table(table) as batch:
+            batch.drop_column("updated_at")
+            batch.drop_column("version")
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.drop_table("anime_search")
+    elif dialect == "sqlite":
+        op.execute("DROP TABLE anime_fts")
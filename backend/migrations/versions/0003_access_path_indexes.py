@@ -0,0 +1,59 @@
+"""Indexes and constraints for the hot access paths
+
+(user_id, anime_id) on user_anime_progress is already served by
+uq_user_anime_progress_user_anime from 0002.
+
+Revision ID: 0003_access_path_indexes
+Revises: 0002_search_versions_progress_sync
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003_access_path_indexes"
+down_revision: Union[str, Sequence[str], None] = "0002_search_versions_progress_sync"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Episode listing per anime, ordered by number; also rejects duplicate numbers. The
+    # baseline allowed duplicates: keep the newest row of each number
+    op.execute(
+        """DELETE FROM episodes WHERE EXISTS (
+            SELECT 1 FROM episodes newer
+            WHERE newer.anime_id = episodes.anime_id
+              AND newer.episode_number = episodes.episode_number
+              AND newer.id > episodes.id
+        )"""
+    )
+    with op.batch_alter_table("episodes") as batch:
+        batch.create_unique_constraint("uq_episodes_anime_episode_number", ["anime_id", "episode_number"])
+
+    op.create_index("ix_user_anime_progress_anime_id", "user_anime_progress", ["anime_id"])
+    op.create_index("ix_user_favorites_user_id", "user_favorites", ["user_id"])
+    op.create_index("ix_anime_studio_id", "anime", ["studio_id"])
+
+    # The association primary keys lead with the left side; these serve the reverse lookups
+    op.create_index("ix_anime_genres_genre_id", "anime_genres", ["genre_id", "anime_id"])
+    op.create_index("ix_anime_characters_character_id", "anime_characters", ["character_id", "anime_id"])
+    op.create_index("ix_character_voice_actors_voice_actor_id", "character_voice_actors", ["voice_actor_id", "character_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_character_voice_actors_voice_actor_id", table_name="character_voice_actors")
+    op.drop_index("ix_anime_characters_character_id", table_name="anime_characters")
+    op.drop_index("ix_anime_genres_genre_id", table_name="anime_genres")
+    op.drop_index("ix_anime_studio_id", table_name="anime")
+    op.drop_index("ix_user_favorites_user_id", table_name="user_favorites")
+    op.drop_index("ix_user_anime_progress_anime_id", table_name="user_anime_progress")
+
+    with op.batch_alter_table("episodes") as batch:
+        batch.drop_constraint("uq_episodes_anime_episode_number", type_="unique")
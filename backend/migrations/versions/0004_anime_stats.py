@@ -0,0 +1,55 @@
+"""Per-anime progress statistics, backfilled from user_anime_progress
+
+Revision ID: 0004_anime_stats
+Revises: 0003_access_path_indexes
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_anime_stats"
+down_revision: Union[str, Sequence[str], None] = "0003_access_path_indexes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STATUS_COLUMNS = {
+    "Watching": "watching",
+    "Completed": "completed",
+    "On Hold": "on_hold",
+    "Dropped": "dropped",
+    "Plan to Watch": "plan_to_watch",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "anime_stats",
+        sa.Column("anime_id", sa.Integer(), sa.ForeignKey("anime.id"), primary_key=True),
+        sa.Column("members", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("scored", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("score_sum", sa.Integer(), nullable=False, server_default="0"),
+        *(sa.Column(column, sa.Integer(), nullable=False, server_default="0") for column in STATUS_COLUMNS.values()),
+        sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+    )
+
+    status_counts = ", ".join(
+        f"SUM(CASE WHEN status = '{status}' THEN 1 ELSE 0 END)" for status in STATUS_COLUMNS
+    )
+    op.execute(
+        f"""INSERT INTO anime_stats (anime_id, members, scored, score_sum, {", ".join(STATUS_COLUMNS.values())})
+        SELECT anime_id, COUNT(*), COUNT(score), COALESCE(SUM(score), 0), {status_counts}
+        FROM user_anime_progress
+        WHERE anime_id IS NOT NULL
+        GROUP BY anime_id"""
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("anime_stats")
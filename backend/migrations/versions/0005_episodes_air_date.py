@@ -0,0 +1,29 @@
+"""Index episodes.air_date for the airing calendar
+
+Revision ID: 0005_episodes_air_date
+Revises: 0004_anime_stats
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_episodes_air_date"
+down_revision: Union[str, Sequence[str], None] = "0004_anime_stats"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # GET /episodes/calendar scans one air_date range per request
+    op.create_index("ix_episodes_air_date", "episodes", ["air_date"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_episodes_air_date", table_name="episodes")
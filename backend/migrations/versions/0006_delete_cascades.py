@@ -0,0 +1,72 @@
+"""ON DELETE rules on the catalog foreign keys
+
+Deleting an anime, character or studio becomes one DELETE: the database removes the
+dependent rows (or clears anime.studio_id) instead of the application loading them.
+Rows already orphaned by earlier deletes are removed first so the new constraints hold.
+
+Revision ID: 0006_delete_cascades
+Revises: 0005_episodes_air_date
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006_delete_cascades"
+down_revision: Union[str, Sequence[str], None] = "0005_episodes_air_date"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# table -> (column, referred table, ON DELETE)
+FOREIGN_KEYS = {
+    "anime": [("studio_id", "studios", "SET NULL")],
+    "episodes": [("anime_id", "anime", "CASCADE")],
+    "user_anime_progress": [("anime_id", "anime", "CASCADE")],
+    "anime_stats": [("anime_id", "anime", "CASCADE")],
+    "user_favorites": [("anime_id", "anime", "CASCADE"), ("character_id", "characters", "CASCADE")],
+    "anime_genres": [("anime_id", "anime", "CASCADE"), ("genre_id", "genres", "CASCADE")],
+    "anime_characters": [("anime_id", "anime", "CASCADE"), ("character_id", "characters", "CASCADE")],
+    "character_voice_actors": [("character_id", "characters", "CASCADE"), ("voice_actor_id", "voice_actors", "CASCADE")],
+}
+
+# The baseline left its foreign keys unnamed. PostgreSQL named them <table>_<column>_fkey;
+# on SQLite batch mode reflects them nameless and this convention gives them the same name.
+NAMING_CONVENTION = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+
+def _fk_name(table: str, column: str) -> str:
+    return f"{table}_{column}_fkey"
+
+
+def _remove_orphans():
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        for column, referred, ondelete in foreign_keys:
+            orphaned = f"{column} IS NOT NULL AND {column} NOT IN (SELECT id FROM {referred})"
+            if ondelete == "SET NULL":
+                op.execute(f"UPDATE {table} SET {column} = NULL WHERE {orphaned}")
+            else:
+                op.execute(f"DELETE FROM {table} WHERE {orphaned}")
+
+
+def _replace_foreign_keys(with_rules: bool):
+    for table, foreign_keys in FOREIGN_KEYS.items():
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch:
+            for column, referred, ondelete in foreign_keys:
+                name = _fk_name(table, column)
+                batch.drop_constraint(name, type_="foreignkey")
+                batch.create_foreign_key(name, referred, [column], ["id"], ondelete=ondelete if with_rules else None)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _remove_orphans()
+    _replace_foreign_keys(with_rules=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    _replace_foreign_keys(with_rules=False)
@@ -0,0 +1,39 @@
+"""Outbox of catalog changes behind GET /changes
+
+Revision ID: 0007_catalog_changes
+Revises: 0006_delete_cascades
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007_catalog_changes"
+down_revision: Union[str, Sequence[str], None] = "0006_delete_cascades"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "catalog_changes",
+        sa.Column("seq", sa.Integer(), primary_key=True),
+        sa.Column("entity", sa.String(), nullable=False),
+        sa.Column("entity_id", sa.Integer(), nullable=False),
+        sa.Column("op", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        # SQLite reuses the highest rowid after a delete; consumers hold seqs across pruning
+        sqlite_autoincrement=True,
+    )
+    op.create_index("ix_catalog_changes_created_at", "catalog_changes", ["created_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_catalog_changes_created_at", table_name="catalog_changes")
+    op.drop_table("catalog_changes")
@@ -0,0 +1,47 @@
+"""Indexes and tombstones behind GET /users/{id}/library?since=
+
+(user_id, last_updated) on progress and (user_id, created_at) on favorites serve the
+"changed since" range scans; the latter replaces the plain user_id index it prefixes.
+
+Revision ID: 0008_library_delta_sync
+Revises: 0007_catalog_changes
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0008_library_delta_sync"
+down_revision: Union[str, Sequence[str], None] = "0007_catalog_changes"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index("ix_user_anime_progress_user_last_updated", "user_anime_progress", ["user_id", "last_updated"])
+    op.create_index("ix_user_favorites_user_created_at", "user_favorites", ["user_id", "created_at"])
+    op.drop_index("ix_user_favorites_user_id", table_name="user_favorites")
+    op.create_table(
+        "library_tombstones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("kind", sa.String(), nullable=False),
+        sa.Column("anime_id", sa.Integer(), nullable=True),
+        sa.Column("character_id", sa.Integer(), nullable=True),
+        sa.Column("deleted_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+    )
+    op.create_index("ix_library_tombstones_user_deleted_at", "library_tombstones", ["user_id", "deleted_at"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_library_tombstones_user_deleted_at", table_name="library_tombstones")
+    op.drop_table("library_tombstones")
+    op.create_index("ix_user_favorites_user_id", "user_favorites", ["user_id"])
+    op.drop_index("ix_user_favorites_user_created_at", table_name="user_favorites")
+    op.drop_index("ix_user_anime_progress_user_last_updated", table_name="user_anime_progress")
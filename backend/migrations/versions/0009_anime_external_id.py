@@ -0,0 +1,34 @@
+"""Idempotency key of imported anime
+
+Catalog import upserts anime on external_id, so running an import again updates the
+anime it created instead of duplicating them. Anime created through the API have none.
+
+Revision ID: 0009_anime_external_id
+Revises: 0008_library_delta_sync
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009_anime_external_id"
+down_revision: Union[str, Sequence[str], None] = "0008_library_delta_sync"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("anime", sa.Column("external_id", sa.String(), nullable=True))
+    op.create_index("ix_anime_external_id", "anime", ["external_id"], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_anime_external_id", table_name="anime")
+    with op.batch_alter_table("anime") as batch:
+        batch.drop_column("external_id")
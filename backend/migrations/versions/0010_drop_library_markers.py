@@ -0,0 +1,30 @@
+"""Drop the per-user library markers from collection_versions
+
+Library sync now probes the newest progress, favorite and tombstone timestamps of the
+user instead of a library:<user_id> collection version bumped by every write.
+
+Revision ID: 0010_drop_library_markers
+Revises: 0009_anime_external_id
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0010_drop_library_markers"
+down_revision: Union[str, Sequence[str], None] = "0009_anime_external_id"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("DELETE FROM collection_versions WHERE name LIKE 'library:%'")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Nothing to restore: a missing marker made the next sync run its range scans
@@ -0,0 +1,41 @@
+"""Delete catalog changes and library tombstones older than their retention periods
+(CHANGES_RETENTION_DAYS, LIBRARY_TOMBSTONE_RETENTION_DAYS).
+
+Consumers further behind than that get 410 from GET /changes or GET /users/{id}/library
+and reload everything. Run it once, e.g. from cron, or keep it running with --every:
+
+    python prune_changes.py --every 3600
+"""
+import argparse
+import time
+from datetime import timedelta
+
+from app import changes, library_sync
+from app.database import SessionLocal
+
+
+def prune(days: float, tombstone_days: float):
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        removed = changes.prune(db, timedelta(days=days))
+        tombstones = library_sync.prune(db, timedelta(days=tombstone_days))
+        db.commit()
+    print(
+        f"catalog_changes pruned, {removed} rows older than {days:g} days and {tombstones} library tombstones "
+        f"older than {tombstone_days:g} days removed in {time.perf_counter() - started:.1f}s",
+        flush=True,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=float, default=changes.CHANGES_RETENTION_DAYS, help="changes kept, in days")
+    parser.add_argument(
+        "--tombstone-days", type=float, default=library_sync.LIBRARY_TOMBSTONE_RETENTION_DAYS, help="library tombstones kept, in days"
+    )
+    parser.add_argument("--every", type=float, help="seconds between runs; without it, run once and exit")
+    args = parser.parse_args()
+    prune(args.days, args.tombstone_days)
+    while args.every:
+        time.sleep(args.every)
+        prune(args.days, args.tombstone_days)
@@ -0,0 +1,31 @@
+"""Recompute anime_stats from user_anime_progress and fix rows that drifted.
+
+The progress write paths keep anime_stats current incrementally; this catches what they
+miss (concurrent edits of one row, rows written outside the API). Run it once, e.g. from
+cron, or keep it running with --every:
+
+    python reconcile_stats.py --every 3600
+"""
+import argparse
+import time
+
+from app import anime_stats
+from app.database import SessionLocal
+
+
+def reconcile():
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        fixed = anime_stats.reconcile(db)
+        db.commit()
+    print(f"anime_stats reconciled, {fixed} rows fixed in {time.perf_counter() - started:.1f}s", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--every", type=float, help="seconds between runs; without it, run once and exit")
+    args = parser.parse_args()
+    reconcile()
+    while args.every:
+        time.sleep(args.every)
+        reconcile()
@@ -0,0 +1,37 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# The app reads its settings at import time: point it at a scratch database unless the
+# run (e.g. CI against Postgres) provides one
+if not os.getenv("DATABASE_URL"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'tests.db')}"
+os.environ.setdefault("SECRET_KEY", "tests")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("SQL_STATS_ENABLED", "true")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    from app.migrate import upgrade
+
+    upgrade()
+    # Not entered as a context manager: the change feed and the other background pollers stay off
+    return TestClient(app)
+
+
+@pytest.fixture(scope="session")
+def user(client):
+    """The signed-in test user: its row and the Authorization header to send."""
+    account = {"username": "tester", "email": "tester@example.com", "password": "tester"}
+    row = client.post("/auth/register", json=account).json()
+    token = client.post("/auth/token", data={"username": account["username"], "password": account["password"]}).json()["access_token"]
+    return {"id": row["id"], "headers": {"Authorization": f"Bearer {token}"}}
@@ -0,0 +1,94 @@
+"""POST /anime/import: re-importing is idempotent, and bad lines fail alone."""
+import json
+
+from sqlalchemy import func, select
+
+from app.database import SessionLocal
+from app.models import models
+
+DOCUMENTS = [
+    {
+        "external_id": "import-test-1",
+        "title": "Imported",
+        "type": "TV",
+        "studio": {"name": "Import Studio", "country": "Japan"},
+        "genres": ["Import Action", "Import Drama"],
+        "episodes": [{"episode_number": 1, "air_date": "2026-01-05"}, {"episode_number": 2, "air_date": "2026-01-12"}],
+        "characters": [{"name": "Import Hero", "role": "Main"}, {"name": "Import Rival", "role": "Supporting"}],
+    },
+    # Keyed by title, type and release date
+    {
+        "title": "Imported without key",
+        "release_date": "2026-04-01",
+        "studio": {"name": "Import Studio", "founded_year": 1999},
+        "genres": ["Import Drama"],
+        "characters": [{"name": "Import Hero", "role": "Main"}],
+    },
+]
+LINES = [
+    json.dumps(DOCUMENTS[0]),
+    "{not json",
+    json.dumps(DOCUMENTS[1]),
+    # Valid, but fails in the database: the studio does not exist
+    json.dumps({"title": "Imported orphan", "studio_id": 987654}),
+]
+
+
+def _import(client, user) -> dict:
+    response = client.post("/anime/import", content="\n".join(LINES).encode(), headers=user["headers"])
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _snapshot() -> dict:
+    """Everything the import writes, without versions and timestamps."""
+    with SessionLocal() as db:
+        anime = db.execute(
+            select(models.Anime.id, models.Anime.external_id, models.Anime.title, models.Anime.release_date, models.Anime.studio_id)
+            .where(models.Anime.title.like("Imported%"))
+            .order_by(models.Anime.id)
+        ).all()
+        anime_ids = [row.id for row in anime]
+        return {
+            "anime": anime,
+            "studios": db.execute(
+                select(models.Studio.id, models.Studio.name, models.Studio.country, models.Studio.founded_year)
+                .where(models.Studio.name.like("Import%"))
+            ).all(),
+            "genres": db.execute(select(models.Genre.id, models.Genre.name).where(models.Genre.name.like("Import%"))).all(),
+            "characters": db.execute(
+                select(models.Character.id, models.Character.name).where(models.Character.name.like("Import%")).order_by(models.Character.id)
+            ).all(),
+            "genre_links": db.execute(
+                select(models.anime_genres).where(models.anime_genres.c.anime_id.in_(anime_ids)).order_by(*models.anime_genres.c)
+            ).all(),
+            "character_links": db.execute(
+                select(models.anime_characters)
+                .where(models.anime_characters.c.anime_id.in_(anime_ids))
+                .order_by(*models.anime_characters.c)
+            ).all(),
+            "episodes": db.execute(
+                select(models.Episode.id, models.Episode.anime_id, models.Episode.episode_number, models.Episode.air_date)
+                .where(models.Episode.anime_id.in_(anime_ids))
+                .order_by(models.Episode.id)
+            ).all(),
+            "anime_total": db.scalar(select(func.count()).select_from(models.Anime)),
+        }
+
+
+def test_bad_lines_fail_alone_and_reimporting_changes_nothing(client, user):
+    report = _import(client, user)
+    assert (report["lines"], report["imported"], report["failed"]) == (4, 2, 2)
+    assert [error["line"] for error in report["errors"]] == [2, 4]
+
+    first = _snapshot()
+    assert [row.external_id for row in first["anime"]] == ["import-test-1", "Imported without key||2026-04-01"]
+    # One studio with the fields of both documents, one row per genre and character name per anime
+    assert [(row.name, row.country, row.founded_year) for row in first["studios"]] == [("Import Studio", "Japan", 1999)]
+    assert len(first["genres"]) == 2
+    assert len(first["genre_links"]) == 3
+    assert len(first["character_links"]) == 3
+    assert len(first["episodes"]) == 2
+
+    assert _import(client, user) == report
+    assert _snapshot() == first
@@ -0,0 +1,174 @@
+"""The catalog change outbox: gaps, retention and what each write records."""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import delete, func, select, update
+
+from app import changes
+from app.database import SessionLocal
+from app.models import models
+
+
+def _latest_seq() -> int:
+    with SessionLocal() as db:
+        return db.scalar(select(func.max(models.CatalogChange.seq))) or 0
+
+
+def _read(client, since: int) -> list:
+    response = client.get("/changes/", params={"since": since})
+    assert response.status_code == 200, response.text
+    return [(change["entity"], change["entity_id"], change["op"]) for change in response.json()["changes"]]
+
+
+def _rolled_back_write() -> int:
+    """Leave a hole in the sequence, as a write that rolled back does on Postgres; returns the
+    seq committed after it. SQLite hands a rolled-back seq out again, so delete a committed one."""
+    with SessionLocal() as db:
+        changes.record(db, "anime", changes.UPSERT, [-1])
+        changes.record(db, "anime", changes.UPSERT, [-2])
+        db.commit()
+        lost, kept = db.scalars(select(models.CatalogChange.seq).order_by(models.CatalogChange.seq.desc()).limit(2)).all()[::-1]
+        db.execute(delete(models.CatalogChange).where(models.CatalogChange.seq == lost))
+        db.commit()
+    return kept
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(changes, "time", SimpleNamespace(monotonic=clock.monotonic))
+    return clock
+
+
+def test_gap_ages_from_when_it_was_first_seen(clock):
+    tracker = changes.GapTracker(gap_seconds=5)
+    assert tracker.waiting(7)
+    clock.now += 4
+    assert tracker.waiting(7)
+    # A gap noticed later waits its own full period
+    assert tracker.waiting(9)
+    clock.now += 1
+    assert not tracker.waiting(7)
+    assert tracker.waiting(9)
+
+
+def test_settled_stops_at_a_gap_until_it_is_old(clock):
+    tracker = changes.GapTracker(gap_seconds=5)
+    rows = [SimpleNamespace(seq=seq) for seq in (11, 12, 14, 15)]
+    assert [row.seq for row in changes.settled(rows, 10, tracker)] == [11, 12]
+    clock.now += 5
+    assert [row.seq for row in changes.settled(rows, 10, tracker)] == [11, 12, 14, 15]
+
+
+def test_settled_waits_for_a_gap_before_the_first_row(clock):
+    tracker = changes.GapTracker(gap_seconds=5)
+    rows = [SimpleNamespace(seq=12)]
+    assert changes.settled(rows, 10, tracker) == []
+    clock.now += 5
+    assert [row.seq for row in changes.settled(rows, 10, tracker)] == [12]
+
+
+def test_rolled_back_write_is_skipped_after_the_gap_period(client, monkeypatch):
+    monkeypatch.setattr(changes.gaps, "gap_seconds", 0.5)
+    since = _latest_seq()
+    kept = _rolled_back_write()
+
+    # The missing seq may still belong to a running write: nothing after it is handed out
+    page = client.get("/changes/", params={"since": since}).json()
+    assert page["changes"] == []
+    assert page["next_since"] == since
+
+    time.sleep(0.6)
+    page = client.get("/changes/", params={"since": since}).json()
+    assert [change["seq"] for change in page["changes"]] == [kept]
+    assert page["next_since"] == kept
+
+
+def test_since_older_than_retention_is_gone(client, user):
+    genres = [client.post("/genres/", json={"name": f"Retention {i}"}, headers=user["headers"]).json()["id"] for i in range(3)]
+    latest = _latest_seq()
+    with SessionLocal() as db:
+        # Everything up to the second of the three is past retention
+        expired = datetime.now(timezone.utc) - timedelta(days=changes.CHANGES_RETENTION_DAYS + 1)
+        db.execute(update(models.CatalogChange).where(models.CatalogChange.seq <= latest - 1).values(created_at=expired))
+        db.commit()
+        changes.prune(db, timedelta(days=changes.CHANGES_RETENTION_DAYS))
+        db.commit()
+
+    assert client.get("/changes/", params={"since": latest - 2}).status_code == 410
+    # The last pruned change was applied: nothing is missing after it
+    assert _read(client, latest - 1) == [("genres", genres[-1], changes.UPSERT)]
+
+
+def test_sequence_numbers_are_not_reused_after_pruning_everything(client, user):
+    client.post("/genres/", json={"name": "Pruned"}, headers=user["headers"])
+    latest = _latest_seq()
+    with SessionLocal() as db:
+        db.execute(update(models.CatalogChange).values(created_at=datetime.now(timezone.utc) - timedelta(days=365)))
+        db.commit()
+        changes.prune(db, timedelta(days=changes.CHANGES_RETENTION_DAYS))
+        db.commit()
+
+    # The consumer holding `latest` must resync rather than wait for the numbering to catch up
+    assert client.get("/changes/", params={"since": latest}).status_code == 410
+    client.post("/genres/", json={"name": "After pruning"}, headers=user["headers"])
+    assert _latest_seq() > latest
+
+
+def test_since_ahead_of_the_feed_is_gone(client):
+    assert client.get("/changes/", params={"since": _latest_seq() + 100}).status_code == 410
+
+
+def test_genre_rename_is_an_upsert_of_its_anime(client, user):
+    headers = user["headers"]
+    genre = client.post("/genres/", json={"name": "Renamed"}, headers=headers).json()["id"]
+    tagged = client.post("/anime/", json={"title": "Tagged"}, headers=headers).json()["id"]
+    untagged = client.post("/anime/", json={"title": "Untagged"}, headers=headers).json()["id"]
+    client.post(f"/anime/{tagged}/genres/{genre}", headers=headers)
+    since = _latest_seq()
+
+    response = client.put(f"/genres/{genre}", json={"name": "Renamed again"}, headers=headers)
+    assert response.status_code == 200, response.text
+    recorded = _read(client, since)
+    assert ("genres", genre, changes.UPSERT) in recorded
+    assert ("anime", tagged, changes.UPSERT) in recorded
+    assert ("anime", untagged, changes.UPSERT) not in recorded
+
+
+def test_studio_update_is_an_upsert_of_its_anime(client, user):
+    headers = user["headers"]
+    studio = client.post("/studios/", json={"name": "Studio"}, headers=headers).json()["id"]
+    anime = client.post("/anime/", json={"title": "Produced", "studio_id": studio}, headers=headers).json()["id"]
+    since = _latest_seq()
+
+    response = client.put(f"/studios/{studio}", json={"name": "Studio", "country": "Japan"}, headers=headers)
+    assert response.status_code == 200, response.text
+    assert ("anime", anime, changes.UPSERT) in _read(client, since)
+
+
+def test_stream_resumes_after_last_event_id(client, user, monkeypatch):
+    since = _latest_seq()
+    for i in range(3):
+        client.post("/characters/", json={"name": f"Streamed {i}"}, headers=user["headers"])
+    # The test client reads the whole body: end the stream after the catch-up, the way the
+    # feed ends a subscriber that fell behind
+    ended = asyncio.Queue()
+    ended.put_nowait(None)
+    monkeypatch.setattr(changes.feed, "subscribe", lambda: ended)
+
+    response = client.get("/changes/stream", headers={"Last-Event-ID": str(since + 1)})
+    assert response.status_code == 200
+    events = [int(line[len("id: "):]) for line in response.text.splitlines() if line.startswith("id: ")]
+    # Only the changes after the acknowledged one, in order
+    assert events == [since + 2, since + 3]
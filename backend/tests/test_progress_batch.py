@@ -0,0 +1,86 @@
+"""POST /anime/progress/batch: last writer wins on client_updated_at, stats follow the applied rows."""
+from datetime import datetime, timedelta, timezone
+
+from app import anime_stats
+from app.database import SessionLocal
+from app.schemas import MAX_PROGRESS_BATCH_ITEMS
+
+NOW = datetime(2026, 10, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def _anime(client, user, title: str) -> int:
+    return client.post("/anime/", json={"title": title}, headers=user["headers"]).json()["id"]
+
+
+def _item(anime_id: int, at: datetime, **fields) -> dict:
+    return {"anime_id": anime_id, "client_updated_at": at.isoformat(), **fields}
+
+
+def _sync(client, user, *items) -> dict:
+    response = client.post("/anime/progress/batch", json={"items": list(items)}, headers=user["headers"])
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _progress(client, user, anime_id: int) -> dict:
+    return client.get(f"/anime/{anime_id}/progress/{user['id']}", headers=user["headers"]).json()
+
+
+def test_applied_stale_and_unknown(client, user):
+    fresh, stored = _anime(client, user, "Batch fresh"), _anime(client, user, "Batch stored")
+    _sync(client, user, _item(stored, NOW, episodes_watched=5, status="Watching"))
+
+    result = _sync(
+        client, user,
+        _item(fresh, NOW, episodes_watched=1, status="Watching"),
+        _item(stored, NOW - timedelta(minutes=1), episodes_watched=2, status="Dropped"),
+        _item(0, NOW, episodes_watched=1),
+    )
+    assert result == {"applied": [fresh], "stale": [stored], "unknown": [0]}
+    assert _progress(client, user, fresh)["episodes_watched"] == 1
+
+
+def test_older_change_never_overwrites_a_newer_one(client, user):
+    anime = _anime(client, user, "Batch last writer")
+    _sync(client, user, _item(anime, NOW, episodes_watched=7, status="Watching", score=8))
+
+    for at in (NOW - timedelta(seconds=1), NOW):
+        assert _sync(client, user, _item(anime, at, episodes_watched=3, status="Dropped"))["stale"] == [anime]
+    progress = _progress(client, user, anime)
+    assert (progress["episodes_watched"], progress["status"], progress["score"]) == (7, "Watching", 8)
+
+    assert _sync(client, user, _item(anime, NOW + timedelta(seconds=1), episodes_watched=12, status="Completed"))["applied"] == [anime]
+    progress = _progress(client, user, anime)
+    assert (progress["episodes_watched"], progress["status"]) == (12, "Completed")
+
+
+def test_newest_change_within_a_batch_wins(client, user):
+    anime = _anime(client, user, "Batch duplicates")
+    result = _sync(
+        client, user,
+        _item(anime, NOW + timedelta(minutes=2), episodes_watched=9),
+        _item(anime, NOW, episodes_watched=4),
+    )
+    assert result["applied"] == [anime]
+    assert _progress(client, user, anime)["episodes_watched"] == 9
+
+
+def test_batch_size_is_capped(client, user):
+    items = [_item(-number, NOW) for number in range(1, MAX_PROGRESS_BATCH_ITEMS + 2)]
+    assert client.post("/anime/progress/batch", json={"items": items}, headers=user["headers"]).status_code == 422
+    assert len(_sync(client, user, *items[:MAX_PROGRESS_BATCH_ITEMS])["unknown"]) == MAX_PROGRESS_BATCH_ITEMS
+
+
+def test_stats_follow_applied_changes_only(client, user):
+    anime = _anime(client, user, "Batch stats")
+    _sync(client, user, _item(anime, NOW, status="Watching", score=6))
+    _sync(client, user, _item(anime, NOW + timedelta(minutes=1), status="Completed", score=9))
+    # Stale: must not move the counters
+    _sync(client, user, _item(anime, NOW - timedelta(minutes=1), status="Dropped", score=1))
+
+    stats = client.get(f"/anime/{anime}/stats").json()
+    assert (stats["members"], stats["scored"], stats["mean_score"]) == (1, 1, 9)
+    assert (stats["watching"], stats["completed"], stats["dropped"]) == (0, 1, 0)
+    with SessionLocal() as db:
+        # The incremental counters match a fresh aggregate of the progress rows
+        assert anime_stats.reconcile(db) == 0
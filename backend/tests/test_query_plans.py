@@ -0,0 +1,23 @@
+"""The hot queries of check_query_plans.py, as a test: each must be planned on its index."""
+import pytest
+from sqlalchemy import text
+
+from app.database import engine
+from app.migrate import upgrade
+from check_query_plans import HOT_QUERIES, explain
+
+
+@pytest.fixture(scope="module")
+def connection():
+    upgrade()
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # Near-empty tables are cheapest to scan; we want to know the index is usable
+            connection.execute(text("SET enable_seqscan = off"))
+        yield connection
+
+
+@pytest.mark.parametrize("description, query, indexes", HOT_QUERIES, ids=[description for description, _, _ in HOT_QUERIES])
+def test_query_uses_index(connection, description, query, indexes):
+    plan = explain(connection, query)
+    assert any(index in plan for index in indexes), f"{description}: expected one of {', '.join(indexes)}\n{plan}"